@@ -0,0 +1,156 @@
+"""
+Peak memory used to read a large GeoJSON file with the `json://` connector and with the
+`geojson-stream://` connector.
+
+Each reader runs in its own process and reports the high water mark of its resident set size.
+The reading loop is the same as :meth:`NationalNatureAncientWoodland.load_nature_reserves`
+without keeping the geometries, so only the memory used by the connector is measured.
+
+From the directory above this file-
+
+    export PYTHONPATH=`pwd`
+    python -m benchmarks.geojson_memory --megabytes 500
+
+The `json://` connector needs many times the file size in memory so start small.
+"""
+
+import argparse
+import json
+import math
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+from time import time
+
+from shapely.geometry import shape
+
+# registers the geojson-stream:// engine type
+import woodland_investigation.geojson_stream
+from benchmarks.synthetic import woodland_properties
+
+
+def polygon_ring(row_number, vertices):
+    """
+    @return: (list of [lng, lat]) closed ring roughly 100m across somewhere in southern England
+    """
+    centre_x = -2.0 + (row_number % 1000) * 0.002
+    centre_y = 51.5 + (row_number // 1000 % 1000) * 0.002
+    ring = [
+        [
+            round(centre_x + 0.0007 * math.cos(2 * math.pi * i / vertices), 7),
+            round(centre_y + 0.00045 * math.sin(2 * math.pi * i / vertices), 7),
+        ]
+        for i in range(vertices)
+    ]
+    ring.append(ring[0])
+    return ring
+
+
+def write_large_geojson(path, megabytes, vertices=200):
+    """
+    Write features one at a time until the file is at least `megabytes` long. The whole document
+    is never in memory.
+
+    @return: (int) number of features
+    """
+    target = megabytes * 1024 * 1024
+    feature_count = 0
+    with open(path, "w") as f:
+        f.write('{"type": "FeatureCollection", "name": "Synthetic_Woodland", "features": [\n')
+        while f.tell() < target:
+            if feature_count:
+                f.write(",\n")
+            feature = {
+                "type": "Feature",
+                "properties": woodland_properties(feature_count),
+                "geometry": {
+                    "type": "MultiPolygon",
+                    "coordinates": [[polygon_ring(feature_count, vertices)]],
+                },
+            }
+            f.write(json.dumps(feature))
+            feature_count += 1
+        f.write("\n]}\n")
+
+    return feature_count
+
+
+def measure(engine_url):
+    """
+    Read every feature. Run in a child process, see :func:`benchmark`.
+
+    @return: (dict) features read, seconds and peak RSS in megabytes
+    """
+    import ayeaye
+
+    start = time()
+    dataset = ayeaye.Connect(engine_url=engine_url)
+    feature_count = 0
+    for feature in dataset.data.features:
+        shape(feature.geometry)
+        feature_count += 1
+
+    return {
+        "features": feature_count,
+        "seconds": round(time() - start, 3),
+        # ru_maxrss is in kilobytes on Linux
+        "peak_rss_megabytes": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+
+def benchmark(megabytes, vertices, working_directory):
+    """
+    @return: (dict) results for one size of file
+    """
+    path = os.path.join(working_directory, "large_ancient_woodland.geojson")
+    feature_count = write_large_geojson(path, megabytes, vertices)
+    result = {
+        "file_megabytes": round(os.path.getsize(path) / (1024 * 1024), 1),
+        "features": feature_count,
+        "vertices": vertices,
+    }
+
+    for engine_type in ("json", "geojson-stream"):
+        child = subprocess.run(
+            [
+                sys.executable,
+                "-m",
+                "benchmarks.geojson_memory",
+                "--measure",
+                f"{engine_type}://{path}",
+            ],
+            capture_output=True,
+            text=True,
+        )
+        if child.returncode == 0:
+            result[engine_type] = json.loads(child.stdout)
+        else:
+            # most likely killed for running out of memory
+            result[engine_type] = {"error": child.stderr.strip() or f"exit code {child.returncode}"}
+
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--megabytes", type=int, nargs="+", default=[100, 500, 2000])
+    parser.add_argument("--vertices", type=int, default=200)
+    parser.add_argument("--measure", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        print(json.dumps(measure(args.measure)))
+        sys.exit(0)
+
+    results = []
+    for megabytes in args.megabytes:
+        working_directory = tempfile.mkdtemp()
+        try:
+            results.append(benchmark(megabytes, args.vertices, working_directory))
+        finally:
+            shutil.rmtree(working_directory)
+
+    print(json.dumps(results, indent=4))
@@ -0,0 +1,256 @@
+"""
+Run the ancient woodland models against synthetic data and report how long they take.
+
+For each scale, synthetic ancient woodland, national and local nature reserves are generated
+and :class:`NationalNatureAncientWoodland`, :class:`LocalNatureAncientWoodland` and
+:class:`OverallSummary` are run in that order, just like a real run. Each model runs in its own
+process so its peak memory can be measured.
+
+Results are JSON so they can be saved and compared between commits. From the directory above
+this file-
+
+    export PYTHONPATH=`pwd`
+    python -m benchmarks.models --woodland 1000 10000 --vertices 4 64 --output results.json
+
+Every combination of `--woodland`, `--vertices` and `--coverage` is run. `--output-format parquet`
+or `arrow` passes the model output to :class:`OverallSummary` with the `columnar://` connector
+instead of as CSV.
+"""
+
+import argparse
+import importlib
+import itertools
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+from datetime import datetime, timezone
+from time import time
+
+from benchmarks.synthetic import woodland_grid, write_inputs, write_reserves
+
+# model class name to (module, datasets to point at the synthetic files)
+MODELS = {
+    "NationalNatureAncientWoodland": (
+        "woodland_investigation.national_nature_ancient_woodland",
+        {
+            "ancient_woodland": "geojson-stream://{ancient_woodland}",
+            "nature_reserves": "geojson-stream://{national_nature_reserves}",
+            "within_nature_reserves": "{output_engine}://{within_national}",
+        },
+    ),
+    "LocalNatureAncientWoodland": (
+        "woodland_investigation.local_nature_ancient_woodland",
+        {
+            "ancient_woodland": "geojson-stream://{ancient_woodland}",
+            "nature_reserves": "geojson-stream://{local_nature_reserves}",
+            "within_nature_reserves": "{output_engine}://{within_local}",
+        },
+    ),
+    "OverallSummary": (
+        "woodland_investigation.overall_summary",
+        {
+            "within_local": "{output_engine}://{within_local}",
+            "within_national": "{output_engine}://{within_national}",
+            "summary": "json://{summary};indent=4",
+            "summary_by_name": "csv://{summary_by_name}",
+        },
+    ),
+}
+
+# model attributes set before `--settings`. Each model would otherwise load the woodland cached
+# by the last one. Pass {"woodland_cache": true} to measure the cache.
+DEFAULT_SETTINGS = {"woodland_cache": False}
+
+# stats the models count for each (woodland, nature reserve) pair that is tested
+PAIR_STATS = ["contained_woodland", "partial_woodland", "disjoint_woodland"]
+
+
+def run_model(model_name, paths, settings):
+    """
+    Run one model in this process. See :func:`measure_model`.
+
+    @param model_name: (str) key in `MODELS`
+    @param paths: (dict) placeholder to file path for the engine_urls in `MODELS`
+    @param settings: (dict) model attributes to set before the model is run
+    @return: (dict) measurements
+    """
+    module_name, datasets = MODELS[model_name]
+    model_cls = getattr(importlib.import_module(module_name), model_name)
+
+    m = model_cls()
+    m.log_to_stdout = False
+    for attribute, value in {**DEFAULT_SETTINGS, **settings}.items():
+        if hasattr(model_cls, attribute):
+            setattr(m, attribute, value)
+
+    for dataset_name, engine_url in datasets.items():
+        connect = getattr(model_cls, dataset_name)
+        setattr(m, dataset_name, connect.clone(engine_url=engine_url.format(**paths)))
+
+    start = time()
+    m.go()
+    # datasets replaced on the instance aren't always closed by older versions of ayeaye
+    for dataset in m.datasets().values():
+        dataset.close_connection()
+    seconds = time() - start
+
+    pairs_tested = sum(m.stats.get(s, 0) for s in PAIR_STATS)
+    return {
+        "seconds": round(seconds, 3),
+        # ru_maxrss is in kilobytes on Linux
+        "peak_rss_megabytes": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "pairs_tested": pairs_tested,
+        "pairs_per_second": round(pairs_tested / seconds, 1) if seconds > 0 else None,
+        "stats": dict(m.stats),
+        # per phase timings, see woodland_investigation.instrumentation
+        "metrics": getattr(m, "metrics", None),
+    }
+
+
+def measure_model(model_name, paths, settings):
+    """
+    Run one model in a child process so its peak memory doesn't include any other model's.
+
+    @return: (dict) see :func:`run_model`
+    """
+    child = subprocess.run(
+        [
+            sys.executable,
+            "-m",
+            "benchmarks.models",
+            "--run-model",
+            json.dumps({"model": model_name, "paths": paths, "settings": settings}),
+        ],
+        capture_output=True,
+        text=True,
+    )
+    if child.returncode != 0:
+        return {"error": child.stderr.strip() or f"exit code {child.returncode}"}
+
+    return json.loads(child.stdout)
+
+
+# --output-format to engine type
+OUTPUT_ENGINES = {"csv": "csv", "parquet": "columnar", "arrow": "columnar"}
+
+
+def benchmark(
+    woodland_count,
+    vertices,
+    coverage,
+    roughness,
+    settings,
+    working_directory,
+    output_format="csv",
+):
+    """
+    @param output_format: (str) key in `OUTPUT_ENGINES`
+    @return: (dict) results for one scale of synthetic data
+    """
+    national_count = max(1, woodland_count // 100)
+    local_count = max(1, woodland_count // 25)
+
+    ancient_woodland_path, national_path = write_inputs(
+        working_directory, woodland_count, national_count, vertices, coverage, roughness
+    )
+    local_path = os.path.join(working_directory, "synthetic_local_nature_reserves.geojson")
+    write_reserves(
+        local_path, woodland_grid(woodland_count), local_count, vertices, coverage, roughness
+    )
+
+    paths = {
+        "ancient_woodland": ancient_woodland_path,
+        "national_nature_reserves": national_path,
+        "local_nature_reserves": local_path,
+        "within_national": os.path.join(working_directory, f"within_national.{output_format}"),
+        "within_local": os.path.join(working_directory, f"within_local.{output_format}"),
+        "output_engine": OUTPUT_ENGINES[output_format],
+        "summary": os.path.join(working_directory, "summary.json"),
+        "summary_by_name": os.path.join(working_directory, "summary_by_name.csv"),
+    }
+
+    return {
+        "woodland": woodland_count,
+        "national_nature_reserves": national_count,
+        "local_nature_reserves": local_count,
+        "vertices": vertices,
+        "coverage": coverage,
+        "roughness": roughness,
+        "output_format": output_format,
+        "models": {model_name: measure_model(model_name, paths, settings) for model_name in MODELS},
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--woodland", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument(
+        "--vertices", type=int, nargs="+", default=[4], help="points around each polygon"
+    )
+    parser.add_argument(
+        "--coverage",
+        type=float,
+        nargs="+",
+        default=[0.25],
+        help="fraction of the area inside a nature reserve",
+    )
+    parser.add_argument(
+        "--roughness", type=float, default=0, help="metres that polygon edges zig-zag"
+    )
+    parser.add_argument(
+        "--settings",
+        type=json.loads,
+        default={},
+        help="model attributes as JSON, e.g. '{\"columnar\": true}'",
+    )
+    parser.add_argument(
+        "--output-format",
+        choices=list(OUTPUT_ENGINES),
+        default="csv",
+        help="file format for the woodland models' output",
+    )
+    parser.add_argument("--output", help="also write the results to this file")
+    parser.add_argument("--run-model", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_model:
+        task = json.loads(args.run_model)
+        print(json.dumps(run_model(task["model"], task["paths"], task["settings"])))
+        sys.exit(0)
+
+    results = {
+        "started": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "settings": args.settings,
+        "runs": [],
+    }
+    for woodland_count, vertices, coverage in itertools.product(
+        args.woodland, args.vertices, args.coverage
+    ):
+        working_directory = tempfile.mkdtemp()
+        try:
+            results["runs"].append(
+                benchmark(
+                    woodland_count,
+                    vertices,
+                    coverage,
+                    args.roughness,
+                    args.settings,
+                    working_directory,
+                    args.output_format,
+                )
+            )
+        finally:
+            shutil.rmtree(working_directory)
+
+    output = json.dumps(results, indent=4)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
@@ -0,0 +1,113 @@
+"""
+Compare the spatial index used by :class:`NationalNatureAncientWoodland` with the bounding box
+scan it replaced.
+
+Both versions of the model are run over the same synthetic data and the output CSV files are
+checked to be identical. Results are printed as a JSON list.
+
+From the directory above this file-
+
+    export PYTHONPATH=`pwd`
+    python -m benchmarks.spatial_index --sizes 1000 10000 100000
+
+The bounding box scan is O(reserves x woodland) so it can take a long time with 100k woodland.
+"""
+
+import argparse
+import filecmp
+import json
+import os
+import shutil
+import tempfile
+from time import time
+
+from shapely.geometry import box
+
+from benchmarks.synthetic import write_inputs
+from woodland_investigation.national_nature_ancient_woodland import NationalNatureAncientWoodland
+
+
+class BoundingBoxScan(NationalNatureAncientWoodland):
+    """
+    The original candidate search. Every nature reserve's bounding box is compared with every
+    ancient woodland's bounding box.
+    """
+
+    def woodland_candidates(self, woodland, geom):
+        if not hasattr(self, "_woodland_bounding"):
+            self._woodland_bounding = [box(*geom.bounds) for geom in woodland.geom]
+
+        geom_bounding = box(*geom.bounds)
+        return [
+            woodland_idx
+            for woodland_idx, woodland_bounding in enumerate(self._woodland_bounding)
+            if woodland_bounding.intersects(geom_bounding)
+        ]
+
+
+def run_model(model_cls, ancient_woodland_path, nature_reserve_path, output_path):
+    """
+    @return: (float) seconds to run the model
+    """
+    m = model_cls()
+    m.log_to_stdout = False
+    # the second model would load the woodland the first one cached, not what's being compared
+    m.woodland_cache = False
+    m.ancient_woodland = model_cls.ancient_woodland.clone(
+        engine_url=f"json://{ancient_woodland_path}"
+    )
+    m.nature_reserves = model_cls.nature_reserves.clone(engine_url=f"json://{nature_reserve_path}")
+    m.within_nature_reserves = model_cls.within_nature_reserves.clone(
+        engine_url=f"csv://{output_path}"
+    )
+
+    start = time()
+    m.go()
+    # datasets replaced on the instance aren't always closed by older versions of ayeaye
+    for dataset in m.datasets().values():
+        dataset.close_connection()
+
+    return time() - start
+
+
+def benchmark(woodland_count, working_directory):
+    """
+    @return: (dict) timings for one size of synthetic data
+    """
+    ancient_woodland_path, nature_reserve_path = write_inputs(working_directory, woodland_count)
+    reserve_count = max(1, woodland_count // 100)
+
+    scan_output = os.path.join(working_directory, "bounding_box_scan.csv")
+    index_output = os.path.join(working_directory, "spatial_index.csv")
+
+    scan_seconds = run_model(
+        BoundingBoxScan, ancient_woodland_path, nature_reserve_path, scan_output
+    )
+    index_seconds = run_model(
+        NationalNatureAncientWoodland, ancient_woodland_path, nature_reserve_path, index_output
+    )
+
+    return {
+        "woodland": woodland_count,
+        "nature_reserves": reserve_count,
+        "bounding_box_scan_seconds": round(scan_seconds, 3),
+        "spatial_index_seconds": round(index_seconds, 3),
+        "speed_up": round(scan_seconds / index_seconds, 2),
+        "identical_output": filecmp.cmp(scan_output, index_output, shallow=False),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    args = parser.parse_args()
+
+    results = []
+    for woodland_count in args.sizes:
+        working_directory = tempfile.mkdtemp()
+        try:
+            results.append(benchmark(woodland_count, working_directory))
+        finally:
+            shutil.rmtree(working_directory)
+
+    print(json.dumps(results, indent=4))
@@ -0,0 +1,181 @@
+"""
+Synthetic GeoJSON inputs for benchmarking the ancient woodland models.
+
+Everything is laid out as boxes on the British National Grid (EPSG:27700) and written as WGS84
+GeoJSON, i.e. the same format as the data downloaded from Natural England. The layout is
+deterministic so the same arguments always give byte identical files.
+"""
+
+import json
+import math
+import os
+
+import pyproj
+
+# South west corner of the synthetic area on the OSGB grid. Same as the unit tests.
+OSGB_ORIGIN = (358000, 174000)
+
+
+def woodland_grid(count, side=100, spacing=200, origin=OSGB_ORIGIN):
+    """
+    @param count: (int) number of woodland boxes
+    @param side: (int) length in metres of each side of a box
+    @param spacing: (int) metres between the south west corners of neighbouring boxes
+    @return: (list of (minx, miny, maxx, maxy)) OSGB co-ordinates
+    """
+    per_row = math.ceil(math.sqrt(count))
+    boxes = []
+    for i in range(count):
+        x = origin[0] + (i % per_row) * spacing
+        y = origin[1] + (i // per_row) * spacing
+        boxes.append((x, y, x + side, y + side))
+    return boxes
+
+
+def reserve_grid(count, extent, coverage=0.25, origin=OSGB_ORIGIN):
+    """
+    Nature reserves spread evenly over a square area. Each reserve covers `coverage` of its grid
+    cell and is offset so its edges cut through some woodland boxes and completely cover others.
+
+    @param count: (int) number of nature reserves
+    @param extent: (int) metres along each side of the square area to cover
+    @param coverage: (float) fraction of the area inside a nature reserve. Controls how many
+        woodland are inside or overlap a reserve.
+    @return: (list of (minx, miny, maxx, maxy)) OSGB co-ordinates
+    """
+    per_row = math.ceil(math.sqrt(count))
+    cell = extent / per_row
+    side = cell * math.sqrt(coverage)
+    boxes = []
+    for i in range(count):
+        x = origin[0] + (i % per_row) * cell + 50
+        y = origin[1] + (i // per_row) * cell + 50
+        boxes.append((x, y, x + side, y + side))
+    return boxes
+
+
+def box_ring(minx, miny, maxx, maxy, vertices=4, roughness=0):
+    """
+    @param vertices: (int) number of distinct points around the ring. At least 4, the corners.
+        Extra points are spread along the edges to make the polygon as expensive to overlay as a
+        detailed woodland boundary without changing its shape.
+    @param roughness: (float) metres. Every other extra point is moved this far out of the box
+        so the edges zig-zag like a real boundary and can't be simplified away for free.
+    @return: (list of x, list of y) counter clockwise exterior ring, closed
+    """
+    per_edge = max(1, vertices // 4)
+    corners = [(minx, miny), (maxx, miny), (maxx, maxy), (minx, maxy), (minx, miny)]
+    outwards = [(0, -1), (1, 0), (0, 1), (-1, 0)]
+    xs = []
+    ys = []
+    for ((x0, y0), (x1, y1)), (out_x, out_y) in zip(zip(corners[:-1], corners[1:]), outwards):
+        for step in range(per_edge):
+            offset = roughness if step % 2 else 0
+            xs.append(x0 + (x1 - x0) * step / per_edge + out_x * offset)
+            ys.append(y0 + (y1 - y0) * step / per_edge + out_y * offset)
+    xs.append(minx)
+    ys.append(miny)
+    return xs, ys
+
+
+def feature_collection(name, boxes, properties, vertices=4, roughness=0):
+    """
+    @param name: (str) name of the FeatureCollection
+    @param boxes: (list of (minx, miny, maxx, maxy)) OSGB co-ordinates
+    @param properties: (callable) given the row number, returns a dict of properties
+    @param vertices: (int) see :func:`box_ring`
+    @param roughness: (float) see :func:`box_ring`
+    @return: (dict) GeoJSON FeatureCollection with WGS84 co-ordinates
+    """
+    osgb = pyproj.CRS("EPSG:27700")
+    wgs84 = pyproj.CRS("EPSG:4326")
+    transformer = pyproj.Transformer.from_crs(osgb, wgs84, always_xy=True)
+
+    features = []
+    for row_number, bounds in enumerate(boxes):
+        xs, ys = transformer.transform(*box_ring(*bounds, vertices=vertices, roughness=roughness))
+        features.append(
+            {
+                "type": "Feature",
+                "properties": properties(row_number),
+                "geometry": {
+                    "type": "MultiPolygon",
+                    "coordinates": [[[[x, y] for x, y in zip(xs, ys)]]],
+                },
+            }
+        )
+
+    return {
+        "type": "FeatureCollection",
+        "name": name,
+        "crs": {"type": "name", "properties": {"name": "urn:ogc:def:crs:OGC:1.3:CRS84"}},
+        "features": features,
+    }
+
+
+def woodland_properties(row_number):
+    return {
+        "OBJECTID": row_number + 1,
+        "name": f"Wood {row_number}",
+        "theme": "ancient woodland",
+        "themname": "Ancient & Semi-Natural Woodland",
+        "THEMID": 1481207.0,
+        "status": "ASNW",
+    }
+
+
+def reserve_properties(row_number):
+    return {"OBJECTID": row_number + 1, "NNR_NAME": f"Reserve {row_number}"}
+
+
+def write_inputs(
+    directory, woodland_count, reserve_count=None, vertices=4, coverage=0.25, roughness=0
+):
+    """
+    Write a woodland and a nature reserve GeoJSON file.
+
+    @param directory: (str) existing directory
+    @param woodland_count: (int)
+    @param reserve_count: (int) defaults to one reserve per hundred woodland
+    @param vertices: (int) points around each polygon, see :func:`box_ring`
+    @param coverage: (float) fraction of the area inside a nature reserve, see
+        :func:`reserve_grid`
+    @param roughness: (float) metres, see :func:`box_ring`
+    @return: (str, str) (fake_ancient_woodland_path, fake_nature_reserve_path)
+    """
+    if reserve_count is None:
+        reserve_count = max(1, woodland_count // 100)
+
+    woodland = woodland_grid(woodland_count)
+    ancient_woodland_path = os.path.join(directory, "synthetic_ancient_woodland.geojson")
+    with open(ancient_woodland_path, "w") as f:
+        json.dump(
+            feature_collection(
+                "Synthetic_Woodland", woodland, woodland_properties, vertices, roughness
+            ),
+            f,
+        )
+
+    nature_reserve_path = os.path.join(directory, "synthetic_nature_reserves.geojson")
+    write_reserves(nature_reserve_path, woodland, reserve_count, vertices, coverage, roughness)
+
+    return ancient_woodland_path, nature_reserve_path
+
+
+def write_reserves(path, woodland, reserve_count, vertices=4, coverage=0.25, roughness=0):
+    """
+    Write a nature reserve GeoJSON file covering the area of `woodland`.
+
+    @param path: (str) file to write
+    @param woodland: (list of (minx, miny, maxx, maxy)) from :func:`woodland_grid`
+    @see :func:`write_inputs` for the other params
+    """
+    extent = max(b[2] for b in woodland) - OSGB_ORIGIN[0]
+    reserves = reserve_grid(reserve_count, extent, coverage)
+    with open(path, "w") as f:
+        json.dump(
+            feature_collection(
+                "Synthetic_Reserves", reserves, reserve_properties, vertices, roughness
+            ),
+            f,
+        )
@@ -3,11 +3,48 @@ import json
 import os
 import shutil
 import tempfile
+import pstats
 import unittest
+from unittest import mock
 
+import ayeaye
 import pyproj
 
+from benchmarks.synthetic import write_inputs
+from woodland_investigation.multi_layer_ancient_woodland import MultiLayerAncientWoodland
 from woodland_investigation.national_nature_ancient_woodland import NationalNatureAncientWoodland
+from woodland_investigation.overall_summary import OverallSummary
+from woodland_investigation.partitioned_ancient_woodland import (
+    PartitionedNationalNatureAncientWoodland,
+)
+
+
+class SyntheticPartitionedWoodland(PartitionedNationalNatureAncientWoodland):
+    """
+    Sub-tasks build their own instance of the model class so the datasets are set with the
+    connector resolver (see :meth:`ayeaye.connector_resolver.context`) instead of on an instance.
+    """
+
+    ancient_woodland = PartitionedNationalNatureAncientWoodland.ancient_woodland.clone(
+        engine_url="json://{synthetic_data}/synthetic_ancient_woodland.geojson"
+    )
+    nature_reserves = PartitionedNationalNatureAncientWoodland.nature_reserves.clone(
+        engine_url="json://{synthetic_data}/synthetic_nature_reserves.geojson"
+    )
+    within_nature_reserves = PartitionedNationalNatureAncientWoodland.within_nature_reserves.clone(
+        engine_url="csv://{synthetic_data}/partitioned_inside.csv"
+    )
+
+    # the area covered by :func:`write_inputs` with 400 woodland
+    tile_bounds = (358000, 174000, 362000, 178000)
+
+
+class SyntheticCachedPartitionedWoodland(SyntheticPartitionedWoodland):
+    """
+    Sub-tasks read their tile's woodland from the cache, which is next to the synthetic data.
+    """
+
+    woodland_cache = True
 
 
 class TestAncientWoodland(unittest.TestCase):
@@ -24,6 +61,49 @@ class TestAncientWoodland(unittest.TestCase):
 
         return self._working_directory
 
+    def run_model(self, model):
+        """
+        Run the model and make sure everything it wrote is on disk before the test reads it.
+        """
+        model.go()
+
+        # datasets replaced on the instance aren't always closed by older versions of ayeaye
+        for dataset in model.datasets().values():
+            dataset.close_connection()
+
+    def build_national_model(
+        self, ancient_woodland_path, nature_reserve_path, input_engine="json", **settings
+    ):
+        """
+        @param input_engine: (str) engine type for the GeoJSON inputs
+        @param settings: model attributes to set before the model is run
+        @return: (list of dict) rows from the output CSV
+        """
+        m = NationalNatureAncientWoodland()
+        m.log_to_stdout = False
+        for attribute, value in settings.items():
+            setattr(m, attribute, value)
+
+        m.ancient_woodland = NationalNatureAncientWoodland.ancient_woodland.clone(
+            engine_url=f"{input_engine}://{ancient_woodland_path}"
+        )
+        m.nature_reserves = NationalNatureAncientWoodland.nature_reserves.clone(
+            engine_url=f"{input_engine}://{nature_reserve_path}"
+        )
+        output_path = os.path.join(self.working_directory(), "inside.csv")
+        m.within_nature_reserves = NationalNatureAncientWoodland.within_nature_reserves.clone(
+            engine_url=f"csv://{output_path}"
+        )
+        audit_path = os.path.join(self.working_directory(), "simplification_audit.json")
+        m.simplification_audit = NationalNatureAncientWoodland.simplification_audit.clone(
+            engine_url=f"json://{audit_path}"
+        )
+        self.run_model(m)
+        self.last_model = m
+
+        with open(output_path, encoding="utf-8-sig") as f:
+            return list(csv.DictReader(f))
+
     def create_fake_inputs(self):
         """
         create a nature 64 sq km reserve with a 50% overlap with a 64 sq km ancient woodland.
@@ -159,7 +239,7 @@ class TestAncientWoodland(unittest.TestCase):
         )
 
         # run the model
-        m.go()
+        self.run_model(m)
 
         msg = (
             "The overlap will be box_side x overlap = 5,000 m2 = 0.005 km 2. The re-projections"
@@ -177,3 +257,437 @@ class TestAncientWoodland(unittest.TestCase):
         msg = "area of fake ancient woodland is: box_side x box_side -> km sq"
         expected_area = (100 * 100) / (1000 * 1000)
         self.assertAlmostEqual(expected_area, float(single_row["total_area"]), places=3, msg=msg)
+
+    def test_many_woodland_and_reserves(self):
+        """Only woodland that is inside a nature reserve gets an area. Output is in the same order
+        as the input woodland.
+        """
+        ancient_woodland_path, nature_reserve_path = write_inputs(
+            self.working_directory(), woodland_count=100, reserve_count=4
+        )
+        rows = self.build_national_model(ancient_woodland_path, nature_reserve_path)
+
+        self.assertEqual([str(i) for i in range(100)], [r["OBJECTID"] for r in rows])
+
+        # first reserve starts at (50, 50) metres from the origin so cuts the first woodland box
+        # in half both ways. The woodland at (200, 200) is completely inside the reserve.
+        self.assertAlmostEqual(0.0025, float(rows[0]["area_in_nature_reserve"]), places=4)
+        self.assertEqual(rows[11]["total_area"], rows[11]["area_in_nature_reserve"])
+        self.assertAlmostEqual(0.01, float(rows[11]["area_in_nature_reserve"]), places=4)
+
+        # reserves only cover a quarter of the area so plenty of woodland is outside them all
+        outside = [r for r in rows if float(r["area_in_nature_reserve"]) == 0.0]
+        self.assertGreater(len(outside), 50)
+
+    def test_overlap_projected_up_front(self):
+        """The synthetic inputs are boxes on the OSGB grid so doing all the maths on that grid
+        gives exact areas.
+        """
+        ancient_woodland_path, nature_reserve_path = write_inputs(
+            self.working_directory(), woodland_count=1, reserve_count=1
+        )
+        rows = self.build_national_model(
+            ancient_woodland_path, nature_reserve_path, project_up_front=True
+        )
+        self.assertEqual(1, len(rows))
+
+        # reserve covers the north east quarter of the woodland
+        self.assertAlmostEqual(0.0025, float(rows[0]["area_in_nature_reserve"]), places=9)
+        self.assertAlmostEqual(0.01, float(rows[0]["total_area"]), places=9)
+
+    def test_columnar_same_as_per_nature_reserve(self):
+        ancient_woodland_path, nature_reserve_path = write_inputs(
+            self.working_directory(), woodland_count=400, reserve_count=9
+        )
+        for project_up_front in (False, True):
+            per_nature_reserve = self.build_national_model(
+                ancient_woodland_path, nature_reserve_path, project_up_front=project_up_front
+            )
+            columnar = self.build_national_model(
+                ancient_woodland_path,
+                nature_reserve_path,
+                project_up_front=project_up_front,
+                columnar=True,
+            )
+            self.assertEqual(per_nature_reserve, columnar)
+
+    def test_geojson_stream_same_as_json(self):
+        ancient_woodland_path, nature_reserve_path = write_inputs(
+            self.working_directory(), woodland_count=100
+        )
+        from_json = self.build_national_model(ancient_woodland_path, nature_reserve_path)
+        from_stream = self.build_national_model(
+            ancient_woodland_path, nature_reserve_path, input_engine="geojson-stream"
+        )
+        self.assertEqual(from_json, from_stream)
+
+    def test_woodland_cache(self):
+        ancient_woodland_path, nature_reserve_path = write_inputs(
+            self.working_directory(), woodland_count=100
+        )
+        cache_directory = os.path.join(self.working_directory(), ".woodland_cache")
+
+        # off by default
+        uncached = self.build_national_model(ancient_woodland_path, nature_reserve_path)
+        self.assertFalse(os.path.exists(cache_directory))
+
+        for project_up_front in (False, True):
+            first_run = self.build_national_model(
+                ancient_woodland_path,
+                nature_reserve_path,
+                project_up_front=project_up_front,
+                woodland_cache=True,
+            )
+            from_cache = self.build_national_model(
+                ancient_woodland_path,
+                nature_reserve_path,
+                project_up_front=project_up_front,
+                woodland_cache=True,
+            )
+            self.assertEqual(first_run, from_cache)
+            if not project_up_front:
+                self.assertEqual(uncached, from_cache)
+
+        # one entry for each co-ordinate system
+        entries = [e for e in os.listdir(cache_directory) if e != "sources.json"]
+        self.assertEqual(2, len(entries))
+
+    def test_incompatible_settings(self):
+        m = NationalNatureAncientWoodland()
+        m.incremental = True
+        m.simplify_tolerance = 3
+        with self.assertRaises(ValueError):
+            m.check_settings()
+
+        m.simplify_tolerance = None
+        m.overlap_workers = 2
+        m.check_settings()
+
+    def test_simplify_error_band(self):
+        m = NationalNatureAncientWoodland()
+        m.simplify_tolerance = 3
+        for band in (-1, 0, 5.9):
+            m.simplify_error_band = band
+            with self.assertRaises(ValueError):
+                m.check_settings()
+
+        for band in (None, 6, 20):
+            m.simplify_error_band = band
+            m.check_settings()
+
+        m.simplify_tolerance = None
+        m.simplify_error_band = -1
+        with self.assertRaises(ValueError):
+            m.check_settings()
+
+    def test_incremental(self):
+        ancient_woodland_path, nature_reserve_path = write_inputs(
+            self.working_directory(), woodland_count=400, reserve_count=9
+        )
+        state_directory = os.path.join(self.working_directory(), "state")
+
+        first_run = self.build_national_model(
+            ancient_woodland_path,
+            nature_reserve_path,
+            incremental=True,
+            incremental_state_directory=state_directory,
+        )
+        self.assertEqual(0, self.last_model.stats["pairs_reused"])
+        self.assertEqual(
+            self.build_national_model(ancient_woodland_path, nature_reserve_path, columnar=True),
+            first_run,
+        )
+
+        # remove one nature reserve and move another
+        with open(nature_reserve_path) as f:
+            nature_reserves = json.load(f)
+        del nature_reserves["features"][0]
+        ring = nature_reserves["features"][1]["geometry"]["coordinates"][0][0]
+        for point in ring:
+            point[0] += 0.0005
+        with open(nature_reserve_path, "w") as f:
+            json.dump(nature_reserves, f)
+
+        second_run = self.build_national_model(
+            ancient_woodland_path,
+            nature_reserve_path,
+            incremental=True,
+            incremental_state_directory=state_directory,
+        )
+        self.assertGreater(self.last_model.stats["pairs_reused"], 0)
+        self.assertGreater(self.last_model.stats["pairs_calculated"], 0)
+        self.assertEqual(
+            self.build_national_model(ancient_woodland_path, nature_reserve_path, columnar=True),
+            second_run,
+        )
+        self.assertNotEqual(first_run, second_run)
+
+    def test_metrics(self):
+        ancient_woodland_path, nature_reserve_path = write_inputs(
+            self.working_directory(), woodland_count=400, reserve_count=9
+        )
+        metrics_path = os.path.join(self.working_directory(), "metrics.json")
+        profile_path = os.path.join(self.working_directory(), "run.prof")
+
+        for settings in ({}, {"columnar": True, "woodland_cache": True}):
+            environment = {"WOODLAND_METRICS_JSON": metrics_path, "WOODLAND_PROFILE": profile_path}
+            with mock.patch.dict(os.environ, environment):
+                self.build_national_model(ancient_woodland_path, nature_reserve_path, **settings)
+
+            with open(metrics_path) as f:
+                metrics = json.load(f)
+            self.assertEqual(self.last_model.metrics, metrics)
+
+            phases = metrics["phases"]
+            for phase_name in (
+                "spatial_index",
+                "candidate_filtering",
+                "exact_intersection",
+                "output_write",
+            ):
+                self.assertIn(phase_name, phases)
+            self.assertEqual(400, phases["output_write"]["items"])
+
+            stats = self.last_model.stats
+            self.assertEqual(
+                stats["contained_woodland"]
+                + stats["partial_woodland"]
+                + stats["disjoint_woodland"],
+                metrics["counts"]["pairs_tested"],
+            )
+            self.assertEqual(
+                stats["contained_woodland"] + stats["partial_woodland"],
+                metrics["counts"]["pairs_overlapping"],
+            )
+
+            # a cProfile stats file
+            self.assertGreater(pstats.Stats(profile_path).total_calls, 0)
+
+        # only the second run used the cache
+        self.assertIn("woodland_cache_save", phases)
+
+    def build_multi_layer_model(self, ancient_woodland_path, national_path, local_path):
+        """
+        @return: (list of dict) rows from the output CSV
+        """
+        m = MultiLayerAncientWoodland()
+        m.log_to_stdout = False
+        m.ancient_woodland = MultiLayerAncientWoodland.ancient_woodland.clone(
+            engine_url=f"json://{ancient_woodland_path}"
+        )
+        m.national_nature_reserves = MultiLayerAncientWoodland.national_nature_reserves.clone(
+            engine_url=f"json://{national_path}"
+        )
+        m.local_nature_reserves = MultiLayerAncientWoodland.local_nature_reserves.clone(
+            engine_url=f"json://{local_path}"
+        )
+        output_path = os.path.join(self.working_directory(), "inside_by_layer.csv")
+        m.within_nature_reserves = MultiLayerAncientWoodland.within_nature_reserves.clone(
+            engine_url=f"csv://{output_path}"
+        )
+        self.run_model(m)
+
+        with open(output_path, encoding="utf-8-sig") as f:
+            return list(csv.DictReader(f))
+
+    def test_multi_layer_unsupported_settings(self):
+        MultiLayerAncientWoodland().check_settings()
+
+        for setting_name, value in (
+            ("incremental", True),
+            ("simplify_tolerance", 3),
+            ("overlap_workers", 2),
+        ):
+            m = MultiLayerAncientWoodland()
+            m.log_to_stdout = False
+            setattr(m, setting_name, value)
+            with self.assertRaises(ValueError) as context:
+                m.check_settings()
+            self.assertIn(setting_name, str(context.exception))
+
+            # before anything is loaded
+            with self.assertRaises(ValueError):
+                m.build()
+
+    def test_multi_layer_same_as_single_layers(self):
+        ancient_woodland_path, national_path = write_inputs(
+            self.working_directory(), woodland_count=400, reserve_count=9
+        )
+        local_directory = os.path.join(self.working_directory(), "local")
+        os.mkdir(local_directory)
+        _, local_path = write_inputs(local_directory, woodland_count=400, reserve_count=4)
+
+        national = self.build_national_model(ancient_woodland_path, national_path)
+        local = self.build_national_model(ancient_woodland_path, local_path)
+        by_layer = self.build_multi_layer_model(ancient_woodland_path, national_path, local_path)
+
+        self.assertEqual(
+            [r["area_in_nature_reserve"] for r in national],
+            [r["area_in_national"] for r in by_layer],
+        )
+        self.assertEqual(
+            [r["area_in_nature_reserve"] for r in local], [r["area_in_local"] for r in by_layer]
+        )
+        self.assertEqual([r["total_area"] for r in national], [r["total_area"] for r in by_layer])
+
+        for r in by_layer:
+            area_in_any = float(r["area_in_any"])
+            self.assertLessEqual(area_in_any, float(r["total_area"]) + 1e-12)
+            self.assertGreaterEqual(
+                area_in_any + 1e-12, max(float(r["area_in_national"]), float(r["area_in_local"]))
+            )
+        self.assertTrue(any(float(r["area_in_any"]) > 0 for r in by_layer))
+
+    def test_multi_layer_overlapping_layers_counted_once(self):
+        ancient_woodland_path, nature_reserve_path = write_inputs(
+            self.working_directory(), woodland_count=400, reserve_count=9
+        )
+        # the same reserves in both layers
+        by_layer = self.build_multi_layer_model(
+            ancient_woodland_path, nature_reserve_path, nature_reserve_path
+        )
+        for r in by_layer:
+            self.assertEqual(r["area_in_national"], r["area_in_local"])
+            self.assertAlmostEqual(float(r["area_in_national"]), float(r["area_in_any"]), places=9)
+
+    def test_simplified(self):
+        # zig-zag edges that a 3m tolerance simplifies away
+        ancient_woodland_path, nature_reserve_path = write_inputs(
+            self.working_directory(), woodland_count=400, reserve_count=9, vertices=64, roughness=2
+        )
+        exact = self.build_national_model(
+            ancient_woodland_path, nature_reserve_path, project_up_front=True, columnar=True
+        )
+        simplified = self.build_national_model(
+            ancient_woodland_path, nature_reserve_path, project_up_front=True, simplify_tolerance=3
+        )
+        stats = self.last_model.stats
+        self.assertGreater(stats["pairs_simplified"], 0)
+        self.assertGreater(stats["pairs_full_resolution"], 0)
+
+        audit_path = os.path.join(self.working_directory(), "simplification_audit.json")
+        with open(audit_path, encoding="utf-8-sig") as f:
+            audit = json.load(f)
+        self.assertEqual(stats["pairs_simplified"], audit["pairs_simplified"])
+        self.assertGreater(audit["max_woodland_area_error"], 0)
+
+        errors = [
+            abs(float(e["area_in_nature_reserve"]) - float(s["area_in_nature_reserve"]))
+            for e, s in zip(exact, simplified)
+        ]
+        self.assertLessEqual(max(errors), audit["max_woodland_area_error"])
+        self.assertEqual([e["total_area"] for e in exact], [s["total_area"] for s in simplified])
+
+    def test_overlap_workers_same_as_columnar(self):
+        ancient_woodland_path, nature_reserve_path = write_inputs(
+            self.working_directory(), woodland_count=400, reserve_count=9
+        )
+        columnar = self.build_national_model(
+            ancient_woodland_path, nature_reserve_path, columnar=True
+        )
+        for workers, chunk_size in ((2, 7), (3, 50)):
+            parallel = self.build_national_model(
+                ancient_woodland_path,
+                nature_reserve_path,
+                overlap_workers=workers,
+                overlap_chunk_size=chunk_size,
+            )
+            self.assertEqual(columnar, parallel)
+
+    def test_partitioned_same_as_serial(self):
+        ancient_woodland_path, nature_reserve_path = write_inputs(
+            self.working_directory(), woodland_count=400, reserve_count=9
+        )
+        serial = self.build_national_model(ancient_woodland_path, nature_reserve_path)
+
+        output_path = os.path.join(self.working_directory(), "partitioned_inside.csv")
+        cache_directory = os.path.join(self.working_directory(), ".woodland_cache")
+        for model_cls in (SyntheticPartitionedWoodland, SyntheticCachedPartitionedWoodland):
+            for processes in (1, 4):
+                with ayeaye.connector_resolver.context(synthetic_data=self.working_directory()):
+                    m = model_cls()
+                    m.log_to_stdout = False
+                    m.runtime.max_concurrent_tasks = processes
+                    self.run_model(m)
+
+                with open(output_path, encoding="utf-8-sig") as f:
+                    partitioned = list(csv.DictReader(f))
+
+                self.assertEqual(serial, partitioned)
+                # only written when the cache is turned on
+                self.assertEqual(model_cls.woodland_cache, os.path.isdir(cache_directory))
+
+    def summarise(self, within_national_url, within_local_url):
+        """
+        @return: (dict) written by :class:`OverallSummary` with .by_name, name to area within
+            nature reserves
+        """
+        summary_path = os.path.join(self.working_directory(), "summary.json")
+        m = OverallSummary()
+        m.log_to_stdout = False
+        m.within_national = OverallSummary.within_national.clone(engine_url=within_national_url)
+        m.within_local = OverallSummary.within_local.clone(engine_url=within_local_url)
+        m.summary = OverallSummary.summary.clone(engine_url=f"json://{summary_path}")
+        by_name_path = os.path.join(self.working_directory(), "summary_by_name.csv")
+        m.summary_by_name = OverallSummary.summary_by_name.clone(engine_url=f"csv://{by_name_path}")
+        self.run_model(m)
+
+        with open(summary_path, encoding="utf-8-sig") as f:
+            summary = json.load(f)
+
+        with open(by_name_path, encoding="utf-8-sig") as f:
+            summary["by_name"] = {r["name"]: float(r["area_within"]) for r in csv.DictReader(f)}
+
+        return summary
+
+    def test_columnar_output_same_as_csv(self):
+        ancient_woodland_path, national_path = write_inputs(
+            self.working_directory(), woodland_count=400, reserve_count=9
+        )
+        local_directory = os.path.join(self.working_directory(), "local")
+        os.mkdir(local_directory)
+        _, local_path = write_inputs(local_directory, woodland_count=400, reserve_count=4)
+
+        output_urls = {}
+        for layer, nature_reserve_path in (("national", national_path), ("local", local_path)):
+            rows = self.build_national_model(ancient_woodland_path, nature_reserve_path)
+            csv_path = os.path.join(self.working_directory(), f"inside_{layer}.csv")
+            os.rename(os.path.join(self.working_directory(), "inside.csv"), csv_path)
+
+            for extension in ("parquet", "arrow"):
+                output_path = os.path.join(self.working_directory(), f"inside_{layer}.{extension}")
+                m = self.last_model
+                m.within_nature_reserves = (
+                    NationalNatureAncientWoodland.within_nature_reserves.clone(
+                        engine_url=f"columnar://{output_path}"
+                    )
+                )
+                self.run_model(m)
+
+                columns = ayeaye.Connect(engine_url=f"columnar://{output_path}").read_columns()
+                self.assertEqual(
+                    ["OBJECTID", "name", "area_in_nature_reserve", "total_area"], list(columns)
+                )
+                self.assertEqual(
+                    [r["OBJECTID"] for r in rows], [str(i) for i in columns["OBJECTID"]]
+                )
+                for column in ("area_in_nature_reserve", "total_area"):
+                    self.assertEqual([float(r[column]) for r in rows], columns[column].tolist())
+
+            output_urls[layer] = (f"csv://{csv_path}", f"columnar://{output_path}")
+
+        from_csv = self.summarise(output_urls["national"][0], output_urls["local"][0])
+        from_columns = self.summarise(output_urls["national"][1], output_urls["local"][1])
+        self.assertEqual(from_csv.keys(), from_columns.keys())
+        for key in ("area_total", "area_within", "ancient_woodland_within_nature_reserves"):
+            self.assertAlmostEqual(from_csv[key], from_columns[key], places=9)
+
+        self.assertEqual(from_csv["by_name"].keys(), from_columns["by_name"].keys())
+        self.assertAlmostEqual(from_csv["area_within"], sum(from_csv["by_name"].values()), places=9)
+
+    def test_tile_grid(self):
+        m = PartitionedNationalNatureAncientWoodland()
+        for partition_count in (1, 2, 7, 16, 100):
+            columns, rows = m.tile_grid(partition_count)
+            self.assertLessEqual(columns * rows, partition_count)
+            self.assertGreaterEqual(columns * rows, partition_count / 2)
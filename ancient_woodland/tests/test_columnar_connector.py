@@ -0,0 +1,89 @@
+import gc
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+import ayeaye
+import numpy
+
+from woodland_investigation import columnar_connector
+from woodland_investigation.columnar_connector import ColumnarConnector
+
+
+class TestColumnarConnector(unittest.TestCase):
+    def setUp(self):
+        self.working_directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.working_directory)
+
+    def columns(self):
+        return {
+            "OBJECTID": numpy.arange(5, dtype=numpy.int64),
+            "name": numpy.array(["Long wood", None, "Big wood", "Unknown", "Small wood"]),
+            "total_area": numpy.linspace(0.5, 2.5, 5),
+        }
+
+    def test_write_columns_and_read(self):
+        for extension in ("parquet", "arrow"):
+            engine_url = f"columnar://{self.working_directory}/out/woodland.{extension}"
+            output = ColumnarConnector(
+                engine_url=engine_url,
+                access=ayeaye.AccessMode.WRITE,
+                field_names=["OBJECTID", "total_area", "name"],
+            )
+            output.write_columns(self.columns())
+            output.close_connection()
+
+            dataset = ColumnarConnector(engine_url=engine_url)
+            self.assertEqual(5, len(dataset))
+
+            columns = dataset.read_columns()
+            self.assertEqual(["OBJECTID", "total_area", "name"], list(columns))
+            numpy.testing.assert_array_equal(self.columns()["total_area"], columns["total_area"])
+
+            batches = list(dataset.iter_batches(batch_size=2, columns=["OBJECTID"]))
+            self.assertEqual([2, 2, 1], [len(b["OBJECTID"]) for b in batches])
+            self.assertEqual([["OBJECTID"]] * 3, [list(b) for b in batches])
+
+            rows = [row for row in dataset]
+            self.assertEqual("Long wood", rows[0].name)
+            self.assertEqual(4, rows[4].OBJECTID)
+
+    def test_add_rows(self):
+        engine_url = f"columnar://{self.working_directory}/woodland.parquet"
+        output = ColumnarConnector(engine_url=engine_url, access=ayeaye.AccessMode.WRITE)
+        for row in [{"OBJECTID": 1, "name": "Long wood"}, {"OBJECTID": 2, "name": None}]:
+            output.add(row)
+        output.close_connection()
+
+        columns = ColumnarConnector(engine_url=engine_url).read_columns()
+        self.assertEqual([1, 2], columns["OBJECTID"].tolist())
+        self.assertEqual(["Long wood", None], columns["name"].tolist())
+
+    def test_expected_fields(self):
+        engine_url = f"columnar://{self.working_directory}/woodland.parquet"
+        output = ColumnarConnector(engine_url=engine_url, access=ayeaye.AccessMode.WRITE)
+        output.write_columns(self.columns())
+
+        dataset = ColumnarConnector(engine_url=engine_url, expected_fields=["OBJECTID", "area"])
+        with self.assertRaises(ValueError):
+            dataset.read_columns()
+
+        with self.assertRaises(ValueError):
+            dataset.write_columns(self.columns())
+
+    def test_without_pyarrow(self):
+        engine_url = f"columnar://{self.working_directory}/woodland.parquet"
+        # errors from __del__ are only reported to sys.unraisablehook
+        unraisable = []
+        with mock.patch.object(sys, "unraisablehook", unraisable.append):
+            with mock.patch.object(columnar_connector, "pyarrow", None):
+                with self.assertRaises(ImportError):
+                    ColumnarConnector(engine_url=engine_url)
+            gc.collect()
+
+        self.assertEqual([], unraisable)
@@ -0,0 +1,70 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import ayeaye
+
+from benchmarks.synthetic import write_inputs
+from woodland_investigation.geojson_stream import GeojsonStreamConnector
+
+
+class TestGeojsonStream(unittest.TestCase):
+    def setUp(self):
+        self.working_directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.working_directory)
+
+    def write_geojson(self, document, indent=None):
+        path = os.path.join(self.working_directory, "test.geojson")
+        with open(path, "w") as f:
+            json.dump(document, f, indent=indent)
+        return path
+
+    def test_same_features_as_json_connector(self):
+        ancient_woodland_path, _ = write_inputs(self.working_directory, 20)
+
+        json_features = ayeaye.Connect(engine_url=f"json://{ancient_woodland_path}")
+        stream_features = ayeaye.Connect(engine_url=f"geojson-stream://{ancient_woodland_path}")
+
+        expected = [f.as_dict() for f in json_features.data.features]
+        self.assertEqual(20, len(expected))
+        self.assertEqual(expected, [f.as_dict() for f in stream_features.data.features])
+
+        # the features can be read more than once
+        self.assertEqual(expected, [f.as_dict() for f in stream_features.data.features])
+
+    def test_chunk_boundaries(self):
+        """
+        Every value, including numbers, ends up split across chunks when the chunks are tiny.
+        """
+        features = [
+            {"type": "Feature", "properties": {"name": f"Wood {i}", "area": i * 1.25}}
+            for i in range(5)
+        ]
+        path = self.write_geojson(
+            {"type": "FeatureCollection", "features": features, "name": "after features"},
+            indent=2,
+        )
+        for chunk_size in (1, 2, 7, 1000):
+            stream = GeojsonStreamConnector(engine_url=f"geojson-stream://{path}")
+            stream.chunk_size = chunk_size
+            self.assertEqual(features, [f.as_dict() for f in stream], f"chunk_size={chunk_size}")
+
+    def test_empty_feature_collection(self):
+        path = self.write_geojson({"type": "FeatureCollection", "features": []})
+        self.assertEqual(
+            [], [f for f in GeojsonStreamConnector(engine_url=f"geojson-stream://{path}")]
+        )
+
+        path = self.write_geojson({})
+        self.assertEqual(
+            [], [f for f in GeojsonStreamConnector(engine_url=f"geojson-stream://{path}")]
+        )
+
+    def test_invalid_geojson(self):
+        path = self.write_geojson([{"type": "Feature"}])
+        with self.assertRaises(ValueError):
+            [f for f in GeojsonStreamConnector(engine_url=f"geojson-stream://{path}")]
@@ -0,0 +1,20 @@
+import unittest
+
+from shapely import prepare
+from shapely.geometry import box
+
+from woodland_investigation.overlay import Overlap, classify_overlap
+
+
+class TestOverlay(unittest.TestCase):
+    def test_classify_overlap(self):
+        nature_reserve = box(0, 0, 10, 10)
+        prepare(nature_reserve)
+
+        self.assertEqual(Overlap.CONTAINED, classify_overlap(nature_reserve, box(2, 2, 4, 4)))
+        self.assertEqual(Overlap.CONTAINED, classify_overlap(nature_reserve, box(0, 0, 4, 4)))
+        self.assertEqual(Overlap.PARTIAL, classify_overlap(nature_reserve, box(8, 8, 12, 12)))
+        self.assertEqual(Overlap.DISJOINT, classify_overlap(nature_reserve, box(20, 20, 24, 24)))
+
+        # only sharing an edge doesn't put any woodland inside the reserve
+        self.assertEqual(Overlap.DISJOINT, classify_overlap(nature_reserve, box(10, 0, 14, 4)))
@@ -0,0 +1,73 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import ayeaye
+import numpy
+
+from woodland_investigation import summary_aggregation
+from woodland_investigation.summary_aggregation import WoodlandAreaTotals, column_chunks
+
+
+class TestSummaryAggregation(unittest.TestCase):
+    def setUp(self):
+        self.working_directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.working_directory)
+
+    def chunk(self, object_ids, names, area_within, total_area):
+        return {
+            "OBJECTID": numpy.array(object_ids, dtype=numpy.int64),
+            "name": numpy.array(names, dtype=str),
+            "area_in_nature_reserve": numpy.array(area_within, dtype=float),
+            "total_area": numpy.array(total_area, dtype=float),
+        }
+
+    def test_total_area_counted_once(self):
+        totals = WoodlandAreaTotals()
+        totals.add(self.chunk([0, 3, 3], ["A", "B", "B"], [0.5, 0.0, 1.0], [1.0, 2.0, 2.0]))
+        # needs the bitmap to grow
+        totals.add(self.chunk([3, 100, 0], ["B", "A", "A"], [0.25, 4.0, 0.0], [2.0, 8.0, 1.0]))
+        totals.add(self.chunk([], [], [], []))
+
+        self.assertEqual(11.0, totals.area_total)
+        self.assertEqual(5.75, totals.area_within)
+        self.assertEqual({"A": [9.0, 4.5], "B": [2.0, 1.25]}, totals.by_name)
+
+    def test_negative_object_id(self):
+        with self.assertRaises(ValueError):
+            WoodlandAreaTotals().add(self.chunk([-1], ["A"], [0.0], [1.0]))
+
+    def test_csv_chunks(self):
+        csv_path = os.path.join(self.working_directory, "inside.csv")
+        output = ayeaye.Connect(
+            engine_url=f"csv://{csv_path}",
+            access=ayeaye.AccessMode.WRITE,
+            field_names=["OBJECTID", "name", "area_in_nature_reserve", "total_area"],
+        )
+        for object_id in range(10):
+            output.add(
+                {
+                    "OBJECTID": object_id,
+                    "name": f"Wood, {object_id % 3}",
+                    "area_in_nature_reserve": object_id / 10,
+                    "total_area": 1.0,
+                }
+            )
+        output.close_connection()
+
+        dataset = ayeaye.Connect(engine_url=f"csv://{csv_path}")
+        column_types = {"OBJECTID": numpy.int64, "name": str, "total_area": numpy.float64}
+
+        with mock.patch.object(summary_aggregation, "pyarrow", None):
+            csv_module_chunks = list(column_chunks(dataset, column_types, chunk_rows=4))
+        self.assertEqual([4, 4, 2], [len(c["OBJECTID"]) for c in csv_module_chunks])
+
+        for chunks in (csv_module_chunks, list(column_chunks(dataset, column_types))):
+            object_ids = numpy.concatenate([c["OBJECTID"] for c in chunks])
+            self.assertEqual(list(range(10)), object_ids.tolist())
+            self.assertEqual("Wood, 2", chunks[0]["name"][2])
+            self.assertEqual(["OBJECTID", "name", "total_area"], list(chunks[0]))
@@ -0,0 +1,81 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import ayeaye
+import numpy
+import shapely
+from shapely.geometry import box
+
+from woodland_investigation.woodland_cache import WoodlandCache
+
+
+class TestWoodlandCache(unittest.TestCase):
+    def setUp(self):
+        self.working_directory = tempfile.mkdtemp()
+        self.source_path = os.path.join(self.working_directory, "woodland.geojson")
+        with open(self.source_path, "w") as f:
+            f.write('{"type": "FeatureCollection", "features": []}')
+
+    def tearDown(self):
+        shutil.rmtree(self.working_directory)
+
+    def woodland(self):
+        geoms = numpy.array([box(0, 0, 1, 1), box(2, 2, 4, 5.5)], dtype=object)
+        return ayeaye.Pinnate(
+            {
+                "OBJECTID": numpy.array([3, 7], dtype=numpy.int64),
+                "name": numpy.array(["Long wood", "Unknown"], dtype=object),
+                "geom": geoms,
+                "total_area": shapely.area(geoms),
+                "osgb_bounds": shapely.bounds(geoms),
+            }
+        )
+
+    def test_save_and_load(self):
+        cache = WoodlandCache(self.source_path, "EPSG:27700")
+        self.assertIsNone(cache.load())
+
+        woodland = self.woodland()
+        cache.save(woodland)
+
+        # the same file in a different co-ordinate system isn't in the cache
+        self.assertIsNone(WoodlandCache(self.source_path, "EPSG:4326").load())
+
+        cached = WoodlandCache(self.source_path, "EPSG:27700").load()
+        self.assertEqual(woodland.OBJECTID.tolist(), cached.OBJECTID.tolist())
+        self.assertEqual(woodland.name.tolist(), cached.name.tolist())
+        self.assertTrue(all(shapely.equals_exact(woodland.geom, cached.geom, tolerance=0)))
+        self.assertEqual(woodland.total_area.tolist(), cached.total_area.tolist())
+        self.assertEqual(woodland.osgb_bounds.tolist(), cached.osgb_bounds.tolist())
+
+    def test_load_selected(self):
+        cache = WoodlandCache(self.source_path, "EPSG:27700")
+        self.assertFalse(cache.exists())
+        cache.save(self.woodland())
+        self.assertTrue(cache.exists())
+
+        cached = cache.load(select=lambda osgb_bounds: osgb_bounds[:, 0] > 1)
+        self.assertEqual([7], cached.OBJECTID.tolist())
+        self.assertEqual(["Unknown"], cached.name.tolist())
+        self.assertTrue(shapely.equals_exact(box(2, 2, 4, 5.5), cached.geom[0], tolerance=0))
+        self.assertEqual([[2, 2, 4, 5.5]], cached.osgb_bounds.tolist())
+
+        nothing = cache.load(select=lambda osgb_bounds: numpy.zeros(len(osgb_bounds), bool))
+        self.assertEqual(0, len(nothing.geom))
+
+    def test_source_file_changed(self):
+        cache = WoodlandCache(self.source_path, "EPSG:27700")
+        cache.save(self.woodland())
+        old_entry = cache.entry_directory
+
+        with open(self.source_path, "a") as f:
+            f.write("\n")
+
+        cache = WoodlandCache(self.source_path, "EPSG:27700")
+        self.assertIsNone(cache.load())
+
+        cache.save(self.woodland())
+        self.assertNotEqual(old_entry, cache.entry_directory)
+        self.assertFalse(os.path.exists(old_entry), "entry for the old file should be removed")
@@ -0,0 +1,191 @@
+"""
+Read and write tables as whole columns with Apache Arrow.
+
+The CSV connector writes a row at a time and every value read back is a string that has to be
+parsed. The woodland models already hold their output as NumPy columns so this connector writes
+them in one batch and reads them back as NumPy arrays without any parsing.
+"""
+
+import ayeaye
+from ayeaye.connectors.base import AccessMode, DataConnector, FileBasedConnector
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+
+class ColumnarConnector(FileBasedConnector):
+    engine_type = "columnar://"
+    optional_args = {
+        **FileBasedConnector.optional_args,
+        "field_names": None,
+        "expected_fields": None,
+    }
+
+    # file extension to format. Anything else is Parquet.
+    ipc_extensions = (".arrow", ".feather", ".ipc")
+
+    def __init__(self, *args, **kwargs):
+        """
+        Connector to a Parquet or Arrow IPC file. The format is from the file's extension, see
+        `ipc_extensions`.
+
+        For args: @see :class:`connectors.base.FileBasedConnector`
+
+        additional args for ColumnarConnector
+            field_names (list of str) - order of the columns when writing
+            expected_fields (list of str) - columns that must be in the file when reading
+
+        Connection information-
+            engine_url format is columnar://<filesystem absolute path>
+        e.g. columnar:///data/Ancient_woodland_inside_national_nature_reserves.parquet
+        """
+        # before anything can fail so close_connection() works when the instance is deleted
+        self._reset()
+        if pyarrow is None:
+            raise ImportError("columnar:// needs pyarrow, install it with: pip install pyarrow")
+
+        super().__init__(*args, **kwargs)
+
+    def _reset(self):
+        FileBasedConnector._reset(self)
+        self._rows = None
+
+    @property
+    def is_ipc(self):
+        return self.file_path.lower().endswith(self.ipc_extensions)
+
+    def connect(self):
+        # pyarrow opens the file when it's read or written so there isn't a file handle to keep
+        DataConnector.connect(self)
+
+    def close_connection(self):
+        if self._rows:
+            columns = {
+                field_name: [row[field_name] for row in self._rows]
+                for field_name in self._write_field_names(self._rows[0].keys())
+            }
+            self._rows = None
+            self.write_columns(columns)
+
+        super().close_connection()
+
+    def _write_field_names(self, available):
+        if self.field_names is not None:
+            return list(self.field_names)
+        return list(available)
+
+    def write_columns(self, columns):
+        """
+        Write the whole file in one batch.
+
+        @param columns: (dict) column name to numpy array or list. All the same length.
+        """
+        if self.access not in (AccessMode.WRITE, AccessMode.READWRITE):
+            raise ValueError("Write attempted on dataset opened for READ.")
+
+        self.auto_create_directory()
+        table = pyarrow.table(
+            {name: columns[name] for name in self._write_field_names(columns.keys())}
+        )
+        if self.is_ipc:
+            with pyarrow.ipc.new_file(self.file_path, table.schema) as writer:
+                writer.write_table(table)
+        else:
+            pyarrow.parquet.write_table(table, self.file_path)
+
+    def add(self, data):
+        """
+        Write a row. Rows are kept in memory and written as columns when the dataset is closed.
+        :meth:`write_columns` avoids building the rows in the first place.
+
+        @param data: (dict or :class:`Pinnate`)
+        """
+        if self.access not in (AccessMode.WRITE, AccessMode.READWRITE):
+            raise ValueError("Write attempted on dataset opened for READ.")
+
+        if isinstance(data, ayeaye.Pinnate):
+            data = data.as_dict()
+
+        if self._rows is None:
+            self._rows = []
+        self._rows.append(data)
+
+    def _read_table(self, columns=None):
+        if self.is_ipc:
+            with pyarrow.ipc.open_file(pyarrow.memory_map(self.file_path)) as reader:
+                table = reader.read_all()
+            return table if columns is None else table.select(columns)
+
+        return pyarrow.parquet.read_table(self.file_path, columns=columns)
+
+    def _check_expected_fields(self):
+        if self.expected_fields is None:
+            return
+
+        if self.is_ipc:
+            with pyarrow.ipc.open_file(pyarrow.memory_map(self.file_path)) as reader:
+                schema = reader.schema
+        else:
+            schema = pyarrow.parquet.read_schema(self.file_path)
+
+        missing = set(self.expected_fields) - set(schema.names)
+        if missing:
+            raise ValueError(f"{self.file_path} is missing fields: {', '.join(sorted(missing))}")
+
+    def read_columns(self, columns=None):
+        """
+        @param columns: (list of str) defaults to all of them
+        @return: (dict) column name to numpy array
+        """
+        self._check_expected_fields()
+        table = self._read_table(columns)
+        return {
+            name: table.column(name).to_numpy(zero_copy_only=False) for name in table.schema.names
+        }
+
+    def iter_batches(self, batch_size=65536, columns=None):
+        """
+        Generator yielding the file a batch of rows at a time so memory use is bounded.
+
+        @param batch_size: (int) most rows in a batch
+        @param columns: (list of str) defaults to all of them
+        @return: (dict) column name to numpy array
+        """
+        self._check_expected_fields()
+        if self.is_ipc:
+            batches = self._read_table(columns).to_batches(max_chunksize=batch_size)
+        else:
+            parquet_file = pyarrow.parquet.ParquetFile(self.file_path)
+            batches = parquet_file.iter_batches(batch_size=batch_size, columns=columns)
+
+        for batch in batches:
+            yield {
+                name: batch.column(i).to_numpy(zero_copy_only=False)
+                for i, name in enumerate(batch.schema.names)
+            }
+
+    def __len__(self):
+        if self.is_ipc:
+            return self._read_table().num_rows
+        return pyarrow.parquet.ParquetFile(self.file_path).metadata.num_rows
+
+    def __iter__(self):
+        """
+        Generator yielding each row as a :class:`Pinnate`. Slower than :meth:`read_columns` or
+        :meth:`iter_batches` but compatible with code written for the CSV connector.
+        """
+        for batch in self.iter_batches():
+            names = list(batch.keys())
+            for values in zip(*[batch[name].tolist() for name in names]):
+                yield ayeaye.Pinnate(dict(zip(names, values)))
+
+    @property
+    def data(self):
+        return list(self)
+
+
+ayeaye.connector_registry.register_connector(ColumnarConnector)
@@ -0,0 +1,215 @@
+"""
+Read GeoJSON one feature at a time.
+
+The full Ancient Woodland dataset is too big to load with the `json://` connector, which parses
+the whole document into memory. This connector only ever holds a buffer of the file and a single
+feature so memory use doesn't depend on the file's size.
+"""
+
+import json
+
+import ayeaye
+from ayeaye.connectors.base import AccessMode, FileBasedConnector
+
+
+class GeojsonStreamConnector(FileBasedConnector):
+    engine_type = "geojson-stream://"
+    optional_args = {
+        **FileBasedConnector.optional_args,
+        "encoding": "utf-8-sig",
+    }
+
+    # characters read from the file at a time
+    chunk_size = 1024 * 1024
+
+    def __init__(self, *args, **kwargs):
+        """
+        Stream the features from a GeoJSON FeatureCollection. Each feature is yielded as a
+        :class:`Pinnate` object.
+
+        It's a drop-in replacement for the `json://` connector when the only part of the document
+        being used is `.data.features`. That is iterable (more than once) but isn't a list.
+
+        For args: @see :class:`connectors.base.FileBasedConnector`
+
+        Connection information-
+            engine_url format is
+            geojson-stream://<filesystem absolute path>[;encoding=<character encoding>]
+        e.g. geojson-stream:///data/Ancient_Woodland_England.json
+        """
+        self._reset()
+        super().__init__(*args, **kwargs)
+
+        if self.access != AccessMode.READ:
+            raise NotImplementedError("Only read access is implemented")
+
+    def _reset(self):
+        FileBasedConnector._reset(self)
+        self.approx_position = 0
+
+    def __len__(self):
+        raise NotImplementedError("Not known without reading the whole file")
+
+    def __getitem__(self, key):
+        raise NotImplementedError("Features can only be read in order")
+
+    def __iter__(self):
+        """
+        Generator yielding each feature in the FeatureCollection as a :class:`Pinnate`.
+        """
+        # start from the beginning every time
+        self.close_connection()
+        self.connect()
+
+        for feature in self._iter_features():
+            yield ayeaye.Pinnate(feature)
+
+        self.close_connection()
+
+    @property
+    def data(self):
+        """
+        Just enough of the document to replace the `json://` connector.
+
+        @return: (:class:`Pinnate`) with .features
+        """
+        return ayeaye.Pinnate({"features": _Features(self)})
+
+    def _iter_features(self):
+        """
+        Generator yielding each feature as a dictionary.
+
+        Keys in the FeatureCollection other than "features" are parsed and discarded.
+        """
+        reader = _BufferedJson(self._file_handle, self.chunk_size)
+
+        reader.expect("{")
+        if reader.next_char() == "}":
+            return
+
+        while True:
+            key = reader.decode()
+            reader.expect(":")
+
+            if key == "features":
+                reader.expect("[")
+                if reader.next_char() != "]":
+                    while True:
+                        yield reader.decode()
+                        self.approx_position = reader.characters_read
+                        if reader.expect(",", "]") == "]":
+                            break
+                else:
+                    reader.expect("]")
+            else:
+                reader.decode()
+
+            if reader.expect(",", "}") == "}":
+                return
+
+    @property
+    def progress(self):
+        if self.file_size is None or self.approx_position == 0:
+            return None
+
+        # characters not bytes but close enough for mostly ascii GeoJSON
+        return self.approx_position / self.file_size
+
+
+class _Features:
+    """
+    Stand-in for the list of features in a FeatureCollection. Each iteration re-reads the file.
+    """
+
+    def __init__(self, connector):
+        self.connector = connector
+
+    def __iter__(self):
+        return iter(self.connector)
+
+
+class _BufferedJson:
+    """
+    Decode a JSON document a value at a time from a file handle, reading more of the file as it's
+    needed.
+    """
+
+    whitespace = " \t\n\r"
+
+    def __init__(self, file_handle, chunk_size):
+        self.file_handle = file_handle
+        self.chunk_size = chunk_size
+        self.decoder = json.JSONDecoder()
+        self.buffer = ""
+        self.position = 0  # within self.buffer
+        self.characters_read = 0  # total, before self.position
+        self.eof = False
+
+    def _read(self):
+        """
+        @return: (bool) more characters were added to the buffer
+        """
+        if self.eof:
+            return False
+
+        chunk = self.file_handle.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+
+        # drop what has already been decoded
+        self.characters_read += self.position
+        self.buffer = self.buffer[self.position :] + chunk
+        self.position = 0
+        return True
+
+    def next_char(self):
+        """
+        @return: (str) next character that isn't whitespace, without consuming it. Empty string at
+            the end of the file.
+        """
+        while True:
+            while (
+                self.position < len(self.buffer) and self.buffer[self.position] in self.whitespace
+            ):
+                self.position += 1
+
+            if self.position < len(self.buffer) or not self._read():
+                return self.buffer[self.position : self.position + 1]
+
+    def expect(self, *characters):
+        """
+        Consume the next non-whitespace character, which must be one of `characters`.
+
+        @return: (str) the character
+        """
+        char = self.next_char()
+        if char == "" or char not in characters:
+            found = char or "end of file"
+            raise ValueError(f"Invalid GeoJSON. Expected {' or '.join(characters)}, found {found}")
+
+        self.position += 1
+        return char
+
+    def decode(self):
+        """
+        Decode the next JSON value.
+
+        A value that runs to the end of the buffer might continue in the next chunk (e.g. a
+        number) so that is decoded again after reading more.
+        """
+        self.next_char()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.position)
+            except json.JSONDecodeError:
+                if self._read():
+                    continue
+                raise
+
+            if end < len(self.buffer) or not self._read():
+                self.position = end
+                return value
+
+
+ayeaye.connector_registry.register_connector(GeojsonStreamConnector)
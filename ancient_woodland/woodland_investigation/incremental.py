@@ -0,0 +1,111 @@
+"""
+Keep the overlap for each (woodland, nature reserve) pair between runs so a re-run only needs to
+calculate pairs where one of the geometries has been added or changed.
+
+Pairs are keyed on fingerprints of the two geometries rather than OBJECTIDs. The OBJECTID is the
+row number in the ancient woodland file so it changes when features are added or removed
+before it. A geometry that hasn't changed has the same fingerprint wherever it is in the file.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+import numpy
+import shapely
+
+# bytes in a geometry fingerprint. A pair's key is two of these.
+FINGERPRINT_SIZE = 16
+
+
+def geometry_fingerprints(geoms):
+    """
+    @param geoms: (numpy array of shapely geometries)
+    @return: (list of bytes) hash of each geometry's WKB
+    """
+    return [
+        hashlib.blake2b(wkb, digest_size=FINGERPRINT_SIZE).digest()
+        for wkb in shapely.to_wkb(geoms).tolist()
+    ]
+
+
+class OverlapState:
+    """
+    The overlap results from the previous run, stored as a directory of NumPy files.
+    """
+
+    def __init__(self, directory, settings):
+        """
+        @param directory: (str) where the state is kept
+        @param settings: (dict) anything, other than the geometries, that changes the overlap
+            results. e.g. the co-ordinate system. State saved with different settings isn't used.
+        """
+        self.directory = directory
+        self.settings = settings
+
+    def load(self):
+        """
+        @return: (dict) pair key to position in the previous results and the results as a
+            (numpy float array, numpy bool array, numpy bool array) of (square kilometres,
+            contained, partial). Empty and None if there isn't a usable previous run.
+        """
+        settings_path = os.path.join(self.directory, "settings.json")
+        if not os.path.exists(settings_path):
+            return {}, None
+
+        with open(settings_path) as f:
+            if json.load(f) != self.settings:
+                return {}, None
+
+        with numpy.load(os.path.join(self.directory, "pairs.npz")) as pairs:
+            pair_keys = pairs["pair_keys"].tolist()
+            results = (pairs["areas"], pairs["contained"], pairs["partial"])
+
+        return {pair_key: position for position, pair_key in enumerate(pair_keys)}, results
+
+    def save(self, pair_keys, areas, contained, partial):
+        """
+        Replace the stored state.
+
+        @param pair_keys: (list of bytes) see :func:`pair_keys`
+        @param areas: (numpy float array) square kilometres
+        @param contained: (numpy bool array)
+        @param partial: (numpy bool array)
+        """
+        parent = os.path.dirname(os.path.abspath(self.directory))
+        os.makedirs(parent, exist_ok=True)
+
+        building = tempfile.mkdtemp(dir=parent, suffix=".tmp")
+        try:
+            numpy.savez(
+                os.path.join(building, "pairs.npz"),
+                pair_keys=numpy.frombuffer(b"".join(pair_keys), dtype=f"V{2 * FINGERPRINT_SIZE}"),
+                areas=areas,
+                contained=contained,
+                partial=partial,
+            )
+            with open(os.path.join(building, "settings.json"), "w") as f:
+                json.dump(self.settings, f)
+
+            if os.path.isdir(self.directory):
+                shutil.rmtree(self.directory)
+            os.rename(building, self.directory)
+        except Exception:
+            shutil.rmtree(building, ignore_errors=True)
+            raise
+
+
+def pair_keys(woodland_fingerprints, reserve_fingerprints, woodland_idx, reserve_idx):
+    """
+    @param woodland_fingerprints: (list of bytes) see :func:`geometry_fingerprints`
+    @param reserve_fingerprints: (list of bytes)
+    @param woodland_idx: (numpy int array) see :func:`overlay.candidate_pairs`
+    @param reserve_idx: (numpy int array)
+    @return: (list of bytes) key for each pair
+    """
+    return [
+        woodland_fingerprints[w] + reserve_fingerprints[r]
+        for w, r in zip(woodland_idx.tolist(), reserve_idx.tolist())
+    ]
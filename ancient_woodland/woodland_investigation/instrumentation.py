@@ -0,0 +1,124 @@
+"""
+Timings for each phase of the woodland models and optional profiling.
+
+A model's `metrics` is a dictionary-
+    {
+        "phases": {<phase name>: {"seconds": float, "calls": int, "items": int}, ...},
+        "counts": {<name>: int, ...},
+    }
+
+Two environment variables turn on extra output when a model is run-
+    WOODLAND_METRICS_JSON=<path> - write the metrics to this JSON file
+    WOODLAND_PROFILE=<path> - profile the run with cProfile and write the stats to this file. If
+        the path ends with .html and pyinstrument is installed, a pyinstrument report is written
+        instead.
+"""
+
+import cProfile
+import json
+import os
+from contextlib import contextmanager
+from time import perf_counter
+
+METRICS_ENV = "WOODLAND_METRICS_JSON"
+PROFILE_ENV = "WOODLAND_PROFILE"
+
+
+def empty_metrics():
+    return {"phases": {}, "counts": {}}
+
+
+def record_phase(metrics, phase_name, seconds, items=0):
+    """
+    Add to the totals for a phase. Phases can be recorded more than once, e.g. once for each
+    dataset loaded, and are summed.
+
+    @param metrics: (dict) see module doc string
+    @param phase_name: (str)
+    @param seconds: (float) wall time
+    @param items: (int) number of things processed, e.g. features or pairs
+    """
+    phase = metrics["phases"].setdefault(phase_name, {"seconds": 0.0, "calls": 0, "items": 0})
+    phase["seconds"] += seconds
+    phase["calls"] += 1
+    phase["items"] += items
+
+
+def merge_metrics(metrics, other):
+    """
+    Add the phases and counts from `other` to `metrics`. e.g. from a sub-task running in another
+    process. Phase times are summed so can add up to more than the wall time of a parallel run.
+
+    @param metrics: (dict) see module doc string, updated in place
+    @param other: (dict) same format
+    """
+    for phase_name, other_phase in other["phases"].items():
+        phase = metrics["phases"].setdefault(phase_name, {"seconds": 0.0, "calls": 0, "items": 0})
+        for key, value in other_phase.items():
+            phase[key] += value
+
+    for count_name, value in other["counts"].items():
+        metrics["counts"][count_name] = metrics["counts"].get(count_name, 0) + value
+
+
+@contextmanager
+def timed_phase(metrics, phase_name, items=0):
+    """
+    Record the wall time of the `with` block. See :func:`record_phase`.
+    """
+    start = perf_counter()
+    try:
+        yield
+    finally:
+        record_phase(metrics, phase_name, perf_counter() - start, items)
+
+
+@contextmanager
+def profiled(output_path):
+    """
+    Profile the `with` block and write the results to `output_path`. Does nothing if
+    `output_path` is None.
+
+    @param output_path: (str or None) cProfile stats (read with :mod:`pstats` or snakeviz) or,
+        when it ends with .html, a pyinstrument report
+    """
+    if output_path is None:
+        yield
+        return
+
+    if output_path.endswith(".html"):
+        try:
+            from pyinstrument import Profiler
+        except ImportError:
+            raise ImportError("pip install pyinstrument to write .html profiles")
+
+        profiler = Profiler()
+        profiler.start()
+        try:
+            yield
+        finally:
+            profiler.stop()
+            with open(output_path, "w") as f:
+                f.write(profiler.output_html())
+        return
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        profiler.dump_stats(output_path)
+
+
+def write_metrics(metrics, output_path):
+    """
+    @param metrics: (dict) see module doc string
+    @param output_path: (str) JSON file
+    """
+    directory = os.path.dirname(output_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    with open(output_path, "w") as f:
+        json.dump(metrics, f, indent=4)
@@ -12,13 +12,17 @@ class LocalNatureAncientWoodland(NationalNatureAncientWoodland):
     """
 
     nature_reserves = ayeaye.Connect(
-        engine_url="json://../NaturalEngland/Local_Nature_Reserves_England.json"
+        engine_url="geojson-stream://../NaturalEngland/Local_Nature_Reserves_England.json"
     )
 
     within_nature_reserves = NationalNatureAncientWoodland.within_nature_reserves.clone(
         engine_url="csv://../Ancient_woodland_inside_local_nature_reserves.csv"
     )
 
+    simplification_audit = NationalNatureAncientWoodland.simplification_audit.clone(
+        engine_url="json://../Ancient_woodland_local_simplification_audit.json;indent=4"
+    )
+
 
 if __name__ == "__main__":
     m = LocalNatureAncientWoodland()
@@ -0,0 +1,215 @@
+import ayeaye
+import numpy
+import shapely
+from shapely import STRtree, prepare
+
+from woodland_investigation.local_nature_ancient_woodland import LocalNatureAncientWoodland
+from woodland_investigation.national_nature_ancient_woodland import NationalNatureAncientWoodland
+from woodland_investigation.overlay import (
+    Overlap,
+    candidate_pairs,
+    reproject,
+)
+
+
+class MultiLayerAncientWoodland(NationalNatureAncientWoodland):
+    """
+    Find how much of each ancient woodland is inside each of several layers of nature reserves
+    (national, local etc.) and inside any of them, in a single pass over the woodland.
+
+    The woodland is loaded and indexed once. The nature reserves from all the layers are queried
+    against the index together so each extra layer only costs the overlay with its own reserves.
+
+    The per layer columns match the output of running :class:`NationalNatureAncientWoodland` with
+    that layer as the `nature_reserves`. The `area_in_any` column is the area inside the union of
+    all the reserves so woodland in overlapping reserves is only counted once.
+    """
+
+    nature_reserves = None  # replaced by the layers below
+
+    national_nature_reserves = NationalNatureAncientWoodland.nature_reserves.clone()
+    local_nature_reserves = LocalNatureAncientWoodland.nature_reserves.clone()
+
+    # (layer name, dataset attribute). The layer name is used in the output column
+    # `area_in_<layer name>`. To add a designation (e.g. SSSIs) add an ayeaye.Connect for it, an
+    # entry here and the column to `within_nature_reserves`'s field_names.
+    reserve_layers = [
+        ("national", "national_nature_reserves"),
+        ("local", "local_nature_reserves"),
+    ]
+
+    within_nature_reserves = ayeaye.Connect(
+        engine_url="csv://../Ancient_woodland_inside_nature_reserves_by_layer.csv",
+        access=ayeaye.AccessMode.WRITE,
+        field_names=[
+            "OBJECTID",
+            "name",
+            "area_in_national",
+            "area_in_local",
+            "area_in_any",
+            "total_area",
+        ],
+    )
+
+    def check_settings(self):
+        super().check_settings()
+        unsupported = [
+            setting_name
+            for setting_name, is_set in (
+                ("incremental", self.incremental),
+                ("simplify_tolerance", self.simplify_tolerance),
+                ("overlap_workers", self.overlap_workers > 1),
+            )
+            if is_set
+        ]
+        if unsupported:
+            raise ValueError(
+                "The layers are overlaid in one pass with the columnar method, "
+                f"{', '.join(unsupported)} can't be used with it."
+            )
+
+    def build(self):
+        self.check_settings()
+        transformer = self.osgb_transformer()
+
+        woodland = self.load_woodland(transformer)
+        self.log(f"{len(woodland.geom)} ancient woodland areas found")
+
+        self.log("Building spatial index for ancient woodland")
+        with self.phase("spatial_index", items=len(woodland.geom)):
+            self.woodland_index = STRtree(woodland.geom)
+
+        nature_reserve_geoms, reserve_layer = self.load_reserve_layers(transformer)
+        with self.phase("prepare", items=len(nature_reserve_geoms)):
+            prepare(nature_reserve_geoms)
+
+        self.log("Finding candidate woodland and nature reserve pairs")
+        with self.phase("candidate_filtering", items=len(nature_reserve_geoms)):
+            woodland_idx, reserve_idx = candidate_pairs(self.woodland_index, nature_reserve_geoms)
+
+        self.log(f"Calculating overlap for {len(woodland_idx)} candidate pairs")
+        overlay_transformer = None if self.project_up_front else transformer
+        with self.phase("exact_intersection", items=len(woodland_idx)):
+            areas, contained, partial = self.pair_overlap_areas(
+                woodland,
+                nature_reserve_geoms,
+                woodland_idx,
+                reserve_idx,
+                transformer=overlay_transformer,
+            )
+        self.count_pairs(len(woodland_idx), int((contained | partial).sum()))
+        self.stats[f"{Overlap.CONTAINED.value}_woodland"] += int(contained.sum())
+        self.stats[f"{Overlap.PARTIAL.value}_woodland"] += int(partial.sum())
+        self.stats[f"{Overlap.DISJOINT.value}_woodland"] += int((~contained & ~partial).sum())
+
+        woodland_count = len(woodland.geom)
+        overlap_columns = {}
+        for layer_number, (layer_name, _) in enumerate(self.reserve_layers):
+            in_layer = reserve_layer[reserve_idx] == layer_number
+            area = numpy.zeros(woodland_count)
+            area += numpy.bincount(
+                woodland_idx[in_layer], weights=areas[in_layer], minlength=woodland_count
+            )
+            overlap_columns[f"area_in_{layer_name}"] = area
+
+        with self.phase("union_overlap", items=woodland_count):
+            overlap_columns["area_in_any"] = self.union_overlap(
+                woodland,
+                nature_reserve_geoms,
+                woodland_idx,
+                reserve_idx,
+                (areas, contained, partial),
+                overlay_transformer,
+            )
+
+        self.write_output(woodland, overlap_columns)
+        self.log(f"All done!")
+
+    def load_reserve_layers(self, transformer):
+        """
+        @param transformer: (:class:`pyproj.Transformer`) WGS84 to British National Grid
+        @return: (numpy array of shapely geometries, numpy int array) nature reserves from all the
+            layers and the position in `reserve_layers` of each one's layer
+        """
+        layer_geoms = []
+        layer_numbers = []
+        for layer_number, (layer_name, dataset_name) in enumerate(self.reserve_layers):
+            geoms = self.load_nature_reserves(transformer, getattr(self, dataset_name))
+            self.log(f"Found {len(geoms)} {layer_name} nature reserves")
+            layer_geoms.append(geoms)
+            layer_numbers.append(numpy.full(len(geoms), layer_number))
+
+        return numpy.concatenate(layer_geoms), numpy.concatenate(layer_numbers)
+
+    def union_overlap(
+        self, woodland, nature_reserve_geoms, woodland_idx, reserve_idx, pair_overlaps, transformer
+    ):
+        """
+        Area of each woodland inside the union of all the nature reserves.
+
+        Nearly all woodland overlaps no more than one reserve so the area is already known from
+        the pairs. Woodland completely inside any reserve is all inside the union. Only woodland
+        partly inside more than one reserve needs the union of those reserves.
+
+        @param woodland: (:class:`ayeaye.Pinnate`) see :meth:`load_woodland`
+        @param nature_reserve_geoms: (numpy array of prepared shapely geometries)
+        @param woodland_idx: (numpy int array) see :func:`candidate_pairs`
+        @param reserve_idx: (numpy int array) see :func:`candidate_pairs`
+        @param pair_overlaps: (tuple) return value from :func:`pair_overlap_areas`
+        @param transformer: (:class:`pyproj.Transformer` or None) see :func:`pair_overlap_areas`
+        @return: (numpy float array) square kilometres of each woodland
+        """
+        areas, contained, partial = pair_overlaps
+        woodland_count = len(woodland.geom)
+        area_in_any = numpy.zeros(woodland_count)
+
+        whole = numpy.zeros(woodland_count, dtype=bool)
+        whole[woodland_idx[contained]] = True
+        area_in_any[whole] = woodland.total_area[whole]
+
+        pieces = numpy.bincount(woodland_idx[partial], minlength=woodland_count)
+        single = partial & (pieces == 1)[woodland_idx] & ~whole[woodland_idx]
+        area_in_any[woodland_idx[single]] = areas[single]
+
+        multiple = partial & (pieces > 1)[woodland_idx] & ~whole[woodland_idx]
+        if not multiple.any():
+            return area_in_any
+
+        # group the reserves by woodland
+        order = numpy.argsort(woodland_idx[multiple], kind="stable")
+        multiple_woodland = woodland_idx[multiple][order]
+        multiple_reserves = reserve_idx[multiple][order]
+        several_idx, starts = numpy.unique(multiple_woodland, return_index=True)
+        self.stats["woodland_in_several_reserves"] += len(several_idx)
+
+        reserve_unions = [
+            shapely.union_all(nature_reserve_geoms[reserves])
+            for reserves in numpy.split(multiple_reserves, starts[1:])
+        ]
+        overlaps = shapely.intersection(woodland.geom[several_idx], reserve_unions)
+        if transformer is not None:
+            overlaps = reproject(overlaps, transformer)
+        area_in_any[several_idx] = shapely.area(overlaps) / (1000 * 1000)
+
+        return area_in_any
+
+    def write_output(self, woodland, overlap_columns):
+        """
+        @param woodland: (:class:`ayeaye.Pinnate`) see :meth:`load_woodland`
+        @param overlap_columns: (dict) output column name to numpy float array of square
+            kilometres for each woodland
+        """
+        self.log("Writing output")
+        self.write_columns(
+            {
+                "OBJECTID": woodland.OBJECTID,
+                "name": woodland.name,
+                "total_area": woodland.total_area,
+                **overlap_columns,
+            }
+        )
+
+
+if __name__ == "__main__":
+    m = MultiLayerAncientWoodland()
+    m.go()
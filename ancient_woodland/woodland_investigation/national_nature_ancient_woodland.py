@@ -1,8 +1,39 @@
+import os
+from time import perf_counter
+
 import ayeaye
+import numpy
 import pyproj
-from shapely.geometry import box, shape
+import shapely
+from shapely import STRtree, prepare
+from shapely.geometry import shape
 from shapely.ops import transform
 
+# registers the columnar:// and geojson-stream:// engine types
+import woodland_investigation.columnar_connector
+import woodland_investigation.geojson_stream
+from woodland_investigation.instrumentation import (
+    METRICS_ENV,
+    PROFILE_ENV,
+    empty_metrics,
+    profiled,
+    record_phase,
+    timed_phase,
+    write_metrics,
+)
+from woodland_investigation.incremental import OverlapState, geometry_fingerprints, pair_keys
+from woodland_investigation.overlay import (
+    Overlap,
+    candidate_pairs,
+    classify_overlap,
+    pair_overlap_areas,
+    reproject,
+    simplified_pair_overlap_areas,
+    simplify,
+)
+from woodland_investigation.parallel_overlay import parallel_pair_overlap_areas
+from woodland_investigation.woodland_cache import WoodlandCache
+
 
 class NationalNatureAncientWoodland(ayeaye.Model):
     """
@@ -12,12 +43,13 @@ class NationalNatureAncientWoodland(ayeaye.Model):
     data from https://naturalengland-defra.opendata.arcgis.com/datasets/Defra::national-nature-reserves-england/about
     """
 
+    # geojson-stream:// reads a feature at a time so even the full dataset fits in memory
     ancient_woodland = ayeaye.Connect(
-        engine_url="json://../NaturalEngland/Ancient_Woodland_Extract.json"
+        engine_url="geojson-stream://../NaturalEngland/Ancient_Woodland_Extract.json"
     )
 
     nature_reserves = ayeaye.Connect(
-        engine_url="json://../NaturalEngland/National_Nature_Reserves_England.json"
+        engine_url="geojson-stream://../NaturalEngland/National_Nature_Reserves_England.json"
     )
 
     within_nature_reserves = ayeaye.Connect(
@@ -26,7 +58,149 @@ class NationalNatureAncientWoodland(ayeaye.Model):
         field_names=["OBJECTID", "name", "area_in_nature_reserve", "total_area"],
     )
 
+    # only written when `simplify_tolerance` is set
+    simplification_audit = ayeaye.Connect(
+        engine_url="json://../Ancient_woodland_national_simplification_audit.json;indent=4",
+        access=ayeaye.AccessMode.WRITE,
+    )
+
+    # When True, both layers are re-projected to the British National Grid in bulk before any
+    # overlay so intersections and areas are calculated on the planar grid. Otherwise the overlay
+    # is in WGS84 and each overlapping piece is re-projected to find its area.
+    project_up_front = False
+
+    # When True, the overlap is calculated for all candidate (woodland, nature reserve) pairs at
+    # once with Shapely's vectorised functions instead of one nature reserve at a time.
+    columnar = False
+
+    # Save the ancient woodland after it has been loaded and re-projected so the next model to
+    # read the same file (e.g. :class:`LocalNatureAncientWoodland`) doesn't need to. The cache
+    # is in a `.woodland_cache` directory alongside the ancient woodland file unless
+    # `woodland_cache_directory` is set. Off by default as it writes next to the source data.
+    woodland_cache = False
+    woodland_cache_directory = None
+
+    # When True, the overlap for each (woodland, nature reserve) pair is kept between runs and
+    # only pairs with a new or changed geometry are calculated. The state is in a directory
+    # alongside the output file unless `incremental_state_directory` is set.
+    incremental = False
+    incremental_state_directory = None
+
+    # More than 1 to calculate the overlap of candidate (woodland, nature reserve) pairs in a pool
+    # of this many local processes, `overlap_chunk_size` pairs at a time. Implies `columnar`. The
+    # output is the same whatever the number of workers.
+    overlap_workers = 1
+    overlap_chunk_size = 10000
+
+    # Metres. When set, the overlap is first calculated with geometries simplified to this
+    # tolerance on the British National Grid. Only pairs within `simplify_error_band` metres
+    # (default and minimum 2 x the tolerance) of changing between disjoint, partial and
+    # contained are calculated again at full resolution. The largest error this could add to a
+    # woodland's area is written to `simplification_audit`.
+    simplify_tolerance = None
+    simplify_error_band = None
+
+    @property
+    def metrics(self):
+        """
+        Wall time and counts for each phase of the run.
+
+        @return: (dict) see :mod:`woodland_investigation.instrumentation`
+        """
+        if not hasattr(self, "_metrics"):
+            self._metrics = empty_metrics()
+        return self._metrics
+
+    def phase(self, phase_name, items=0):
+        """
+        Time a `with` block and add it to :attr:`metrics`.
+        """
+        return timed_phase(self.metrics, phase_name, items)
+
+    def go(self):
+        """
+        Run the model. Also writes :attr:`metrics` to JSON and profiles the run when the
+        environment variables in :mod:`woodland_investigation.instrumentation` are set.
+        """
+        start = perf_counter()
+        with profiled(os.environ.get(PROFILE_ENV)):
+            success = super().go()
+        self.metrics["seconds"] = perf_counter() - start
+
+        for phase_name, phase in self.metrics["phases"].items():
+            self.log(f"Phase: {phase_name} took {phase['seconds']:.3f}s for {phase['items']} items")
+
+        if os.environ.get(METRICS_ENV):
+            write_metrics(self.metrics, os.environ[METRICS_ENV])
+
+        return success
+
+    def check_settings(self):
+        """
+        Raise ValueError when the class attributes that choose how the overlap is calculated ask
+        for things that can't be done together. See the model options in the README.
+        """
+        if self.incremental and self.simplify_tolerance:
+            raise ValueError(
+                "incremental and simplify_tolerance can't be used together. The kept overlaps "
+                "are at full resolution so nothing would be simplified."
+            )
+
+        band = self.simplify_error_band
+        if band is not None and band < 0:
+            raise ValueError("simplify_error_band can't be negative.")
+
+        if self.simplify_tolerance and band is not None and band < 2 * self.simplify_tolerance:
+            raise ValueError(
+                "simplify_error_band must be at least 2 x simplify_tolerance, otherwise pairs "
+                "that change between disjoint, partial and contained at full resolution could "
+                "be missed."
+            )
+
     def build(self):
+        self.check_settings()
+        transformer = self.osgb_transformer()
+
+        woodland = self.load_woodland(transformer)
+        self.log(f"{len(woodland.geom)} ancient woodland areas found")
+
+        # Built once, the index is queried with each nature reserve so the number of bounding box
+        # comparisons scales with log(woodland_count) instead of woodland_count.
+        self.log("Building spatial index for ancient woodland")
+        with self.phase("spatial_index", items=len(woodland.geom)):
+            self.woodland_index = STRtree(woodland.geom)
+
+        nature_reserve_geoms = self.load_nature_reserves(transformer)
+        self.log(f"Found {len(nature_reserve_geoms)} nature reserves")
+
+        # prepared geometries make the repeated predicates in :func:`classify_overlap` much faster
+        with self.phase("prepare", items=len(nature_reserve_geoms)):
+            prepare(nature_reserve_geoms)
+
+        if self.incremental:
+            area_in_nature_reserve = self.overlap_incremental(
+                woodland, nature_reserve_geoms, transformer
+            )
+        elif self.simplify_tolerance:
+            area_in_nature_reserve = self.overlap_simplified(
+                woodland, nature_reserve_geoms, transformer
+            )
+        elif self.columnar or self.overlap_workers > 1:
+            area_in_nature_reserve = self.overlap_columnar(
+                woodland, nature_reserve_geoms, transformer
+            )
+        else:
+            area_in_nature_reserve = self.overlap_per_nature_reserve(
+                woodland, nature_reserve_geoms, transformer
+            )
+
+        self.write_output(woodland, area_in_nature_reserve)
+        self.log(f"All done!")
+
+    def osgb_transformer(self):
+        """
+        @return: (:class:`pyproj.Transformer`) WGS84 to British National Grid
+        """
         self.log("Loading map co-ordinate transformer")
         # co-ordinate system for the most familiar 'latitude/longitude' co-ordinate system
         wgs84 = pyproj.CRS("EPSG:4326")
@@ -37,11 +211,66 @@ class NationalNatureAncientWoodland(ayeaye.Model):
         # find the area in square kilometres for a polygon built with WGS84 (i.e. lat/lng)
         # co-ordinates
         osgb = pyproj.CRS("EPSG:27700")
-        re_project_coord = pyproj.Transformer.from_crs(wgs84, osgb, always_xy=True).transform
+        return pyproj.Transformer.from_crs(wgs84, osgb, always_xy=True)
+
+    def write_output(self, woodland, area_in_nature_reserve):
+        """
+        @param woodland: (:class:`ayeaye.Pinnate`) see :meth:`load_woodland`
+        @param area_in_nature_reserve: (numpy float array) square kilometres of each woodland
+        """
+        self.log("Writing output")
+        self.write_columns(
+            {
+                "OBJECTID": woodland.OBJECTID,
+                "name": woodland.name,
+                "area_in_nature_reserve": area_in_nature_reserve,
+                "total_area": woodland.total_area,
+            }
+        )
+
+    def write_columns(self, columns):
+        """
+        Write to `within_nature_reserves`. A `columnar://` dataset is written in one batch,
+        anything else a row at a time.
+
+        @param columns: (dict) column name to numpy array with an item for each woodland
+        """
+        field_names = self.within_nature_reserves.field_names
+        with self.phase("output_write", items=len(columns["OBJECTID"])):
+            if hasattr(self.within_nature_reserves, "write_columns"):
+                self.within_nature_reserves.write_columns({f: columns[f] for f in field_names})
+                return
+
+            for values in zip(*[columns[field].tolist() for field in field_names]):
+                self.within_nature_reserves.add(dict(zip(field_names, values)))
+
+    def load_woodland(self, transformer):
+        """
+        Read the ancient woodland into columns, one item per woodland.
+
+        @param transformer: (:class:`pyproj.Transformer`) WGS84 to British National Grid
+        @return: (:class:`ayeaye.Pinnate`) with numpy arrays for .OBJECTID, .name, .geom (in the
+            co-ordinate system used for the overlay, see `project_up_front`), .total_area
+            (square kilometres) and .osgb_bounds (minx, miny, maxx, maxy on the British National
+            Grid)
+        """
+        cache = self.open_woodland_cache()
+        if cache is not None:
+            with self.phase("woodland_cache_load"):
+                woodland = cache.load()
+            if woodland is not None:
+                self.log(f"Loaded ancient woodland from cache {cache.entry_directory}")
+                self.stats["woodland_cache_hit"] += 1
+                return woodland
 
         self.log("Loading ancient woodland")
-        woodland = []
+        object_ids = []
+        names = []
+        woodland_geoms = []
         woodland_types = set()
+        load_start = perf_counter()
+        shape_seconds = 0.0
+        row_number = -1
         for row_number, ancient_woodland in enumerate(self.ancient_woodland.data.features):
             properties = ancient_woodland.properties
             woodland_types.add((properties.theme, properties.themname, properties.status))
@@ -52,61 +281,400 @@ class NationalNatureAncientWoodland(ayeaye.Model):
                 # count as ancient woodland!
                 continue
 
-            geom = shape(ancient_woodland.geometry)
-            woodland_area = transform(re_project_coord, geom).area / (1000 * 1000)  # km sq
-            woodland_extract = ayeaye.Pinnate(
-                {
-                    "OBJECTID": row_number,  # was properties.objectid,
-                    "name": properties.name,
-                    "geom": geom,
-                    "bounding": box(*geom.bounds),
-                    "area_in_nature_reserve": 0.0,  # square kilometres are added below
-                    "total_area": woodland_area,
-                }
-            )
-            if woodland_extract.name.strip() == "":
-                woodland_extract.name = "Unknown"
+            object_ids.append(row_number)  # was properties.objectid,
+            names.append("Unknown" if properties.name.strip() == "" else properties.name)
 
-            woodland.append(woodland_extract)
+            shape_start = perf_counter()
+            woodland_geoms.append(shape(ancient_woodland.geometry))
+            shape_seconds += perf_counter() - shape_start
 
-        woodland_count = len(woodland)
-        self.log(f"{woodland_count} ancient woodland areas found")
+        # the time to read and parse the file is what's left when building shapes is taken away
+        record_phase(
+            self.metrics, "load_parse", perf_counter() - load_start - shape_seconds, row_number + 1
+        )
+        record_phase(self.metrics, "shape_construction", shape_seconds, len(woodland_geoms))
 
-        self.log("Loading nature reserves")
-        nature_reserves_count = len(self.nature_reserves.data.features)
-        self.log(f"Found {nature_reserves_count} nature reserves")
+        self.log("Re-projecting ancient woodland")
+        woodland_geoms = numpy.array(woodland_geoms, dtype=object)
+        with self.phase("reprojection", items=len(woodland_geoms)):
+            woodland_osgb = reproject(woodland_geoms, transformer)
+
+        woodland = ayeaye.Pinnate(
+            {
+                "OBJECTID": numpy.array(object_ids, dtype=numpy.int64),
+                "name": numpy.array(names, dtype=object),
+                "geom": woodland_osgb if self.project_up_front else woodland_geoms,
+                "total_area": shapely.area(woodland_osgb) / (1000 * 1000),  # km sq
+                "osgb_bounds": shapely.bounds(woodland_osgb),
+            }
+        )
 
-        for row_number, nature_reserve in enumerate(self.nature_reserves.data.features):
-            nature_reserve_geom = shape(nature_reserve.geometry)
-            nature_reserve_bounding = box(*nature_reserve_geom.bounds)
+        if cache is not None:
+            self.log("Saving ancient woodland to cache")
+            with self.phase("woodland_cache_save"):
+                cache.save(woodland)
 
+        return woodland
+
+    def open_woodland_cache(self):
+        """
+        @return: (:class:`WoodlandCache`) for the ancient woodland dataset and the co-ordinate
+            system used for the overlay. None when caching is off or the dataset isn't a file.
+        """
+        if not self.woodland_cache:
+            return None
+
+        source_path = getattr(self.ancient_woodland, "file_path", None)
+        if source_path is None or not os.path.exists(source_path):
+            return None
+
+        crs = "EPSG:27700" if self.project_up_front else "EPSG:4326"
+        return WoodlandCache(source_path, crs, cache_directory=self.woodland_cache_directory)
+
+    def load_nature_reserves(self, transformer, dataset=None):
+        """
+        @param transformer: (:class:`pyproj.Transformer`) WGS84 to British National Grid
+        @param dataset: (GeoJSON dataset) defaults to `self.nature_reserves`
+        @return: (numpy array of shapely geometries) in the co-ordinate system used for the
+            overlay, see `project_up_front`
+        """
+        if dataset is None:
+            dataset = self.nature_reserves
+
+        self.log("Loading nature reserves")
+        nature_reserve_geoms = []
+        load_start = perf_counter()
+        shape_seconds = 0.0
+        for nature_reserve in dataset.data.features:
             assert nature_reserve.type == "Feature", "Feature is the only known type in these data"
+            shape_start = perf_counter()
+            nature_reserve_geoms.append(shape(nature_reserve.geometry))
+            shape_seconds += perf_counter() - shape_start
 
+        reserve_count = len(nature_reserve_geoms)
+        record_phase(
+            self.metrics, "load_parse", perf_counter() - load_start - shape_seconds, reserve_count
+        )
+        record_phase(self.metrics, "shape_construction", shape_seconds, reserve_count)
+
+        nature_reserve_geoms = numpy.array(nature_reserve_geoms, dtype=object)
+        if self.project_up_front:
+            self.log("Re-projecting nature reserves")
+            with self.phase("reprojection", items=reserve_count):
+                nature_reserve_geoms = reproject(nature_reserve_geoms, transformer)
+
+        return nature_reserve_geoms
+
+    def overlap_per_nature_reserve(self, woodland, nature_reserve_geoms, transformer):
+        """
+        Loop through the nature reserves finding the woodland inside each one.
+
+        @param woodland: (:class:`ayeaye.Pinnate`) see :meth:`load_woodland`
+        @param nature_reserve_geoms: (numpy array of prepared shapely geometries)
+        @param transformer: (:class:`pyproj.Transformer`) WGS84 to British National Grid
+        @return: (numpy float array) square kilometres of each woodland inside nature reserves
+        """
+        re_project_coord = transformer.transform
+        area_in_nature_reserve = numpy.zeros(len(woodland.geom))
+        nature_reserves_count = len(nature_reserve_geoms)
+
+        # summed across the loop and recorded as phases at the end
+        candidate_seconds = 0.0
+        intersection_seconds = 0.0
+        reprojection_seconds = 0.0
+        pairs_tested = 0
+        pairs_overlapping = 0
+        overlaps_reprojected = 0
+
+        for row_number, nature_reserve_geom in enumerate(nature_reserve_geoms):
             # this progress percent doesn't include the time to load ancient woodland so isn't
             # totally accurate but is good enough
             self.log_progress(row_number / nature_reserves_count)
 
-            # other than a bounding box check there is no consideration of efficiency. For example,
-            # use of a spatial index.
-            for ancient_woodland in woodland:
-                if not ancient_woodland.bounding.intersects(nature_reserve_bounding):
+            phase_start = perf_counter()
+            candidates = self.woodland_candidates(woodland, nature_reserve_geom)
+            candidate_seconds += perf_counter() - phase_start
+            pairs_tested += len(candidates)
+
+            phase_start = perf_counter()
+            for woodland_idx in candidates:
+                woodland_geom = woodland.geom[woodland_idx]
+
+                overlap_type = classify_overlap(nature_reserve_geom, woodland_geom)
+                self.stats[f"{overlap_type.value}_woodland"] += 1
+
+                if overlap_type == Overlap.DISJOINT:
+                    continue
+
+                pairs_overlapping += 1
+                if overlap_type == Overlap.CONTAINED:
+                    # no need for the intersection, it's all of the woodland
+                    area_in_nature_reserve[woodland_idx] += woodland.total_area[woodland_idx]
                     continue
 
-                overlap = ancient_woodland.geom.intersection(nature_reserve_geom)
+                overlap = woodland_geom.intersection(nature_reserve_geom)
                 if overlap.area > 0:
-                    # the output must be in square kilometres. One way to do this is
-                    # to use the OSGB map projection. See note above.
-                    as_osgb = transform(re_project_coord, overlap)
-                    ancient_woodland.area_in_nature_reserve += as_osgb.area / (1000 * 1000)
+                    if not self.project_up_front:
+                        # the output must be in square kilometres. One way to do this is
+                        # to use the OSGB map projection. See note above.
+                        reprojection_start = perf_counter()
+                        overlap = transform(re_project_coord, overlap)
+                        reprojection_seconds += perf_counter() - reprojection_start
+                        overlaps_reprojected += 1
+                    area_in_nature_reserve[woodland_idx] += overlap.area / (1000 * 1000)
 
-        self.log("Writing output")
-        for ancient_woodland in woodland:
-            record_subset = {
-                k: ancient_woodland[k] for k in self.within_nature_reserves.field_names
-            }
-            self.within_nature_reserves.add(record_subset)
+            intersection_seconds += perf_counter() - phase_start
 
-        self.log(f"All done!")
+        record_phase(self.metrics, "candidate_filtering", candidate_seconds, nature_reserves_count)
+        record_phase(
+            self.metrics,
+            "exact_intersection",
+            intersection_seconds - reprojection_seconds,
+            pairs_tested,
+        )
+        record_phase(
+            self.metrics, "overlap_reprojection", reprojection_seconds, overlaps_reprojected
+        )
+        self.count_pairs(pairs_tested, pairs_overlapping)
+
+        return area_in_nature_reserve
+
+    def overlap_columnar(self, woodland, nature_reserve_geoms, transformer):
+        """
+        Same result as :meth:`overlap_per_nature_reserve` but each step is a single vectorised
+        operation over all the candidate (woodland, nature reserve) pairs.
+
+        @see :meth:`overlap_per_nature_reserve` for params and return value
+        """
+        self.log("Finding candidate woodland and nature reserve pairs")
+        with self.phase("candidate_filtering", items=len(nature_reserve_geoms)):
+            woodland_idx, reserve_idx = candidate_pairs(self.woodland_index, nature_reserve_geoms)
+
+        self.log(f"Calculating overlap for {len(woodland_idx)} candidate pairs")
+        # includes re-projecting the overlapping pieces when `project_up_front` is False
+        with self.phase("exact_intersection", items=len(woodland_idx)):
+            areas, contained, partial = self.pair_overlap_areas(
+                woodland,
+                nature_reserve_geoms,
+                woodland_idx,
+                reserve_idx,
+                transformer=None if self.project_up_front else transformer,
+            )
+        self.count_pairs(len(woodland_idx), int((contained | partial).sum()))
+        self.stats[f"{Overlap.CONTAINED.value}_woodland"] += int(contained.sum())
+        self.stats[f"{Overlap.PARTIAL.value}_woodland"] += int(partial.sum())
+        self.stats[f"{Overlap.DISJOINT.value}_woodland"] += int((~contained & ~partial).sum())
+
+        # sum the pieces of each woodland. The zeros make sure the result is a float array even
+        # when there aren't any pairs.
+        area_in_nature_reserve = numpy.zeros(len(woodland.geom))
+        area_in_nature_reserve += numpy.bincount(
+            woodland_idx, weights=areas, minlength=len(woodland.geom)
+        )
+        return area_in_nature_reserve
+
+    def overlap_incremental(self, woodland, nature_reserve_geoms, transformer):
+        """
+        Same result as :meth:`overlap_columnar` but pairs already calculated by a previous run are
+        re-used.
+
+        @see :meth:`overlap_per_nature_reserve` for params and return value
+        """
+        state = OverlapState(
+            self.incremental_state_directory or f"{self.within_nature_reserves.file_path}.state",
+            settings={"project_up_front": self.project_up_front},
+        )
+        with self.phase("incremental_state_load"):
+            previous_pairs, previous_results = state.load()
+
+        self.log("Finding candidate woodland and nature reserve pairs")
+        with self.phase("candidate_filtering", items=len(nature_reserve_geoms)):
+            woodland_idx, reserve_idx = candidate_pairs(self.woodland_index, nature_reserve_geoms)
+
+        with self.phase("fingerprints", items=len(woodland.geom) + len(nature_reserve_geoms)):
+            keys = pair_keys(
+                geometry_fingerprints(woodland.geom),
+                geometry_fingerprints(nature_reserve_geoms),
+                woodland_idx,
+                reserve_idx,
+            )
+
+        # -1 for pairs that weren't in the previous run
+        previous_position = numpy.array(
+            [previous_pairs.get(key, -1) for key in keys], dtype=numpy.int64
+        )
+        known = previous_position >= 0
+        self.stats["pairs_reused"] += int(known.sum())
+        self.stats["pairs_calculated"] += int((~known).sum())
+        self.log(f"Re-using {known.sum()} pairs, calculating {(~known).sum()} pairs")
+
+        areas = numpy.zeros(len(woodland_idx))
+        contained = numpy.zeros(len(woodland_idx), dtype=bool)
+        partial = numpy.zeros(len(woodland_idx), dtype=bool)
+        if known.any():
+            for values, previous_values in zip((areas, contained, partial), previous_results):
+                values[known] = previous_values[previous_position[known]]
+
+        new = ~known
+        with self.phase("exact_intersection", items=int(new.sum())):
+            new_areas, new_contained, new_partial = self.pair_overlap_areas(
+                woodland,
+                nature_reserve_geoms,
+                woodland_idx[new],
+                reserve_idx[new],
+                transformer=None if self.project_up_front else transformer,
+            )
+        areas[new] = new_areas
+        contained[new] = new_contained
+        partial[new] = new_partial
+
+        self.count_pairs(len(woodland_idx), int((contained | partial).sum()))
+        self.stats[f"{Overlap.CONTAINED.value}_woodland"] += int(contained.sum())
+        self.stats[f"{Overlap.PARTIAL.value}_woodland"] += int(partial.sum())
+        self.stats[f"{Overlap.DISJOINT.value}_woodland"] += int((~contained & ~partial).sum())
+
+        self.log("Saving pairs for the next run")
+        with self.phase("incremental_state_save", items=len(keys)):
+            state.save(keys, areas, contained, partial)
+
+        # same order of summing as :meth:`overlap_columnar` so the output is identical
+        area_in_nature_reserve = numpy.zeros(len(woodland.geom))
+        area_in_nature_reserve += numpy.bincount(
+            woodland_idx, weights=areas, minlength=len(woodland.geom)
+        )
+        return area_in_nature_reserve
+
+    def overlap_simplified(self, woodland, nature_reserve_geoms, transformer):
+        """
+        Like :meth:`overlap_columnar` but with a first pass on simplified geometries. See
+        `simplify_tolerance`.
+
+        @see :meth:`overlap_per_nature_reserve` for params and return value
+        """
+        tolerance = self.simplify_tolerance
+        band = self.simplify_error_band
+        if band is None:
+            band = 2 * tolerance
+
+        self.log("Finding candidate woodland and nature reserve pairs")
+        with self.phase("candidate_filtering", items=len(nature_reserve_geoms)):
+            woodland_idx, reserve_idx = candidate_pairs(self.woodland_index, nature_reserve_geoms)
+
+        # only the geometries in a candidate pair are needed
+        candidate_woodland = numpy.unique(woodland_idx)
+        candidate_reserves = numpy.unique(reserve_idx)
+
+        self.log(f"Simplifying geometries to {tolerance}m")
+        with self.phase("simplify", items=len(candidate_woodland) + len(candidate_reserves)):
+            woodland_osgb = woodland.geom[candidate_woodland]
+            reserves_osgb = nature_reserve_geoms[candidate_reserves]
+            if not self.project_up_front:
+                woodland_osgb = reproject(woodland_osgb, transformer)
+                reserves_osgb = reproject(reserves_osgb, transformer)
+
+            simple_woodland = numpy.full(len(woodland.geom), None, dtype=object)
+            simple_woodland[candidate_woodland] = simplify(woodland_osgb, tolerance)
+            simple_reserves = numpy.full(len(nature_reserve_geoms), None, dtype=object)
+            simple_reserves[candidate_reserves] = simplify(reserves_osgb, tolerance)
+            prepare(simple_reserves)
+
+        self.log(f"Calculating simplified overlap for {len(woodland_idx)} candidate pairs")
+        with self.phase("simplified_intersection", items=len(woodland_idx)):
+            areas, contained, partial, full_resolution, area_error = simplified_pair_overlap_areas(
+                simple_woodland,
+                simple_reserves,
+                woodland.total_area,
+                woodland_idx,
+                reserve_idx,
+                tolerance,
+                band,
+            )
+
+        self.log(f"Calculating {full_resolution.sum()} pairs at full resolution")
+        with self.phase("exact_intersection", items=int(full_resolution.sum())):
+            full_areas, full_contained, full_partial = self.pair_overlap_areas(
+                woodland,
+                nature_reserve_geoms,
+                woodland_idx[full_resolution],
+                reserve_idx[full_resolution],
+                transformer=None if self.project_up_front else transformer,
+            )
+        areas[full_resolution] = full_areas
+        contained[full_resolution] = full_contained
+        partial[full_resolution] = full_partial
+
+        self.count_pairs(len(woodland_idx), int((contained | partial).sum()))
+        self.stats[f"{Overlap.CONTAINED.value}_woodland"] += int(contained.sum())
+        self.stats[f"{Overlap.PARTIAL.value}_woodland"] += int(partial.sum())
+        self.stats[f"{Overlap.DISJOINT.value}_woodland"] += int((~contained & ~partial).sum())
+        self.stats["pairs_simplified"] += int((~full_resolution).sum())
+        self.stats["pairs_full_resolution"] += int(full_resolution.sum())
+
+        woodland_count = len(woodland.geom)
+        area_in_nature_reserve = numpy.zeros(woodland_count)
+        area_in_nature_reserve += numpy.bincount(
+            woodland_idx, weights=areas, minlength=woodland_count
+        )
+        woodland_error = numpy.bincount(woodland_idx, weights=area_error, minlength=woodland_count)
+
+        self.simplification_audit.data = {
+            "simplify_tolerance_metres": tolerance,
+            "error_band_metres": band,
+            "pairs_simplified": int((~full_resolution).sum()),
+            "pairs_full_resolution": int(full_resolution.sum()),
+            # square kilometres. Bounds, the actual error is usually much smaller.
+            "max_woodland_area_error": float(woodland_error.max()) if woodland_count else 0.0,
+            "total_area_error": float(woodland_error.sum()),
+            "max_woodland_area_error_objectid": (
+                int(woodland.OBJECTID[woodland_error.argmax()]) if woodland_count else None
+            ),
+        }
+        return area_in_nature_reserve
+
+    def pair_overlap_areas(
+        self, woodland, nature_reserve_geoms, woodland_idx, reserve_idx, transformer=None
+    ):
+        """
+        :func:`pair_overlap_areas` in this process or, when `overlap_workers` is more than 1, in
+        a pool of processes.
+        """
+        if self.overlap_workers > 1 and len(woodland_idx) > self.overlap_chunk_size:
+            return parallel_pair_overlap_areas(
+                woodland,
+                nature_reserve_geoms,
+                woodland_idx,
+                reserve_idx,
+                transformer,
+                workers=self.overlap_workers,
+                chunk_size=self.overlap_chunk_size,
+            )
+
+        return pair_overlap_areas(
+            woodland, nature_reserve_geoms, woodland_idx, reserve_idx, transformer
+        )
+
+    def count_pairs(self, pairs_tested, pairs_overlapping):
+        """
+        @param pairs_tested: (int) candidate (woodland, nature reserve) pairs from the spatial index
+        @param pairs_overlapping: (int) pairs where some of the woodland is inside the reserve
+        """
+        counts = self.metrics["counts"]
+        counts["pairs_tested"] = counts.get("pairs_tested", 0) + pairs_tested
+        counts["pairs_overlapping"] = counts.get("pairs_overlapping", 0) + pairs_overlapping
+
+    def woodland_candidates(self, woodland, geom):
+        """
+        Find the ancient woodland that might overlap with `geom`.
+
+        The spatial index only compares bounding boxes so each candidate still needs an exact
+        geometry check. Candidates are returned in the same order as `woodland` so the output
+        doesn't depend on the layout of the index.
+
+        @param woodland: (:class:`ayeaye.Pinnate`) see :meth:`load_woodland`
+        @param geom: (shapely geometry) in the same co-ordinate system as the woodland
+        @return: (list of int) indexes into `woodland`'s columns
+        """
+        return sorted(self.woodland_index.query(geom).tolist())
 
 
 if __name__ == "__main__":
@@ -1,9 +1,10 @@
-import itertools
-
 import ayeaye
+import numpy
 
 from woodland_investigation.local_nature_ancient_woodland import LocalNatureAncientWoodland
+from woodland_investigation.multi_layer_ancient_woodland import MultiLayerAncientWoodland
 from woodland_investigation.national_nature_ancient_woodland import NationalNatureAncientWoodland
+from woodland_investigation.summary_aggregation import WoodlandAreaTotals, column_chunks
 
 
 class OverallSummary(ayeaye.Model):
@@ -25,29 +26,89 @@ class OverallSummary(ayeaye.Model):
         access=ayeaye.AccessMode.WRITE,
     )
 
+    # the same totals for each woodland name, worked out in the same pass
+    summary_by_name = ayeaye.Connect(
+        engine_url="csv://../summary_by_name.csv",
+        access=ayeaye.AccessMode.WRITE,
+        field_names=["name", "area_total", "area_within"],
+    )
+
+    column_types = {
+        "OBJECTID": numpy.int64,
+        "name": str,
+        "area_in_nature_reserve": numpy.float64,
+        "total_area": numpy.float64,
+    }
+
     def build(self):
         # each ancient woodland area should have it's `total_area` in both self.within_local and
-        # self.within_national but to make the join slightly safer use a set of IDs and only
-        # count the area once. This way an ancient woodland could exist in either or both and would
-        # correctly contribute to the overall summary.
+        # self.within_national but to make the join slightly safer keep track of the IDs (see
+        # :class:`WoodlandAreaTotals`) and only count the area once. This way an ancient woodland
+        # could exist in either or both and would correctly contribute to the overall summary.
         # A remaining assumption is that local and national datasets don't spatially overlap.
-        already_seen = set()
-        area_total = 0.0
-        area_within = 0.0
+        # :class:`MultiLayerSummary` doesn't need this assumption.
+        totals = WoodlandAreaTotals()
+        for dataset in (self.within_local, self.within_national):
+            for chunk in column_chunks(dataset, self.column_types):
+                totals.add(chunk)
 
-        for woodland in itertools.chain(self.within_local, self.within_national):
-            if woodland.OBJECTID not in already_seen:
-                already_seen.add(woodland.OBJECTID)
-                area_total += float(woodland.total_area)
+        # note the area_total is double the actually area of woodland
 
-            area_within += float(woodland.area_in_nature_reserve)
+        self.summary.data = {
+            "area_total": totals.area_total,
+            "area_within": totals.area_within,
+            "ancient_woodland_within_nature_reserves": totals.area_within / totals.area_total,
+        }
 
-        # note the area_total is double the actually area of woodland
+        for name, (area_total, area_within) in sorted(totals.by_name.items()):
+            self.summary_by_name.add(
+                {"name": name, "area_total": area_total, "area_within": area_within}
+            )
+
+        self.log("All done!")
+
+
+class MultiLayerSummary(ayeaye.Model):
+    """
+    Same as :class:`OverallSummary` but from the output of :class:`MultiLayerAncientWoodland`.
+
+    Each woodland is in a single row and `area_in_any` is its area inside the union of all the
+    nature reserves so nothing is counted twice, even where local and national reserves overlap.
+    """
+
+    within_reserves = MultiLayerAncientWoodland.within_nature_reserves.clone(
+        access=ayeaye.AccessMode.READ,
+        expected_fields=MultiLayerAncientWoodland.within_nature_reserves.field_names,
+        field_names=None,
+    )
+
+    summary = ayeaye.Connect(
+        engine_url="json://../summary_by_layer.json;indent=4",
+        access=ayeaye.AccessMode.WRITE,
+    )
+
+    def build(self):
+        layers = [layer_name for layer_name, _ in MultiLayerAncientWoodland.reserve_layers]
+        column_types = {
+            "total_area": numpy.float64,
+            "area_in_any": numpy.float64,
+            **{f"area_in_{layer_name}": numpy.float64 for layer_name in layers},
+        }
+        area_total = 0.0
+        area_within = 0.0
+        area_within_layer = {layer_name: 0.0 for layer_name in layers}
+
+        for chunk in column_chunks(self.within_reserves, column_types):
+            area_total += float(chunk["total_area"].sum())
+            area_within += float(chunk["area_in_any"].sum())
+            for layer_name in layers:
+                area_within_layer[layer_name] += float(chunk[f"area_in_{layer_name}"].sum())
 
         self.summary.data = {
             "area_total": area_total,
             "area_within": area_within,
             "ancient_woodland_within_nature_reserves": area_within / area_total,
+            "area_within_by_layer": area_within_layer,
         }
 
         self.log("All done!")
@@ -0,0 +1,215 @@
+"""
+Geometry helpers shared by the ancient woodland models.
+"""
+
+from enum import Enum
+
+import ayeaye
+import numpy
+import shapely
+
+
+class Overlap(Enum):
+    """
+    How a woodland geometry relates to a nature reserve geometry.
+    """
+
+    DISJOINT = "disjoint"  # includes geometries that only share a boundary
+    CONTAINED = "contained"  # the woodland is completely inside the nature reserve
+    PARTIAL = "partial"  # needs the intersection to find the area inside the nature reserve
+
+
+def classify_overlap(prepared_geom, geom):
+    """
+    Most woodland is either completely inside or completely outside a nature reserve. Finding
+    which is much cheaper than calculating the intersection. Prepared geometries (see
+    :func:`shapely.prepare`) index their edges the first time they are used so repeated
+    predicates with the same `prepared_geom` are fast.
+
+    @param prepared_geom: (shapely geometry) the nature reserve, already prepared
+    @param geom: (shapely geometry) the ancient woodland
+    @return: (:class:`Overlap`)
+    """
+    if prepared_geom.contains(geom):
+        return Overlap.CONTAINED
+
+    if not prepared_geom.intersects(geom) or prepared_geom.touches(geom):
+        return Overlap.DISJOINT
+
+    return Overlap.PARTIAL
+
+
+def reproject(geoms, transformer):
+    """
+    Re-project many geometries with a single call to `transformer`.
+
+    :func:`shapely.ops.transform` calls back into Python for every part of every geometry. Here
+    the co-ordinates from all of `geoms` are gathered into one array, transformed in bulk by
+    pyproj and put back into new geometries.
+
+    @param geoms: (list or numpy array of shapely geometries)
+    @param transformer: (:class:`pyproj.Transformer`) built with `always_xy=True`
+    @return: (numpy array of shapely geometries)
+    """
+
+    def transform_coords(coords):
+        x, y = transformer.transform(coords[:, 0], coords[:, 1])
+        return numpy.column_stack([x, y])
+
+    return shapely.transform(numpy.asarray(geoms, dtype=object), transform_coords)
+
+
+def candidate_pairs(woodland_index, nature_reserve_geoms):
+    """
+    All (woodland, nature reserve) pairs with intersecting bounding boxes.
+
+    Pairs are ordered by nature reserve then woodland. Summing areas in this order gives exactly
+    the same floating point totals as looping through the nature reserves one at a time.
+
+    @param woodland_index: (:class:`shapely.STRtree`) of woodland geometries
+    @param nature_reserve_geoms: (numpy array of shapely geometries)
+    @return: (numpy int array, numpy int array) woodland indexes, nature reserve indexes
+    """
+    reserve_idx, woodland_idx = woodland_index.query(nature_reserve_geoms)
+    order = numpy.lexsort((woodland_idx, reserve_idx))
+    return woodland_idx[order], reserve_idx[order]
+
+
+def classify_overlaps(prepared_geoms, geoms):
+    """
+    Vectorised :func:`classify_overlap` for pairs of geometries.
+
+    @param prepared_geoms: (numpy array of shapely geometries) nature reserves, already prepared
+    @param geoms: (numpy array of shapely geometries) ancient woodland, same length
+    @return: (numpy bool array, numpy bool array) (contained, partial). Pairs that are neither
+        are :attr:`Overlap.DISJOINT`.
+    """
+    contained = shapely.contains(prepared_geoms, geoms)
+
+    partial = ~contained
+    maybe_partial = numpy.flatnonzero(partial)
+    partial[maybe_partial] = shapely.intersects(
+        prepared_geoms[maybe_partial], geoms[maybe_partial]
+    ) & ~shapely.touches(prepared_geoms[maybe_partial], geoms[maybe_partial])
+
+    return contained, partial
+
+
+def pair_overlap_areas(woodland, nature_reserve_geoms, woodland_idx, reserve_idx, transformer=None):
+    """
+    Area of woodland inside the nature reserve for each candidate pair.
+
+    @param woodland: (:class:`ayeaye.Pinnate`) columns of woodland, see
+        :meth:`NationalNatureAncientWoodland.load_woodland`
+    @param nature_reserve_geoms: (numpy array of prepared shapely geometries)
+    @param woodland_idx: (numpy int array) see :func:`candidate_pairs`
+    @param reserve_idx: (numpy int array) see :func:`candidate_pairs`
+    @param transformer: (:class:`pyproj.Transformer` or None) used to re-project overlapping pieces
+        to the British National Grid when the geometries aren't already on it
+    @return: (numpy float array, numpy bool array, numpy bool array) (square kilometres, contained,
+        partial)
+    """
+    woodland_geoms = woodland.geom[woodland_idx]
+    reserve_geoms = nature_reserve_geoms[reserve_idx]
+    contained, partial = classify_overlaps(reserve_geoms, woodland_geoms)
+
+    areas = numpy.zeros(len(woodland_idx))
+    areas[contained] = woodland.total_area[woodland_idx[contained]]
+
+    overlaps = shapely.intersection(woodland_geoms[partial], reserve_geoms[partial])
+    if transformer is not None:
+        overlaps = reproject(overlaps, transformer)
+    areas[partial] = shapely.area(overlaps) / (1000 * 1000)
+
+    return areas, contained, partial
+
+
+def select_woodland(woodland, selection):
+    """
+    @param woodland: (:class:`ayeaye.Pinnate`) of numpy arrays with one item per woodland
+    @param selection: (numpy bool or int array) woodland to keep
+    @return: (:class:`ayeaye.Pinnate`) just the selected woodland
+    """
+    return ayeaye.Pinnate({column: values[selection] for column, values in woodland.items()})
+
+
+def simplify(geoms, tolerance):
+    """
+    Simplify without making any geometry invalid.
+
+    GEOS's topology preserving simplifier is about as slow as the intersections it is meant to
+    speed up. The plain Douglas-Peucker simplifier is many times faster and nearly always gives
+    a valid geometry so it's used first and only the invalid results are simplified again
+    preserving topology. Both keep every point within `tolerance` of the original.
+
+    @param geoms: (numpy array of shapely geometries)
+    @param tolerance: (float) in the units of the co-ordinate system
+    @return: (numpy array of shapely geometries)
+    """
+    simplified = shapely.simplify(geoms, tolerance, preserve_topology=False)
+    invalid = ~shapely.is_valid(simplified) | shapely.is_empty(simplified)
+    simplified[invalid] = shapely.simplify(geoms[invalid], tolerance, preserve_topology=True)
+    return simplified
+
+
+def simplified_pair_overlap_areas(
+    woodland_geoms, nature_reserve_geoms, total_area, woodland_idx, reserve_idx, tolerance, band
+):
+    """
+    Approximate area of woodland inside the nature reserve for each candidate pair using
+    simplified geometries.
+
+    Every point on a simplified boundary is within `tolerance` of the original boundary so the
+    area of an overlap can't be out by more than about `tolerance` x the overlap's perimeter.
+    Pairs that are close enough to a decision that simplifying could change it are flagged to be
+    calculated again at full resolution-
+        - disjoint but the simplified geometries are within `band` of each other
+        - contained but the woodland is within `band` of the reserve's boundary
+        - partial but the overlap is within `band` x its perimeter of nothing or all of the
+          woodland
+
+    @param woodland_geoms: (numpy array of shapely geometries) simplified woodland on the British
+        National Grid
+    @param nature_reserve_geoms: (numpy array of shapely geometries) simplified and prepared
+        nature reserves on the British National Grid
+    @param total_area: (numpy float array) square kilometres, full resolution, for each woodland
+    @param woodland_idx: (numpy int array) see :func:`candidate_pairs`
+    @param reserve_idx: (numpy int array) see :func:`candidate_pairs`
+    @param tolerance: (float) metres the geometries were simplified with
+    @param band: (float) metres. At least 2 x `tolerance` so contained and disjoint pairs that
+        aren't re-calculated are certain to be the same at full resolution.
+    @return: (numpy float array, numpy bool array, numpy bool array, numpy bool array,
+        numpy float array) (square kilometres, contained, partial, full_resolution,
+        area_error) where `full_resolution` pairs must be re-calculated and `area_error` is the
+        most the area of the other pairs could be out by, in square kilometres
+    """
+    woodland_geoms = woodland_geoms[woodland_idx]
+    reserve_geoms = nature_reserve_geoms[reserve_idx]
+    contained, partial = classify_overlaps(reserve_geoms, woodland_geoms)
+    disjoint = ~contained & ~partial
+
+    full_resolution = numpy.zeros(len(woodland_idx), dtype=bool)
+    full_resolution[disjoint] = (
+        shapely.distance(woodland_geoms[disjoint], reserve_geoms[disjoint]) <= band
+    )
+    full_resolution[contained] = (
+        shapely.distance(woodland_geoms[contained], shapely.boundary(reserve_geoms[contained]))
+        <= band
+    )
+
+    areas = numpy.zeros(len(woodland_idx))
+    area_error = numpy.zeros(len(woodland_idx))
+    areas[contained] = total_area[woodland_idx[contained]]
+
+    overlaps = shapely.intersection(woodland_geoms[partial], reserve_geoms[partial])
+    overlap_area = shapely.area(overlaps)
+    perimeter = shapely.length(overlaps)
+    full_area = total_area[woodland_idx[partial]] * 1000 * 1000
+    full_resolution[partial] = (overlap_area <= band * perimeter) | (
+        overlap_area >= full_area - band * perimeter
+    )
+    areas[partial] = overlap_area / (1000 * 1000)
+    area_error[partial] = tolerance * perimeter / (1000 * 1000)
+
+    area_error[full_resolution] = 0.0
+    return areas, contained, partial, full_resolution, area_error
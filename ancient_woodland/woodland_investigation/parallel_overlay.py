@@ -0,0 +1,95 @@
+"""
+Calculate the overlap of candidate (woodland, nature reserve) pairs in a pool of local processes.
+
+Each chunk of pairs is sent to a worker as WKB along with just the woodland and nature reserves
+it uses. The worker calculates the area of each pair exactly as :func:`pair_overlap_areas` does
+in a single process and the parent puts the results back in pair order. The per-woodland sums
+are left to the caller so they are always added up in the same order and the output doesn't
+depend on the number of workers or the chunk size.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+
+import ayeaye
+import numpy
+import shapely
+
+from woodland_investigation.overlay import pair_overlap_areas
+
+# set in each worker process by :func:`_init_worker`
+_worker_transformer = None
+
+
+def _init_worker(transformer):
+    global _worker_transformer
+    _worker_transformer = transformer
+
+
+def _chunk_overlap_areas(woodland_wkb, total_area, reserve_wkb, woodland_idx, reserve_idx):
+    """
+    Runs in a worker process.
+
+    @param woodland_wkb: (numpy array of bytes) woodland used by the chunk
+    @param total_area: (numpy float array) of the woodland in `woodland_wkb`
+    @param reserve_wkb: (numpy array of bytes) nature reserves used by the chunk
+    @param woodland_idx: (numpy int array) into `woodland_wkb` for each pair
+    @param reserve_idx: (numpy int array) into `reserve_wkb` for each pair
+    @return: see :func:`pair_overlap_areas`
+    """
+    woodland = ayeaye.Pinnate({"geom": shapely.from_wkb(woodland_wkb), "total_area": total_area})
+    nature_reserve_geoms = shapely.from_wkb(reserve_wkb)
+    shapely.prepare(nature_reserve_geoms)
+    return pair_overlap_areas(
+        woodland, nature_reserve_geoms, woodland_idx, reserve_idx, _worker_transformer
+    )
+
+
+def parallel_pair_overlap_areas(
+    woodland,
+    nature_reserve_geoms,
+    woodland_idx,
+    reserve_idx,
+    transformer=None,
+    workers=2,
+    chunk_size=10000,
+):
+    """
+    Same as :func:`pair_overlap_areas` but chunks of the pairs are calculated in parallel.
+
+    @param workers: (int) number of processes
+    @param chunk_size: (int) pairs sent to a worker at a time
+    @see :func:`pair_overlap_areas` for the other params and the return value
+    """
+    pair_count = len(woodland_idx)
+    areas = numpy.zeros(pair_count)
+    contained = numpy.zeros(pair_count, dtype=bool)
+    partial = numpy.zeros(pair_count, dtype=bool)
+
+    with ProcessPoolExecutor(
+        max_workers=workers, initializer=_init_worker, initargs=(transformer,)
+    ) as pool:
+        chunks = []
+        for start in range(0, pair_count, chunk_size):
+            chunk = slice(start, start + chunk_size)
+
+            # pairs are ordered by nature reserve so each chunk only needs a few of them
+            chunk_woodland, local_woodland_idx = numpy.unique(
+                woodland_idx[chunk], return_inverse=True
+            )
+            chunk_reserves, local_reserve_idx = numpy.unique(
+                reserve_idx[chunk], return_inverse=True
+            )
+            future = pool.submit(
+                _chunk_overlap_areas,
+                shapely.to_wkb(woodland.geom[chunk_woodland]),
+                woodland.total_area[chunk_woodland],
+                shapely.to_wkb(nature_reserve_geoms[chunk_reserves]),
+                local_woodland_idx,
+                local_reserve_idx,
+            )
+            chunks.append((chunk, future))
+
+        for chunk, future in chunks:
+            areas[chunk], contained[chunk], partial[chunk] = future.result()
+
+    return areas, contained, partial
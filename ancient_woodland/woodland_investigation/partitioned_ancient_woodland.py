@@ -0,0 +1,193 @@
+import ayeaye
+import numpy
+import shapely
+from shapely import STRtree, prepare
+
+from woodland_investigation.instrumentation import merge_metrics
+from woodland_investigation.national_nature_ancient_woodland import NationalNatureAncientWoodland
+from woodland_investigation.overlay import select_woodland
+
+
+class PartitionedNationalNatureAncientWoodland(
+    NationalNatureAncientWoodland, ayeaye.PartitionedModel
+):
+    """
+    Same output as :class:`NationalNatureAncientWoodland` but the work is split into tiles of the
+    British National Grid so sub-tasks can run in parallel. This could be in local processes or
+    across a cluster of Fossa workers. See the aws_fargate recipe.
+
+    Each woodland belongs to the tile containing the centre of its bounding box. A sub-task
+    calculates the overlap for all the woodland in one tile and the parent model collates them.
+
+    Only the nature reserves that could overlap a tile's woodland are used in its sub-task.
+
+    `woodland_cache` is off, as it is for :class:`NationalNatureAncientWoodland`, because the cache
+    is written next to the source data and workers might not share a filesystem. Each sub-task
+    then parses the whole ancient woodland file and keeps its tile's woodland. With
+    `woodland_cache` on, and `woodland_cache_directory` somewhere every worker can reach, the
+    parent loads the ancient woodland into the cache once before the sub-tasks start and each
+    sub-task reads just its tile's woodland from there. See :meth:`load_tile_woodland`.
+    """
+
+    # (minx, miny, maxx, maxy) on the British National Grid. Roughly England, anything outside
+    # is put into the nearest tile.
+    tile_bounds = (82000, 5000, 656000, 658000)
+
+    def check_settings(self):
+        super().check_settings()
+        if self.incremental or self.simplify_tolerance:
+            raise ValueError(
+                "Tiles are always calculated with the columnar method, incremental and "
+                "simplify_tolerance aren't available."
+            )
+
+    def build(self):
+        self.check_settings()
+        # The sub-tasks do all the work. Their results are collated here.
+        self.tile_results = []
+
+    def tile_grid(self, partition_count):
+        """
+        Split `tile_bounds` into no more than `partition_count` tiles that are as square as
+        possible.
+
+        @param partition_count: (int)
+        @return: (int, int) columns, rows
+        """
+        minx, miny, maxx, maxy = self.tile_bounds
+        aspect = (maxx - minx) / (maxy - miny)
+        columns = min(partition_count, max(1, round((partition_count * aspect) ** 0.5)))
+        rows = max(1, partition_count // columns)
+        return columns, rows
+
+    def woodland_tiles(self, osgb_bounds, columns, rows):
+        """
+        @param osgb_bounds: (numpy float array) minx, miny, maxx, maxy of each woodland on the
+            British National Grid, see :meth:`load_woodland`
+        @param columns: (int) see :meth:`tile_grid`
+        @param rows: (int) see :meth:`tile_grid`
+        @return: (numpy int array) tile number for each woodland
+        """
+        minx, miny, maxx, maxy = self.tile_bounds
+        bounds = osgb_bounds
+        centre_x = (bounds[:, 0] + bounds[:, 2]) / 2
+        centre_y = (bounds[:, 1] + bounds[:, 3]) / 2
+
+        column = numpy.floor((centre_x - minx) / (maxx - minx) * columns).astype(int)
+        row = numpy.floor((centre_y - miny) / (maxy - miny) * rows).astype(int)
+        return numpy.clip(row, 0, rows - 1) * columns + numpy.clip(column, 0, columns - 1)
+
+    def partition_slice(self, partition_count):
+        cache = self.open_woodland_cache()
+        if cache is not None and not cache.exists():
+            # once here rather than in every sub-task
+            self.load_woodland(self.osgb_transformer())
+
+        columns, rows = self.tile_grid(partition_count)
+        self.log(f"Splitting into {columns} x {rows} tiles")
+        return [
+            ("overlap_in_tile", {"tile": tile, "columns": columns, "rows": rows})
+            for tile in range(columns * rows)
+        ]
+
+    def overlap_in_tile(self, tile, columns, rows):
+        """
+        Sub-task. Find how much of each woodland in the tile is inside the nature reserves.
+
+        @param tile: (int) see :meth:`woodland_tiles`
+        @param columns: (int) see :meth:`tile_grid`
+        @param rows: (int) see :meth:`tile_grid`
+        @return: (dict) column name to list of values. Lists so it serialises to JSON. Also the
+            sub-task's `metrics`.
+        """
+        transformer = self.osgb_transformer()
+        woodland = self.load_tile_woodland(transformer, tile, columns, rows)
+        self.log(f"Tile {tile} has {len(woodland.geom)} ancient woodland areas")
+
+        if len(woodland.geom) > 0:
+            with self.phase("spatial_index", items=len(woodland.geom)):
+                self.woodland_index = STRtree(woodland.geom)
+            nature_reserve_geoms = self.load_nature_reserves(transformer)
+
+            # woodland is in the tile with the centre of its bounding box so it can stick out of
+            # the tile. Reserves outside all of the tile's woodland can't overlap any of it.
+            woodland_bounds = shapely.bounds(woodland.geom)
+            woodland_minx, woodland_miny = woodland_bounds[:, :2].min(axis=0)
+            woodland_maxx, woodland_maxy = woodland_bounds[:, 2:].max(axis=0)
+            reserve_bounds = shapely.bounds(nature_reserve_geoms)
+            near_tile = (
+                (reserve_bounds[:, 0] <= woodland_maxx)
+                & (reserve_bounds[:, 2] >= woodland_minx)
+                & (reserve_bounds[:, 1] <= woodland_maxy)
+                & (reserve_bounds[:, 3] >= woodland_miny)
+            )
+            nature_reserve_geoms = nature_reserve_geoms[near_tile]
+            self.log(f"{len(nature_reserve_geoms)} nature reserves are near tile {tile}")
+
+            prepare(nature_reserve_geoms)
+            area_in_nature_reserve = self.overlap_columnar(
+                woodland, nature_reserve_geoms, transformer
+            )
+        else:
+            area_in_nature_reserve = numpy.zeros(0)
+
+        return {
+            "OBJECTID": woodland.OBJECTID.tolist(),
+            "name": woodland.name.tolist(),
+            "area_in_nature_reserve": area_in_nature_reserve.tolist(),
+            "total_area": woodland.total_area.tolist(),
+            "metrics": self.metrics,
+        }
+
+    def load_tile_woodland(self, transformer, tile, columns, rows):
+        """
+        @param transformer: (:class:`pyproj.Transformer`) WGS84 to British National Grid
+        @param tile: (int) see :meth:`woodland_tiles`
+        @param columns: (int) see :meth:`tile_grid`
+        @param rows: (int) see :meth:`tile_grid`
+        @return: (:class:`ayeaye.Pinnate`) see :meth:`load_woodland`, just the woodland in the tile
+        """
+
+        def in_tile(osgb_bounds):
+            return self.woodland_tiles(osgb_bounds, columns, rows) == tile
+
+        cache = self.open_woodland_cache()
+        if cache is not None:
+            with self.phase("woodland_cache_load"):
+                woodland = cache.load(select=in_tile)
+            if woodland is not None:
+                self.stats["woodland_cache_hit"] += 1
+                return woodland
+
+        # the cache is off or the input isn't a file
+        woodland = self.load_woodland(transformer)
+        return select_woodland(woodland, in_tile(woodland.osgb_bounds))
+
+    def partition_subtask_complete(self, task_message):
+        self.tile_results.append(task_message.return_value)
+        merge_metrics(self.metrics, task_message.return_value["metrics"])
+
+    def partition_complete(self):
+        column_types = {
+            "OBJECTID": numpy.int64,
+            "name": object,
+            "area_in_nature_reserve": numpy.float64,
+            "total_area": numpy.float64,
+        }
+        columns = {
+            column: numpy.concatenate(
+                [numpy.array(r[column], dtype=column_type) for r in self.tile_results]
+            )
+            for column, column_type in column_types.items()
+        }
+
+        # tiles finish in any order, the output is in the same order as the input
+        in_order = numpy.argsort(columns["OBJECTID"], kind="stable")
+        woodland = ayeaye.Pinnate({c: v[in_order] for c, v in columns.items()})
+        self.write_output(woodland, woodland.area_in_nature_reserve)
+        self.log(f"All done!")
+
+
+if __name__ == "__main__":
+    m = PartitionedNationalNatureAncientWoodland()
+    m.go()
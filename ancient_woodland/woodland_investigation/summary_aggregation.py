@@ -0,0 +1,146 @@
+"""
+Add up the output of the woodland models a chunk of rows at a time.
+
+Each chunk is a dictionary of NumPy arrays so totals are vectorised reductions and memory use
+depends on the chunk size, not the number of woodland. OBJECTIDs are the woodland's row number
+in the Ancient Woodland file so the woodland already counted are kept in a bitmap with a bit
+for each possible OBJECTID.
+"""
+
+import csv
+import itertools
+
+import numpy
+
+try:
+    import pyarrow
+    import pyarrow.csv
+except ImportError:
+    pyarrow = None
+
+# most rows in a chunk. pyarrow splits CSV files into chunks by size instead.
+CSV_CHUNK_ROWS = 65536
+
+
+def column_chunks(dataset, column_types, chunk_rows=CSV_CHUNK_ROWS):
+    """
+    Generator yielding chunks of columns from a dataset written by one of the woodland models.
+
+    `columnar://` datasets are read in batches by the connector. CSV files are parsed by pyarrow
+    when it's installed, otherwise by the :mod:`csv` module with each column converted in bulk
+    by NumPy.
+
+    @param dataset: (:class:`ColumnarConnector` or :class:`CsvConnector`)
+    @param column_types: (dict) column name to numpy dtype
+    @param chunk_rows: (int) most rows in a chunk
+    @return: (dict) column name to numpy array
+    """
+    if hasattr(dataset, "iter_batches"):
+        for chunk in dataset.iter_batches(batch_size=chunk_rows, columns=list(column_types)):
+            yield {c: chunk[c].astype(column_type) for c, column_type in column_types.items()}
+        return
+
+    if pyarrow is None:
+        yield from _csv_module_chunks(dataset.file_path, column_types, chunk_rows)
+        return
+
+    convert_options = pyarrow.csv.ConvertOptions(
+        column_types={c: pyarrow.from_numpy_dtype(t) for c, t in column_types.items()},
+        include_columns=list(column_types),
+        strings_can_be_null=False,
+    )
+    reader = pyarrow.csv.open_csv(dataset.file_path, convert_options=convert_options)
+    for batch in reader:
+        yield {
+            c: batch.column(c).to_numpy(zero_copy_only=False).astype(column_type)
+            for c, column_type in column_types.items()
+        }
+
+
+def _csv_module_chunks(file_path, column_types, chunk_rows):
+    with open(file_path, newline="", encoding="utf-8-sig") as f:
+        reader = csv.reader(f)
+        header = next(reader)
+        positions = {c: header.index(c) for c in column_types}
+        while True:
+            rows = list(itertools.islice(reader, chunk_rows))
+            if not rows:
+                return
+
+            yield {
+                c: numpy.array([row[positions[c]] for row in rows]).astype(column_type)
+                for c, column_type in column_types.items()
+            }
+
+
+class WoodlandAreaTotals:
+    """
+    Running totals of woodland area and the area inside nature reserves. Also broken down by the
+    woodland's name.
+
+    A woodland's `total_area` is only counted the first time its OBJECTID is seen, the
+    `area_in_nature_reserve` is counted every time. So woodland in the output of more than one
+    model contributes its area once to `area_total`.
+
+    Memory grows with the number of distinct woodland names, there is a total for each in
+    `by_name`, and by a bit for each OBJECTID up to the largest seen.
+    """
+
+    def __init__(self):
+        self.area_total = 0.0
+        self.area_within = 0.0
+        # name to [area_total, area_within]
+        self.by_name = {}
+        # bit for each OBJECTID already counted
+        self._seen = numpy.zeros(0, dtype=numpy.uint8)
+
+    def _first_sighting(self, object_ids):
+        """
+        @param object_ids: (numpy int array)
+        @return: (numpy int array) positions in `object_ids` of OBJECTIDs not seen before. Just
+            the first position when an OBJECTID is in `object_ids` more than once.
+        """
+        unique_ids, first = numpy.unique(object_ids, return_index=True)
+        if len(unique_ids) == 0:
+            return first
+
+        if unique_ids[0] < 0:
+            raise ValueError("OBJECTIDs must be row numbers so can't be negative")
+
+        bitmap_bytes = int(unique_ids[-1]) // 8 + 1
+        if bitmap_bytes > len(self._seen):
+            # grow geometrically so a file in OBJECTID order isn't copied for every chunk
+            grown = numpy.zeros(max(bitmap_bytes, 2 * len(self._seen)), dtype=numpy.uint8)
+            grown[: len(self._seen)] = self._seen
+            self._seen = grown
+
+        byte_idx = unique_ids >> 3
+        bits = (1 << (unique_ids & 7)).astype(numpy.uint8)
+        unseen = (self._seen[byte_idx] & bits) == 0
+
+        # several of the bits can be in the same byte so these have to be unbuffered
+        numpy.bitwise_or.at(self._seen, byte_idx[unseen], bits[unseen])
+        return first[unseen]
+
+    def add(self, chunk):
+        """
+        @param chunk: (dict) of numpy arrays for OBJECTID, name, area_in_nature_reserve and
+            total_area. See :func:`column_chunks`.
+        """
+        first_sighting = self._first_sighting(chunk["OBJECTID"])
+        total_area = numpy.zeros(len(chunk["OBJECTID"]))
+        total_area[first_sighting] = chunk["total_area"][first_sighting]
+        area_within = chunk["area_in_nature_reserve"]
+
+        self.area_total += float(total_area.sum())
+        self.area_within += float(area_within.sum())
+
+        names, name_idx = numpy.unique(chunk["name"], return_inverse=True)
+        name_totals = numpy.bincount(name_idx, weights=total_area, minlength=len(names))
+        name_within = numpy.bincount(name_idx, weights=area_within, minlength=len(names))
+        for name, name_total, name_area_within in zip(
+            names.tolist(), name_totals.tolist(), name_within.tolist()
+        ):
+            totals = self.by_name.setdefault(name, [0.0, 0.0])
+            totals[0] += name_total
+            totals[1] += name_area_within
@@ -0,0 +1,212 @@
+"""
+On-disk cache of the ancient woodland after it has been read, filtered and re-projected.
+
+The national and local models both read the same ancient woodland file. Parsing the GeoJSON and
+re-projecting every geometry is most of the time it takes to load so the result is saved the
+first time and re-used by the next model.
+
+Entries are content addressed. The key is a hash of the source file's contents plus the
+co-ordinate system of the geometries so changing the file automatically misses the old entry.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+import ayeaye
+import numpy
+import shapely
+
+# Change when the columns or the way woodland is filtered changes so old entries aren't used
+CACHE_VERSION = 1
+
+
+class WoodlandCache:
+    """
+    Each entry is a directory of NumPy `.npy` files, one per column. Geometries are stored as
+    WKB bytes concatenated into a single array with the offset of each geometry in another.
+    Everything is loaded with `mmap_mode` so only the pages that are used are read from disk.
+    """
+
+    # remembers the hash of each source file so it isn't re-calculated when the file's size and
+    # modification time haven't changed
+    sources_file = "sources.json"
+
+    def __init__(self, source_path, crs, cache_directory=None):
+        """
+        @param source_path: (str) the file the woodland was read from
+        @param crs: (str) co-ordinate reference system of the cached geometries, e.g. 'EPSG:27700'
+        @param cache_directory: (str) defaults to a directory alongside `source_path`
+        """
+        self.source_path = os.path.abspath(source_path)
+        self.crs = crs
+        if cache_directory is None:
+            cache_directory = os.path.join(os.path.dirname(self.source_path), ".woodland_cache")
+        self.cache_directory = cache_directory
+        self._key = None
+        self._source_hashed = False
+
+    def _read_sources(self):
+        sources_path = os.path.join(self.cache_directory, self.sources_file)
+        if not os.path.exists(sources_path):
+            return {}
+
+        with open(sources_path) as f:
+            return json.load(f)
+
+    def _write_sources(self, sources):
+        sources_path = os.path.join(self.cache_directory, self.sources_file)
+        with tempfile.NamedTemporaryFile(
+            "w", dir=self.cache_directory, suffix=".tmp", delete=False
+        ) as f:
+            json.dump(sources, f, indent=2)
+        os.replace(f.name, sources_path)
+
+    def source_hash(self):
+        """
+        @return: (str) sha256 of the source file's contents
+        """
+        stat = os.stat(self.source_path)
+        fingerprint = [stat.st_size, stat.st_mtime_ns]
+
+        known = self._read_sources().get(self.source_path)
+        if known is not None and known["fingerprint"] == fingerprint:
+            return known["sha256"]
+
+        file_hash = hashlib.sha256()
+        with open(self.source_path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                file_hash.update(chunk)
+        self._source_hashed = True
+        return file_hash.hexdigest()
+
+    def _remember_source(self):
+        """
+        Record the hash of the source file against its size and modification time.
+
+        @return: (str or None) the hash previously recorded for the source file
+        """
+        stat = os.stat(self.source_path)
+        sources = self._read_sources()
+        previous = sources.get(self.source_path)
+        sources[self.source_path] = {
+            "fingerprint": [stat.st_size, stat.st_mtime_ns],
+            "sha256": self.key.split("_")[0],
+        }
+        self._write_sources(sources)
+        self._remove_unused(None if previous is None else previous["sha256"], sources)
+
+    @property
+    def key(self):
+        """
+        @return: (str) name of the cache entry for the source file and co-ordinate system
+        """
+        if self._key is None:
+            crs = self.crs.replace(":", "_")
+            self._key = f"{self.source_hash()}_{crs}_v{CACHE_VERSION}"
+        return self._key
+
+    @property
+    def entry_directory(self):
+        return os.path.join(self.cache_directory, self.key)
+
+    def exists(self):
+        """
+        @return: (bool) the cache has this version of the source file
+        """
+        return os.path.isdir(self.entry_directory)
+
+    def load(self, select=None):
+        """
+        @param select: (callable) given the woodland's `osgb_bounds` returns a bool array of the
+            woodland to load. Only their geometries are read from disk and parsed. Default is all
+            of the woodland.
+        @return: (:class:`ayeaye.Pinnate`) same columns as
+            :meth:`NationalNatureAncientWoodland.load_woodland` or None if the cache doesn't have
+            this version of the source file
+        """
+        if not self.exists():
+            return None
+
+        if self._source_hashed:
+            # e.g. the file was touched without changing its contents
+            self._remember_source()
+
+        def column(name):
+            return numpy.load(os.path.join(self.entry_directory, f"{name}.npy"), mmap_mode="r")
+
+        osgb_bounds = column("osgb_bounds")
+        offsets = column("geom_offsets")
+        if select is None:
+            # a slice keeps the columns memory mapped
+            selection = slice(None)
+            starts, ends = offsets[:-1], offsets[1:]
+        else:
+            selection = numpy.flatnonzero(select(osgb_bounds))
+            starts, ends = offsets[selection], offsets[selection + 1]
+
+        wkb = column("geom_wkb")
+        geoms = shapely.from_wkb(
+            [wkb[start:end].tobytes() for start, end in zip(starts.tolist(), ends.tolist())]
+        )
+
+        return ayeaye.Pinnate(
+            {
+                "OBJECTID": column("OBJECTID")[selection],
+                "name": column("name")[selection].astype(object),
+                "geom": numpy.asarray(geoms, dtype=object),
+                "total_area": column("total_area")[selection],
+                "osgb_bounds": osgb_bounds[selection],
+            }
+        )
+
+    def save(self, woodland):
+        """
+        Store `woodland` and remove any entries for older versions of the source file.
+
+        @param woodland: (:class:`ayeaye.Pinnate`) see
+            :meth:`NationalNatureAncientWoodland.load_woodland`
+        """
+        os.makedirs(self.cache_directory, exist_ok=True)
+
+        # written to a temporary directory and renamed so a half written entry is never loaded
+        building = tempfile.mkdtemp(dir=self.cache_directory, suffix=".tmp")
+        try:
+            wkb = shapely.to_wkb(woodland.geom)
+            offsets = numpy.zeros(len(wkb) + 1, dtype=numpy.int64)
+            numpy.cumsum([len(w) for w in wkb], out=offsets[1:])
+            columns = {
+                "OBJECTID": woodland.OBJECTID,
+                # fixed width unicode so it can be memory mapped
+                "name": numpy.asarray(woodland.name, dtype=str),
+                "geom_wkb": numpy.frombuffer(b"".join(wkb), dtype=numpy.uint8),
+                "geom_offsets": offsets,
+                "total_area": woodland.total_area,
+                "osgb_bounds": woodland.osgb_bounds,
+            }
+            for name, values in columns.items():
+                numpy.save(os.path.join(building, f"{name}.npy"), values)
+
+            if os.path.isdir(self.entry_directory):
+                # another process got there first
+                shutil.rmtree(building)
+            else:
+                os.rename(building, self.entry_directory)
+        except Exception:
+            shutil.rmtree(building, ignore_errors=True)
+            raise
+
+        self._remember_source()
+
+    def _remove_unused(self, sha256, sources):
+        """
+        Remove entries for `sha256` if no source file has that hash any more.
+        """
+        if sha256 is None or any(s["sha256"] == sha256 for s in sources.values()):
+            return
+
+        for entry in os.listdir(self.cache_directory):
+            if entry.startswith(f"{sha256}_"):
+                shutil.rmtree(os.path.join(self.cache_directory, entry), ignore_errors=True)
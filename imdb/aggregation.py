@@ -0,0 +1,471 @@
+'''
+Group records by a key and aggregate each group, e.g. count the films in each genre.
+
+Records are added in batches, as they come from a dataset's `iter_batches`. Each batch is split
+into groups first so each aggregator is called once per group in the batch rather than once per
+record. When there are more groups than fit in memory the groups so far are sorted and written
+to a file and the files are merged at the end. Groups built in other processes can be merged
+in, see :meth:`GroupBy.merge`.
+
+e.g. films in each genre and year and the number of distinct titles in each-
+>>> by_genre = GroupBy(key=['genres', 'startYear'], explode={'genres': ','},
+>>>                    aggregators={'films': Count(), 'titles': ApproxDistinct('primaryTitle')})
+>>> for films in dataset.iter_batches():
+>>>     by_genre.add_batch(films)
+>>> for (genre, year), results in by_genre.results():
+>>>     ...
+'''
+from collections import Counter
+from hashlib import blake2b
+import heapq
+from itertools import chain, product
+import math
+import os
+import pickle
+import tempfile
+
+
+class Aggregator:
+    """
+    Base class for aggregators. The state for each group is created by :meth:`initial`, updated
+    with records by :meth:`update` and turned into the group's result by :meth:`result`. Two
+    states for the same group, e.g. from different processes, are combined by :meth:`merge`.
+    States must be picklable.
+    """
+    # False when only the number of records in a group is used, see :meth:`update_count`
+    needs_records = True
+
+    def __init__(self, field=None):
+        """
+        @param field: (str) the field in each record that is aggregated
+        """
+        self.field = field
+
+    def initial(self):
+        raise NotImplementedError()
+
+    def update(self, state, records):
+        """
+        @param state: from :meth:`initial`, :meth:`update` or :meth:`merge`
+        @param records: (list of dict) in the group
+        @return: the new state
+        """
+        raise NotImplementedError()
+
+    def update_count(self, state, count):
+        """
+        :meth:`update` for aggregators that don't need the records themselves.
+
+        @param count: (int) records in the group
+        @return: the new state
+        """
+        raise NotImplementedError()
+
+    def merge(self, state, other_state):
+        """
+        @return: the state with everything from `other_state`
+        """
+        raise NotImplementedError()
+
+    def result(self, state):
+        return state
+
+
+class Count(Aggregator):
+    """
+    Number of records.
+    """
+    needs_records = False
+
+    def initial(self):
+        return 0
+
+    def update(self, state, records):
+        return state + len(records)
+
+    def update_count(self, state, count):
+        return state + count
+
+    def merge(self, state, other_state):
+        return state + other_state
+
+
+class Sum(Aggregator):
+    """
+    Total of a numeric field.
+    """
+
+    def initial(self):
+        return 0
+
+    def update(self, state, records):
+        field = self.field
+        return state + sum(record[field] for record in records)
+
+    def merge(self, state, other_state):
+        return state + other_state
+
+
+class Distinct(Aggregator):
+    """
+    Exact number of distinct values in a field. Every value is kept in memory, see
+    :class:`ApproxDistinct` for fields with many values.
+    """
+
+    def initial(self):
+        return set()
+
+    def update(self, state, records):
+        field = self.field
+        state.update(record[field] for record in records)
+        return state
+
+    def merge(self, state, other_state):
+        state.update(other_state)
+        return state
+
+    def result(self, state):
+        return len(state)
+
+
+def _hash(value, digest_size=8):
+    """
+    @return: (bytes) hash of the value that is the same in every process
+    """
+    return blake2b(repr(value).encode('utf-8'), digest_size=digest_size).digest()
+
+
+class ApproxDistinct(Aggregator):
+    """
+    Estimate of the number of distinct values in a field using HyperLogLog. The state is
+    2**precision bytes and the standard error is about 1.04 / sqrt(2**precision), so 1.6% with
+    the default precision.
+    """
+
+    def __init__(self, field, precision=12):
+        """
+        @param field: (str)
+        @param precision: (int) 4 to 16
+        """
+        if not 4 <= precision <= 16:
+            raise ValueError("precision must be between 4 and 16")
+
+        super().__init__(field)
+        self.precision = precision
+
+    def initial(self):
+        return bytearray(1 << self.precision)
+
+    def update(self, state, records):
+        field = self.field
+        remaining_bits = 64 - self.precision
+        remaining_mask = (1 << remaining_bits) - 1
+        for value in {record[field] for record in records}:
+            hashed = int.from_bytes(_hash(value), 'big')
+            register = hashed >> remaining_bits
+            # position of the first 1 bit in the rest of the hash
+            rank = remaining_bits - (hashed & remaining_mask).bit_length() + 1
+            if rank > state[register]:
+                state[register] = rank
+        return state
+
+    def merge(self, state, other_state):
+        return bytearray(map(max, state, other_state))
+
+    def result(self, state):
+        registers = len(state)
+        alpha = 0.7213 / (1 + 1.079 / registers)
+        estimate = alpha * registers * registers / sum(2.0 ** -rank for rank in state)
+
+        empty_registers = state.count(0)
+        if estimate <= 2.5 * registers and empty_registers:
+            # small cardinalities are better estimated from the registers still empty
+            estimate = registers * math.log(registers / empty_registers)
+
+        return int(round(estimate))
+
+
+class TopK(Aggregator):
+    """
+    The most frequent values in a field and an estimate of how often each occurs. Occurrences
+    are counted in a count-min sketch so memory doesn't grow with the number of distinct values.
+    Counts can be over estimated, by at most about 2 * records / `width` with probability
+    1 - 0.5 ** `depth`. Each group has a sketch of `width` * `depth` counters so it's best with
+    few groups.
+
+    Each state keeps 4 * `k` candidate values so that when states are merged, or groups are
+    written to files, a value that is in the top `k` overall is very likely to be a candidate in
+    one of them. With many values of about the same frequency it can still be missed.
+    """
+
+    def __init__(self, field, k=10, width=2048, depth=4):
+        """
+        @param field: (str)
+        @param k: (int) values to keep
+        @param width: (int) counters in each row of the sketch
+        @param depth: (int) rows in the sketch, at most 16
+        """
+        super().__init__(field)
+        self.k = k
+        self.width = width
+        self.depth = depth
+
+    def initial(self):
+        # sketch and candidate value to estimated count
+        return [[0] * self.width for _ in range(self.depth)], {}
+
+    def _columns(self, value):
+        hashed = _hash(value, digest_size=4 * self.depth)
+        return [int.from_bytes(hashed[4 * row:4 * row + 4], 'little') % self.width
+                for row in range(self.depth)]
+
+    def _estimate(self, sketch, value):
+        return min(sketch_row[column]
+                   for sketch_row, column in zip(sketch, self._columns(value)))
+
+    def _keep_top(self, candidates):
+        if len(candidates) > 4 * self.k:
+            top = heapq.nlargest(4 * self.k, candidates.items(), key=lambda item: item[1])
+            candidates.clear()
+            candidates.update(top)
+
+    def update(self, state, records):
+        sketch, candidates = state
+        field = self.field
+        for value, occurrences in Counter(record[field] for record in records).items():
+            estimate = None
+            for sketch_row, column in zip(sketch, self._columns(value)):
+                sketch_row[column] += occurrences
+                if estimate is None or sketch_row[column] < estimate:
+                    estimate = sketch_row[column]
+            candidates[value] = estimate
+
+        self._keep_top(candidates)
+        return state
+
+    def merge(self, state, other_state):
+        sketch, candidates = state
+        other_sketch, other_candidates = other_state
+        for sketch_row, other_row in zip(sketch, other_sketch):
+            sketch_row[:] = map(sum, zip(sketch_row, other_row))
+
+        for value in set(candidates).union(other_candidates):
+            candidates[value] = self._estimate(sketch, value)
+
+        self._keep_top(candidates)
+        return state
+
+    def result(self, state):
+        _, candidates = state
+        return sorted(candidates.items(), key=lambda item: (-item[1], repr(item[0])))[:self.k]
+
+
+def _sort_key(key):
+    """
+    Order for keys of mixed types, e.g. a year that is sometimes None.
+    """
+    parts = key if isinstance(key, tuple) else (key,)
+    return tuple((0, '') if part is None
+                 else (1, part) if isinstance(part, (int, float))
+                 else (2, part) if isinstance(part, str)
+                 else (3, repr(part))
+                 for part in parts)
+
+
+class GroupBy:
+    """
+    Aggregate records grouped by a key, see the module docs.
+    """
+
+    def __init__(self, key, aggregators, explode=None, max_groups=1000000, spill_directory=None):
+        """
+        @param key: (str, list of str, callable or None) field or fields making the group's key.
+            A callable is given a record and returns the keys, in a list or tuple, of the groups
+            it's in.
+            None puts every record in one group.
+        @param aggregators: (dict) name to :class:`Aggregator`
+        @param explode: (dict) field name to delimiter. A record is in a group for each value
+            in these fields. Strings are split on the delimiter, lists and tuples are used as
+            they are.
+        @param max_groups: (int) groups kept in memory before they are written to a file
+        @param spill_directory: (str) where those files go. Default is the system's temporary
+            directory.
+        """
+        self.key = key
+        self.aggregator_names = list(aggregators)
+        self.aggregators = [aggregators[name] for name in self.aggregator_names]
+        self.explode = explode or {}
+        self.max_groups = max_groups
+        self.spill_directory = spill_directory
+
+        # key to list of states, one for each aggregator
+        self.groups = {}
+        # files of groups sorted by key
+        self.runs = []
+
+        # skips building lists of each group's records when they aren't needed
+        self.counts_only = not any(aggregator.needs_records for aggregator in self.aggregators)
+        # called for every record so the callable is used directly when there is one
+        self._key_function = key if callable(key) else self._keys
+
+        if callable(key) or key is None:
+            pass
+        elif set(self.explode) - set([key] if isinstance(key, str) else key):
+            raise ValueError("Only fields in the key can be exploded")
+
+    def _keys(self, record):
+        """
+        @return: (list) keys of the groups a record is in
+        """
+        if self.key is None:
+            return [None]
+
+        fields = [self.key] if isinstance(self.key, str) else self.key
+        values = []
+        for field in fields:
+            value = record[field]
+            if field in self.explode:
+                if isinstance(value, str):
+                    value = value.split(self.explode[field])
+                values.append(value)
+            else:
+                values.append((value,))
+
+        if isinstance(self.key, str):
+            return list(values[0])
+        return list(product(*values))
+
+    def add(self, record):
+        self.add_batch([record])
+
+    def add_batch(self, records):
+        """
+        @param records: (list of dict)
+        """
+        groups = self.groups
+        aggregators = self.aggregators
+        if self.counts_only:
+            key_counts = Counter(chain.from_iterable(map(self._key_function, records)))
+            for key, count in key_counts.items():
+                states = groups.get(key)
+                if states is None:
+                    states = [aggregator.initial() for aggregator in aggregators]
+                    groups[key] = states
+                for position, aggregator in enumerate(aggregators):
+                    states[position] = aggregator.update_count(states[position], count)
+
+        else:
+            batch_groups = {}
+            for record in records:
+                for key in self._key_function(record):
+                    group = batch_groups.get(key)
+                    if group is None:
+                        batch_groups[key] = [record]
+                    else:
+                        group.append(record)
+
+            for key, group_records in batch_groups.items():
+                states = groups.get(key)
+                if states is None:
+                    states = [aggregator.initial() for aggregator in aggregators]
+                    groups[key] = states
+                for position, aggregator in enumerate(aggregators):
+                    states[position] = aggregator.update(states[position], group_records)
+
+        if len(groups) > self.max_groups:
+            self.spill()
+
+    def _merge_states(self, states, other_states):
+        return [aggregator.merge(state, other_state)
+                for aggregator, state, other_state in zip(self.aggregators, states, other_states)]
+
+    def merge(self, other):
+        """
+        Add the groups from another :class:`GroupBy` with the same aggregators, e.g. one that
+        ran in another process on the same machine. Its files become this one's.
+
+        @param other: (:class:`GroupBy`)
+        """
+        for key, other_states in other.groups.items():
+            states = self.groups.get(key)
+            if states is None:
+                self.groups[key] = other_states
+            else:
+                self.groups[key] = self._merge_states(states, other_states)
+
+        self.runs.extend(other.runs)
+        other.runs = []
+        if len(self.groups) > self.max_groups:
+            self.spill()
+
+    def spill(self):
+        """
+        Write the groups in memory to a file, sorted by key.
+        """
+        if not self.groups:
+            return
+
+        fd, run_path = tempfile.mkstemp(dir=self.spill_directory, prefix='groupby-',
+                                        suffix='.groups')
+        with os.fdopen(fd, 'wb') as f:
+            for key in sorted(self.groups, key=_sort_key):
+                pickle.dump((key, self.groups[key]), f, protocol=pickle.HIGHEST_PROTOCOL)
+
+        self.runs.append(run_path)
+        self.groups = {}
+
+    @staticmethod
+    def _read_run(run_path):
+        with open(run_path, 'rb') as f:
+            while True:
+                try:
+                    key, states = pickle.load(f)
+                except EOFError:
+                    return
+                yield _sort_key(key), key, states
+
+    def _merged_groups(self):
+        """
+        Generator yielding key and states for each group, combining the files and memory.
+        """
+        if not self.runs:
+            yield from self.groups.items()
+            return
+
+        in_memory = [(_sort_key(key), key, self.groups[key])
+                     for key in sorted(self.groups, key=_sort_key)]
+        runs = [self._read_run(run_path) for run_path in self.runs]
+        merged = heapq.merge(iter(in_memory), *runs, key=lambda group: group[0])
+
+        current_key = current_states = None
+        started = False
+        for _, key, states in merged:
+            if started and key == current_key:
+                current_states = self._merge_states(current_states, states)
+                continue
+
+            if started:
+                yield current_key, current_states
+            current_key, current_states, started = key, states, True
+
+        if started:
+            yield current_key, current_states
+
+    def results(self):
+        """
+        Generator yielding the key and a dictionary of aggregator name to result for each group.
+        Groups are in key order when any have been written to files.
+        """
+        for key, states in self._merged_groups():
+            yield key, {name: aggregator.result(state)
+                        for name, aggregator, state in zip(self.aggregator_names,
+                                                            self.aggregators, states)}
+
+    def close(self):
+        """
+        Delete the files written by :meth:`spill`.
+        """
+        for run_path in self.runs:
+            if os.path.exists(run_path):
+                os.remove(run_path)
+        self.runs = []
@@ -0,0 +1,337 @@
+'''
+Kafka connector that produces messages in compressed batches.
+
+The built in `kafka://` connector sends each message with the producer's defaults, that's no
+compression and a batch is sent as soon as there is a message to send. Sending millions of small
+messages that way spends most of the time on round trips to the broker.
+'''
+import json
+from collections import namedtuple
+
+try:
+    from kafka import KafkaConsumer, KafkaProducer, TopicPartition
+except ImportError:
+    pass
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+import ayeaye
+from ayeaye.connectors.base import AccessMode
+from ayeaye.connectors.kafka_connector import KafkaConnector
+
+# same as kafka.structs.OffsetAndTimestamp, which gained a field in kafka-python 2.1
+PartitionOffset = namedtuple('PartitionOffset', ['offset'])
+
+
+class JsonCodec:
+    """
+    Messages are JSON documents. orjson is used when it's installed.
+    """
+    name = 'json'
+
+    def encode(self, record):
+        """
+        @param record: (mixed) anything that can be serialised to JSON
+        @return: (bytes)
+        """
+        if orjson is None:
+            return json.dumps(record).encode('utf-8')
+        return orjson.dumps(record)
+
+    def decode_batch(self, values, fields=None):
+        """
+        @param values: (list of bytes) messages
+        @param fields: (list of str) fields the caller needs. JSON documents are always decoded
+            completely.
+        @return: (list) decoded messages
+        """
+        loads = json.loads if orjson is None else orjson.loads
+        return [loads(value) for value in values]
+
+
+# codec name, as used in the engine_url, to class
+codecs = {}
+
+
+def register_codec(codec_class):
+    """
+    Make a codec available to the `codec` engine_url param.
+
+    @param codec_class: (class) with a `name` attribute and `encode` and `decode_batch` methods.
+        See :class:`JsonCodec`. `decode_batch` can skip fields that aren't asked for.
+    """
+    codecs[codec_class.name] = codec_class
+
+
+register_codec(JsonCodec)
+
+
+class BatchedKafkaConnector(KafkaConnector):
+    engine_type = 'kafka-batched://'
+
+    # engine_url param to (KafkaProducer arg, type, default)
+    producer_params = {
+        'linger_ms': ('linger_ms', int, 50),
+        'batch_size': ('batch_size', int, 1024 * 1024),
+        'compression': ('compression_type', str, 'lz4'),
+        'acks': ('acks', str, 'all'),
+        'in_flight': ('max_in_flight_requests_per_connection', int, 5),
+    }
+
+    # KafkaConsumer args when reading
+    consumer_config = {'max_poll_records': 10000,
+                       'max_partition_fetch_bytes': 8 * 1024 * 1024,
+                       'fetch_max_bytes': 64 * 1024 * 1024,
+                       }
+
+    # give up reading after this many polls in a row don't return any messages
+    max_empty_polls = 10
+    poll_timeout_ms = 1000
+
+    def __init__(self, *args, **kwargs):
+        """
+        Same as :class:`KafkaConnector` but messages are collected into batches of up to
+        `batch_size` bytes, compressed and sent asynchronously. Nothing waits for the broker until
+        :meth:`flush`, which happens once when the dataset is closed.
+
+        Delivery failures are reported by the producer's background thread and counted in
+        `stats.delivery_errors`. `stats.last_delivery_error` is the most recent one.
+
+        The codec encodes records passed to :meth:`add` and decodes messages from
+        :meth:`iter_batches`. It's JSON unless another is registered with :func:`register_codec`
+        and given in the engine_url.
+
+        Connection information-
+            engine_url format is
+            kafka-batched://bootstrap_server/topic=<topic>;[linger_ms=<int>;][batch_size=<bytes>;]
+            [compression=<none|gzip|snappy|lz4|zstd>;][acks=<0|1|all>;][in_flight=<int>;]
+            [codec=<name>;]
+        e.g. kafka-batched://localhost/topic=imdb-films;compression=zstd;linger_ms=100;
+
+        Iterating is the same as :class:`KafkaConnector`. :meth:`iter_batches` reads many
+        messages at a time and decodes them in bulk.
+        """
+        super().__init__(*args, **kwargs)
+        self._codec = None
+        self.stats = ayeaye.Pinnate({'added': 0,
+                                     'delivered': 0,
+                                     'delivery_errors': 0,
+                                     'last_delivery_error': None,
+                                     })
+
+    def _url_params(self):
+        """
+        @return: (dict) param name to value (str) from the engine_url
+        """
+        params = {}
+        s_url = self.engine_url[len(self.__class__.engine_type):]
+        _, r_url = s_url.split('/', 1)
+        for param_section in r_url.split(';'):
+            if '=' in param_section:
+                k, v = param_section.split('=', 1)
+                params[k] = v
+        return params
+
+    @property
+    def codec(self):
+        """
+        @return: (obj) encodes and decodes messages, see :class:`JsonCodec`
+        """
+        if self._codec is None:
+            codec_name = self._url_params().get('codec', JsonCodec.name)
+            if codec_name not in codecs:
+                raise ValueError(f"Unknown codec '{codec_name}'. Known codecs are: "
+                                 f"{', '.join(sorted(codecs))}")
+            self._codec = codecs[codec_name]()
+        return self._codec
+
+    def _producer_config(self):
+        """
+        @return: (dict) KafkaProducer args from the engine_url
+        """
+        params = self._url_params()
+        config = {}
+        for param, (producer_arg, param_type, default) in self.producer_params.items():
+            value = param_type(params[param]) if param in params else default
+            if producer_arg == 'compression_type' and value == 'none':
+                value = None
+            elif producer_arg == 'acks' and value != 'all':
+                value = int(value)
+            config[producer_arg] = value
+
+        return config
+
+    def connect(self):
+        if self.client is None and self.access == AccessMode.READ:
+            (self.bootstrap_server,
+             self.topic,
+             self.start_params,
+             self.end_params) = self._decode_engine_url()
+
+            self.client = KafkaConsumer(bootstrap_servers=self.bootstrap_server,
+                                        **self.consumer_config
+                                        )
+            self._setup_consumer()
+
+        elif self.client is None and self.access == AccessMode.WRITE:
+            (self.bootstrap_server,
+             self.topic,
+             self.start_params,
+             self.end_params) = self._decode_engine_url()
+
+            if self.start_params is not None or self.end_params is not None:
+                raise ValueError("Start and end offsets can't be set when writing")
+
+            self.client = KafkaProducer(bootstrap_servers=self.bootstrap_server,
+                                        **self._producer_config()
+                                        )
+
+        super().connect()
+
+    def _setup_consumer(self):
+        """
+        Offsets for reading the whole topic. Start and end dates are left to
+        :class:`KafkaConnector`.
+        """
+        if self.start_params is not None or self.end_params is not None:
+            return super()._setup_consumer()
+
+        partitions = self.client.partitions_for_topic(self.topic)
+        if not partitions:
+            raise ValueError(f"Topic {self.topic} doesn't exist")
+
+        topic_partitions = [TopicPartition(topic=self.topic, partition=p) for p in partitions]
+        starts = self.client.beginning_offsets(topic_partitions)
+        ends = self.client.end_offsets(topic_partitions)
+
+        # end offsets are inclusive
+        self.start_p_offsets = {tp: PartitionOffset(offset) for tp, offset in starts.items()}
+        self.end_p_offsets = {tp: PartitionOffset(offset - 1) for tp, offset in ends.items()}
+
+    def partitions(self):
+        """
+        @return: (list of int) partitions in the topic
+        """
+        return sorted(partition for partition, _, _ in self._partition_ranges())
+
+    def next_offsets(self):
+        """
+        Offsets following the last message each partition had when the dataset was connected.
+        Reading from these offsets on a later run only reads messages added since.
+
+        @return: (dict) partition (int) to offset (int)
+        """
+        return {partition: end_offset + 1 for partition, _, end_offset in self._partition_ranges()}
+
+    def iter_batches(self, partitions=None, start_offsets=None, fields=None):
+        """
+        Generator yielding a list of messages at a time, each decoded by the codec.
+
+        @param partitions: (list of int) only read these partitions. Default is all of them.
+        @param start_offsets: (dict) partition (int) to the first offset (int) to read. e.g. from
+            :meth:`next_offsets` on an earlier run. Partitions not in the dict are read from the
+            start of the range given in the engine_url.
+        @param fields: (list of str) fields needed from each message. The codec might not decode
+            the others. Default is all of them.
+        """
+        self.connect()
+
+        # end offsets are inclusive
+        end_offsets = {}
+        first_offsets = {}
+        for partition, start_offset, end_offset in self._partition_ranges():
+            if start_offsets and partition in start_offsets:
+                start_offset = max(start_offset, start_offsets[partition])
+
+            if (partitions is None or partition in partitions) and end_offset >= start_offset:
+                topic_partition = TopicPartition(topic=self.topic, partition=partition)
+                end_offsets[topic_partition] = end_offset
+                first_offsets[topic_partition] = start_offset
+
+        self.approx_position = 0
+        self.items_to_fetch = sum(end_offsets[tp] - first_offsets[tp] + 1 for tp in end_offsets)
+        if not end_offsets:
+            return
+
+        self.client.assign(list(end_offsets))
+        for topic_partition, start_offset in first_offsets.items():
+            self.client.seek(topic_partition, start_offset)
+
+        decode_batch = self.codec.decode_batch
+        empty_polls = 0
+        while end_offsets:
+            polled = self.client.poll(timeout_ms=self.poll_timeout_ms)
+            values = []
+            for topic_partition, messages in polled.items():
+                end_offset = end_offsets.get(topic_partition)
+                if end_offset is None:
+                    continue
+
+                values.extend(m.value for m in messages if m.offset <= end_offset)
+                if messages and messages[-1].offset >= end_offset:
+                    del end_offsets[topic_partition]
+                    self.client.pause(topic_partition)
+
+            if not values:
+                empty_polls += 1
+                if empty_polls >= self.max_empty_polls:
+                    raise ValueError(f"No messages from {self.topic} while some were expected")
+                continue
+
+            empty_polls = 0
+            self.approx_position += len(values)
+            yield decode_batch(values, fields=fields)
+
+    @property
+    def progress(self):
+        # there mightn't be any new messages to fetch
+        if not self.items_to_fetch:
+            return None
+
+        return super().progress
+
+    def flush(self):
+        # nothing to wait for when nothing has been sent
+        if self.client is None and self.access == AccessMode.WRITE:
+            return
+
+        super().flush()
+
+    def _delivered(self, record_metadata):
+        self.stats.delivered += 1
+
+    def _delivery_failed(self, exception):
+        self.stats.delivery_errors += 1
+        self.stats.last_delivery_error = repr(exception)
+
+    def add(self, data, partition=None, key=None):
+        """
+        Queue a message to be sent to the topic.
+        @param data: (str or bytes) sent as it is or anything else is encoded by the codec
+        @param partition: (int) Kafka partition. Default is the producer's partitioner.
+        @param key: (str or bytes) optional message key
+        """
+        if self.access != AccessMode.WRITE:
+            raise ValueError("Write attempted on dataset opened in READ mode.")
+
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        elif not isinstance(data, bytes):
+            data = self.codec.encode(data)
+
+        if isinstance(key, str):
+            key = key.encode('utf-8')
+
+        if self.client is None:
+            self.connect()
+
+        future = self.client.send(self.topic, value=data, key=key, partition=partition)
+        future.add_callback(self._delivered)
+        future.add_errback(self._delivery_failed)
+        self.stats.added += 1
+
+
+ayeaye.connector_registry.register_connector(BatchedKafkaConnector)
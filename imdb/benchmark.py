@@ -0,0 +1,141 @@
+'''
+Push an IMDB file through :class:`Film2Kafka` and :class:`FilmGenresSummary` and report the
+messages per second for each.
+
+The models write to and read from a `kafka-local://` topic (see `local_log.py`) in a temporary
+directory, so a broker isn't needed and runs on the same machine can be compared. Results are
+JSON-
+
+    python benchmark.py --tsv title.basics.tsv --partitions 3 --output results.json
+
+Every film is sent. The index of films already sent and the summary's checkpoint aren't used.
+'''
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+from datetime import datetime, timezone
+from time import time
+
+import films_to_kafka
+from films_to_kafka import Film2Kafka
+from genre_summary import FilmGenresSummary
+# registers the kafka-local:// engine type
+import local_log
+
+
+def topic_bytes(topic_directory):
+    """
+    @return: (int) size of the topic's segments
+    """
+    return sum(os.path.getsize(os.path.join(directory, name))
+               for directory, _, names in os.walk(topic_directory)
+               for name in names if name.endswith('.log'))
+
+
+def run_model(model, datasets, settings=None):
+    """
+    @param model: (:class:`ayeaye.Model` subclass)
+    @param datasets: (dict) dataset name to the engine_url to use instead
+    @param settings: (dict) model attributes to set before the model is run
+    @return: (model instance, float) the model after it has run and the seconds it took
+    """
+    m = model()
+    m.log_to_stdout = False
+    for attribute, value in (settings or {}).items():
+        setattr(m, attribute, value)
+
+    for dataset_name, engine_url in datasets.items():
+        setattr(m, dataset_name, getattr(model, dataset_name).clone(engine_url=engine_url))
+
+    start = time()
+    m.go()
+    return m, time() - start
+
+
+def benchmark(tsv_path, working_directory, partitions, codec, consumer_workers):
+    """
+    @return: (dict) results for each model
+    """
+    topic_url = (f"kafka-local://{working_directory}/topic=imdb-films;"
+                 f"partitions={partitions};codec={codec}")
+
+    # Film2Kafka only sends the first 100,000 films when DEBUG is set
+    debug = films_to_kafka.DEBUG
+    films_to_kafka.DEBUG = False
+    try:
+        ingest, ingest_seconds = run_model(Film2Kafka,
+                                           {'imdb_films': f"tsv-projected://{tsv_path}",
+                                            'output_stream': topic_url,
+                                            },
+                                           {'published_index_path': None},
+                                           )
+    finally:
+        films_to_kafka.DEBUG = debug
+    messages = ingest.output_stream.stats.added
+    ingest_results = {'seconds': round(ingest_seconds, 3),
+                      'messages': messages,
+                      'messages_per_second': round(messages / ingest_seconds, 1),
+                      'megabytes_per_second': round(os.path.getsize(tsv_path) / ingest_seconds
+                                                    / (1024 * 1024), 1),
+                      'topic_bytes': topic_bytes(os.path.join(working_directory, 'imdb-films')),
+                      }
+
+    summary_path = os.path.join(working_directory, 'films_summary.json')
+    year_summary_path = os.path.join(working_directory, 'films_by_year_summary.json')
+    summary, summary_seconds = run_model(FilmGenresSummary,
+                                         {'input_stream': topic_url,
+                                          'genre_summary': f"json://{summary_path}",
+                                          'genre_year_summary': f"json://{year_summary_path}",
+                                          },
+                                         {'incremental': False,
+                                          'consumer_workers': consumer_workers,
+                                          },
+                                         )
+    messages = summary.progress_metrics['count']
+    summary_results = {'seconds': round(summary_seconds, 3),
+                       'messages': messages,
+                       'messages_per_second': round(messages / summary_seconds, 1),
+                       }
+
+    return {'Film2Kafka': ingest_results, 'FilmGenresSummary': summary_results}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--tsv', default='title.basics.tsv', help="IMDB's title.basics.tsv")
+    parser.add_argument('--partitions', type=int, default=1, help="partitions in the topic")
+    parser.add_argument('--codec', default='film', help="message encoding, e.g. json or film")
+    parser.add_argument('--consumer-workers', type=int, default=1,
+                        help="processes counting genres, see FilmGenresSummary")
+    parser.add_argument('--output', help="also write the results to this file")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.tsv):
+        sys.exit(f"{args.tsv} doesn't exist. See README.md for where to download it.")
+
+    results = {'started': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+               'python': platform.python_version(),
+               'platform': platform.platform(),
+               'tsv': os.path.abspath(args.tsv),
+               'tsv_bytes': os.path.getsize(args.tsv),
+               'partitions': args.partitions,
+               'codec': args.codec,
+               'consumer_workers': args.consumer_workers,
+               }
+
+    working_directory = tempfile.mkdtemp()
+    try:
+        results['models'] = benchmark(os.path.abspath(args.tsv), working_directory,
+                                      args.partitions, args.codec, args.consumer_workers)
+    finally:
+        shutil.rmtree(working_directory)
+
+    output = json.dumps(results, indent=4)
+    print(output)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output)
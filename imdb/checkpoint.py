@@ -0,0 +1,66 @@
+'''
+Keep a model's state between runs so a re-run only processes what is new.
+'''
+import json
+import os
+import tempfile
+
+
+def atomic_write_json(path, data):
+    """
+    Write a JSON document so readers only ever see the old or the new document, never a partly
+    written one.
+
+    @param path: (str)
+    @param data: (mixed) anything that can be serialised to JSON
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+
+    fd, building = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(data, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(building, path)
+    except BaseException:
+        if os.path.exists(building):
+            os.remove(building)
+        raise
+
+
+class Checkpoint:
+    """
+    A JSON document with the state of a model after its last run.
+    """
+
+    def __init__(self, path, source):
+        """
+        @param path: (str) JSON file
+        @param source: (str) where the state came from, e.g. an engine_url. State from a different
+            source isn't used.
+        """
+        self.path = path
+        self.source = source
+
+    def load(self):
+        """
+        @return: (dict) state passed to :meth:`save` or None if there isn't a usable checkpoint
+        """
+        if not os.path.exists(self.path):
+            return None
+
+        with open(self.path) as f:
+            checkpoint = json.load(f)
+
+        if checkpoint.get('source') != self.source:
+            return None
+
+        return checkpoint['state']
+
+    def save(self, state):
+        """
+        @param state: (dict) anything that can be serialised to JSON
+        """
+        atomic_write_json(self.path, {'source': self.source, 'state': state})
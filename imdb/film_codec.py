@@ -0,0 +1,166 @@
+'''
+Fixed binary layout for the IMDB film messages.
+
+A film as JSON is around 100 bytes, most of it field names and quotes, and every consumer has to
+parse the text and then split the genres. This layout is 11 bytes plus the title-
+
+    version         uint8   FORMAT_VERSION
+    tconst          uint32  the number after 'tt'
+    startYear       uint16  0 when it isn't known
+    genres          uint32  bit n is set for GENRES[n]
+    primaryTitle    UTF-8   the rest of the message
+
+Select it with `codec=film` in a `kafka-batched://` engine_url.
+'''
+import struct
+
+from batched_kafka import register_codec
+
+FORMAT_VERSION = 1
+
+# IMDB's genres. Only add to the end, the position is the bit in each message.
+GENRES = ('Action', 'Adult', 'Adventure', 'Animation', 'Biography', 'Comedy', 'Crime',
+          'Documentary', 'Drama', 'Family', 'Fantasy', 'Film-Noir', 'Game-Show', 'History',
+          'Horror', 'Music', 'Musical', 'Mystery', 'News', 'Reality-TV', 'Romance', 'Sci-Fi',
+          'Short', 'Sport', 'Talk-Show', 'Thriller', 'War', 'Western')
+
+HEADER = struct.Struct('<BIHI')
+
+FIELDS = ('tconst', 'primaryTitle', 'startYear', 'genres')
+
+# field to (struct, offset) for the fields in the header
+FIELD_STRUCTS = {'tconst': (struct.Struct('<I'), 1),
+                 'startYear': (struct.Struct('<H'), 5),
+                 'genres': (struct.Struct('<I'), 7),
+                 }
+
+# IMDB's marker for a missing value
+IMDB_NULL = r'\N'
+
+
+class FilmCodec:
+    """
+    Encode and decode films in the layout described above.
+
+    Records to encode have the fields sent by :class:`Film2Kafka`. `startYear` and `genres` can
+    be as they are in IMDB's files, i.e. strings, or an int and a list of genre names.
+
+    Decoded films have `startYear` as an int, or None, and `genres` as a tuple of genre names,
+    which is empty when IMDB doesn't give any.
+    """
+    name = 'film'
+
+    def __init__(self):
+        self.genre_bits = {genre: 1 << position for position, genre in enumerate(GENRES)}
+        # most films have one of a few hundred combinations of genres
+        self._genre_names = {}
+        self._genre_strings = {}
+
+    def encode(self, record):
+        """
+        @param record: (dict) with tconst, primaryTitle, startYear and genres
+        @return: (bytes)
+        """
+        tconst = record['tconst']
+        tconst_number = int(tconst[2:])
+        if 'tt%07d' % tconst_number != tconst:
+            raise ValueError(f"Can't encode tconst '{tconst}'")
+
+        start_year = record['startYear']
+        if start_year == IMDB_NULL or start_year is None:
+            start_year = 0
+
+        genres = record['genres']
+        if isinstance(genres, str):
+            genre_bits = self._genre_strings.get(genres)
+            if genre_bits is None:
+                genre_bits = self.genre_bitset([] if genres == IMDB_NULL else genres.split(','))
+                self._genre_strings[genres] = genre_bits
+        else:
+            genre_bits = self.genre_bitset(genres)
+
+        header = HEADER.pack(FORMAT_VERSION, tconst_number, int(start_year), genre_bits)
+        return header + record['primaryTitle'].encode('utf-8')
+
+    def genre_bitset(self, genres):
+        """
+        @param genres: (list of str) genre names
+        @return: (int)
+        """
+        genre_bits = 0
+        for genre in genres:
+            if genre not in self.genre_bits:
+                raise ValueError(f"Unknown genre '{genre}', add it to the end of GENRES")
+            genre_bits |= self.genre_bits[genre]
+        return genre_bits
+
+    def genre_names(self, genre_bits):
+        """
+        @param genre_bits: (int) bitset from a message
+        @return: (tuple of str)
+        """
+        names = self._genre_names.get(genre_bits)
+        if names is None:
+            names = tuple(genre for genre, bit in self.genre_bits.items() if genre_bits & bit)
+            self._genre_names[genre_bits] = names
+        return names
+
+    def decode_batch(self, values, fields=None):
+        """
+        @param values: (list of bytes) messages
+        @param fields: (list of str) only decode these fields. Default is all of them.
+        @return: (list of dict)
+        """
+        if any(value[0] != FORMAT_VERSION for value in values):
+            raise ValueError(f"Can only decode version {FORMAT_VERSION} messages")
+
+        fields = FIELDS if fields is None else fields
+        columns = [self._decode_field(field, values) for field in fields]
+        if tuple(fields) == FIELDS:
+            return [{'tconst': tconst, 'primaryTitle': title, 'startYear': year, 'genres': genres}
+                    for tconst, title, year, genres in zip(*columns)]
+
+        if len(fields) == 1:
+            field = fields[0]
+            return [{field: value} for value in columns[0]]
+
+        if len(fields) == 2:
+            field, other_field = fields
+            return [{field: value, other_field: other_value}
+                    for value, other_value in zip(*columns)]
+
+        if len(fields) == 3:
+            first, second, third = fields
+            return [{first: first_value, second: second_value, third: third_value}
+                    for first_value, second_value, third_value in zip(*columns)]
+
+        return [dict(zip(fields, row)) for row in zip(*columns)]
+
+    def _decode_field(self, field, values):
+        """
+        @return: (list) the value of `field` in each message
+        """
+        if field == 'primaryTitle':
+            return [value[HEADER.size:].decode('utf-8') for value in values]
+
+        if field not in FIELD_STRUCTS:
+            raise ValueError(f"Unknown field '{field}'")
+
+        field_struct, offset = FIELD_STRUCTS[field]
+        unpack_from = field_struct.unpack_from
+        numbers = [unpack_from(value, offset)[0] for value in values]
+
+        if field == 'tconst':
+            return ['tt%07d' % number for number in numbers]
+
+        if field == 'startYear':
+            return [number or None for number in numbers]
+
+        # genres
+        genre_names = self._genre_names
+        for genre_bits in set(numbers).difference(genre_names):
+            genre_names[genre_bits] = self.genre_names(genre_bits)
+        return [genre_names[genre_bits] for genre_bits in numbers]
+
+
+register_codec(FilmCodec)
@@ -5,39 +5,120 @@ Created on 14 Jan 2020
 '''
 import ayeaye
 
+# registers the kafka-batched:// and tsv-projected:// engine types and the film codec
+import batched_kafka
+import film_codec
+import projected_tsv
+from progress import ProgressReporter
+from published_index import PublishedIndex
+
 DEBUG=True
 
 class Film2Kafka(ayeaye.Model):
     """
-    Extract a few fields from an IMDB data file, encode into JSON and send to Kafka.
+    Extract a few fields from an IMDB data file, encode them and send to Kafka. Films are encoded
+    in the binary layout in :mod:`film_codec`, use `codec=json` in the `output_stream` for JSON.
+
+    Films already in Kafka are only sent again when they have changed, see
+    `published_index_path`.
     """
-    imdb_films = ayeaye.Connect(engine_url="tsv://title.basics.tsv")
-    output_stream = ayeaye.Connect(engine_url="kafka://localhost/topic=imdb-films",
+    # just the fields that are sent to Kafka and only films, i.e. without an end year
+    imdb_films = ayeaye.Connect(engine_url="tsv-projected://title.basics.tsv",
+                                select_fields=['tconst', 'primaryTitle', 'startYear', 'genres'],
+                                where={'endYear': r'\N'},
+                                )
+    # messages are sent in lz4 compressed batches, see :class:`batched_kafka.BatchedKafkaConnector`
+    output_stream = ayeaye.Connect(engine_url="kafka-batched://localhost/topic=imdb-films;"
+                                              "compression=lz4;linger_ms=50;batch_size=1048576;"
+                                              "codec=film",
                                    access=ayeaye.AccessMode.WRITE
                                    )
 
+    # Only send films that are new or have changed since they were last sent, e.g.
+    # "films_published.sqlite". The index of films already sent is kept in this SQLite file,
+    # delete it to send everything again. None to always send every film.
+    published_index_path = None
+
     def build(self):
         
         self.log("Adding films to Kafka")
-        required_fields = ['tconst', 'primaryTitle', 'startYear', 'genres']
-        for film in self.imdb_films:
+        self.add_films(limit=100000 if DEBUG else None)
+        self.log(f"Complete! Added {self.output_stream.stats.added} films.")
 
-            # Filter out anything that isn't a film
-            if film.endYear != r'\N':
-                continue
+    def add_films(self, limit=None):
+        """
+        Send the films in `imdb_films` to `output_stream`. Each message's key is the film's tconst.
+        @param limit: (int) stop after reading this many films
+        """
+        required_fields = self.imdb_films.select_fields
+        tconst_position = required_fields.index('tconst')
+        # occasionally tells the user how complete the processing is
+        progress = ProgressReporter(self.log,
+                                    position=lambda: self.imdb_films.progress,
+                                    bytes_position=lambda: self.imdb_films.bytes_read,
+                                    unit="films",
+                                    )
+        films_sent = 0
+        # the output_stream's stats include any earlier sub-tasks run by this instance
+        delivery_errors = self.output_stream.stats.delivery_errors
+        index = None
+        if self.published_index_path is not None:
+            # the index is emptied when the topic or the fields in each message change
+            source = f"{self.output_stream.engine_url} {','.join(required_fields)}"
+            index = PublishedIndex(self.published_index_path, source=source)
+            index.open()
+            if index.reset:
+                self.log("The index of films sent was for another topic or other fields. Sending "
+                         "every film.", level="WARNING")
 
-            film_j = film.as_json(select_fields=required_fields)
-            self.output_stream.add(film_j)
+        try:
+            for films in self.imdb_films.iter_blocks():
 
-            # occasionally tell the user how complete the processing is
-            msg = f"{self.output_stream.stats.added} films added." 
-            self.log_progress(self.imdb_films.progress, msg=msg)
+                if limit is not None and progress.count + len(films) >= limit:
+                    films = films[:limit - progress.count]
+                films_read = len(films)
 
-            if DEBUG and self.output_stream.stats.added >= 100000:
-                self.log("Debug mode, finishing early.")
-                break
+                unpublished = None
+                if index is not None:
+                    # IMDB's fields don't contain tabs
+                    unpublished = index.unpublished([(film[tconst_position], '\t'.join(film))
+                                                     for film in films])
+                    films = [tuple(fields.split('\t')) for _, fields, _ in unpublished]
 
-        self.log(f"Complete! Added {self.output_stream.stats.added} films.")
+                # anything that isn't a film has already been filtered out by `imdb_films`
+                for film in films:
+                    self.output_stream.add(dict(zip(required_fields, film)),
+                                           key=film[tconst_position])
+                films_sent += len(films)
+
+                if unpublished:
+                    # into the index once they've all been delivered, see below
+                    index.stage(unpublished)
+
+                progress.tick(films_read)
+                if limit is not None and progress.count >= limit:
+                    self.log("Debug mode, finishing early.")
+                    break
+
+            # throughput etc. for whoever is running the model
+            self.progress_metrics = progress.finish()
+            self.log(f"{films_sent} of {progress.count} films were new or had changed.")
+
+            # wait for the last batches to be sent
+            self.output_stream.flush()
+            delivery_errors = self.output_stream.stats.delivery_errors - delivery_errors
+            if delivery_errors:
+                msg = (f"{delivery_errors} films weren't delivered. Last error: "
+                       f"{self.output_stream.stats.last_delivery_error}")
+                self.log(msg, level="ERROR")
+
+            # only films known to be in Kafka go into the index. After a delivery failure any of
+            # them could be missing so they're all sent again next time.
+            if index is not None and not delivery_errors:
+                index.record_staged()
+        finally:
+            if index is not None:
+                index.close()
 
 if __name__ == '__main__':
     a = Film2Kafka()
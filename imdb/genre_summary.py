@@ -4,55 +4,354 @@ Created on 16 Jan 2020
 @author: si
 '''
 from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import json
+import os
 
 import ayeaye
+from ayeaye.connectors import connector_factory
+import numpy
 
+from aggregation import Count, GroupBy
+from checkpoint import Checkpoint, atomic_write_json
 from films_to_kafka import Film2Kafka
+from progress import ProgressReporter
+from seen_films import SeenFilms, tconst_numbers
 
 DEBUG = True
 
+# fields needed from each message
+FILM_FIELDS = ['tconst', 'genres', 'startYear']
+
+
+# (genres, startYear) as they are in a message to the keys for the film. There are only as many
+# as the combinations of genres and years in the topic and most films share one.
+_genre_year_keys = {}
+
+
+def genre_year_keys(genres, year):
+    """
+    @param genres: (str or tuple of str) comma separated string in JSON messages
+    @param year: (str, int or None) string in JSON messages
+    @return: (tuple of (str, int))
+    """
+    # JSON messages have IMDB's fields as strings. Other codecs decode them.
+    if isinstance(genres, str):
+        genres = [] if genres == r'\N' else genres.split(',')
+    if isinstance(year, str):
+        year = None if year == r'\N' else int(year)
+
+    # little bit of mapping - films without any genres
+    return tuple((genre, year) for genre in genres or ['Unknown'])
+
+
+def film_genre_years(film):
+    """
+    Key for :class:`GroupBy`. A film is counted once for each of its genres.
+
+    @param film: (dict) decoded message from Kafka
+    @return: (tuple of (str, int)) genre and year
+    """
+    genres = film['genres']
+    year = film['startYear']
+    keys = _genre_year_keys.get((genres, year))
+    if keys is None:
+        keys = _genre_year_keys[(genres, year)] = genre_year_keys(genres, year)
+    return keys
+
+
+def genre_year_groups():
+    """
+    @return: (:class:`GroupBy`) number of films for each genre and year
+    """
+    return GroupBy(key=film_genre_years, aggregators={'films': Count()})
+
+
+class MissingMessage(Exception):
+    """
+    A film that was counted before has been sent again but the message that was counted isn't in
+    the topic any more, e.g. it was compacted or deleted, so it can't be taken away from the
+    counts.
+    """
+
+
+def count_films(input_stream, seen, partitions=None, start_offsets=None, tick=None):
+    """
+    Count the latest version of each film in the messages from `start_offsets`.
+
+    Every message is counted as it's read. A film that was counted before, or is sent more than
+    once in these messages, is then found in the partitions again and all but its latest message
+    are taken away. This second read only happens when a film has been sent again.
+
+    @param input_stream: (:class:`BatchedKafkaConnector` or :class:`LocalLogConnector`)
+    @param seen: (:class:`SeenFilms`) films counted before `start_offsets`. Not changed.
+    @param partitions: (list of int) only count these partitions. Default is all of them.
+    @param start_offsets: (dict) partition (int) to the first offset (int) to read
+    @param tick: (callable) given the number of messages in each batch
+    @return: (:class:`GroupBy`, :class:`GroupBy`, numpy int array) films to add and take away
+        from the counts and the tconst number of every message read
+    """
+    added = genre_year_groups()
+    numbers = []
+    for films in input_stream.iter_batches(partitions=partitions, start_offsets=start_offsets,
+                                           fields=FILM_FIELDS):
+        added.add_batch(films)
+        numbers.append(tconst_numbers(films))
+        if tick is not None:
+            tick(len(films))
+    numbers = numpy.concatenate(numbers) if numbers else numpy.zeros(0, dtype=numpy.int64)
+
+    replaced = genre_year_groups()
+    repeated, run_counts, seen_before = seen.repeated(numbers)
+    if len(repeated) == 0:
+        return added, replaced, numbers
+
+    # messages are keyed on tconst so all of a film's messages are in one partition, in order
+    film_messages = defaultdict(list)
+    for films in input_stream.iter_batches(partitions=partitions, fields=FILM_FIELDS):
+        batch_numbers = tconst_numbers(films)
+        for position in numpy.flatnonzero(numpy.isin(batch_numbers, repeated)):
+            film_messages[int(batch_numbers[position])].append(films[position])
+
+    for number, run_count, counted_before in zip(repeated.tolist(), run_counts.tolist(),
+                                                  seen_before.tolist()):
+        messages = film_messages[number]
+        # messages in this run were all counted, so was the last one before it
+        counted = run_count + int(counted_before)
+        if len(messages) < counted:
+            raise MissingMessage(f"tt{number:07d}")
+
+        replaced.add_batch(messages[-counted:])
+        added.add(messages[-1])
+
+    return added, replaced, numbers
+
+
+def partition_genre_summary(engine_url, partition, seen_path=None, seen_checkpoint=None,
+                            start_offset=None):
+    """
+    Runs in a worker process. Count the films in each genre and year in one Kafka partition.
+
+    @param engine_url: (str) for a :class:`BatchedKafkaConnector` or :class:`LocalLogConnector`
+    @param partition: (int)
+    @param seen_path: (str) :class:`SeenFilms` file with the films counted before `start_offset`
+    @param seen_checkpoint: (str) the checkpoint `seen_path` was saved for
+    @param start_offset: (int) first offset to read. Default is the start of the partition.
+    @return: (:class:`GroupBy`, :class:`GroupBy`, numpy int array, int) see :func:`count_films`
+        and the offset following the last message read
+    """
+    connector_cls = connector_factory(engine_url)
+    input_stream = connector_cls(engine_url=engine_url, access=ayeaye.AccessMode.READ)
+    start_offsets = {partition: start_offset} if start_offset is not None else None
+    seen = None
+    if seen_path is not None:
+        seen = SeenFilms.load(seen_path, seen_checkpoint)
+    added, replaced, numbers = count_films(input_stream, seen or SeenFilms(),
+                                           partitions=[partition],
+                                           start_offsets=start_offsets,
+                                           )
+
+    # this process's connection might have seen more messages than the parent model's
+    next_offset = input_stream.next_offsets()[partition]
+    input_stream.close_connection()
+    return added, replaced, numbers, next_offset
+
+
+def offsets_checkpoint(offsets):
+    """
+    @param offsets: (dict) partition (int or str) to offset
+    @return: (str) identifies the checkpoint with these offsets, see :meth:`SeenFilms.save`
+    """
+    return json.dumps({str(p): offset for p, offset in offsets.items()}, sort_keys=True)
+
 
 class FilmGenresSummary(ayeaye.Model):
     """
-    Read the extract of IMDB film data from Kafka and count number of films within each genre.
-    Output the summary to a JSON document.
+    Read the extract of IMDB film data from Kafka and count number of films within each genre,
+    and within each genre for each year. Output the summaries to JSON documents.
+
+    Messages are read and decoded in batches. The counts for each Kafka partition can be made
+    in separate processes, see `consumer_workers`.
+
+    A film that is sent again, e.g. because IMDB changed its genres, is only counted once with
+    its latest genres and year. The films counted are kept in a bitmap, see `seen_films_path`
+    and :func:`count_films`.
+
+    The counts are kept in a checkpoint with the offset reached in each partition. The next run
+    only reads messages added to the topic since, see `incremental`.
     """
 
     input_stream = Film2Kafka.output_stream.clone(access=ayeaye.AccessMode.READ)
     genre_summary = ayeaye.Connect(engine_url="json://films_summary.json",
                                    access=ayeaye.AccessMode.WRITE
                                    )
+    # year to genre to number of films. Films without a year are under "Unknown".
+    genre_year_summary = ayeaye.Connect(engine_url="json://films_by_year_summary.json",
+                                        access=ayeaye.AccessMode.WRITE
+                                        )
+
+    # More than 1 to read each of the topic's partitions in a pool of this many processes
+    consumer_workers = 1
+
+    # Only read messages added since the last run and add them to the counts from the checkpoint.
+    # False to count the whole topic again.
+    incremental = True
+
+    # Counts and Kafka offsets from the last run. Default is next to `genre_summary`.
+    checkpoint_path = None
+
+    # The films counted, see :class:`SeenFilms`. Default is next to `genre_summary`.
+    seen_films_path = None
 
     def build(self):
 
         self.log("Building a summary of films in the Kafka store")
-        genre_summary = defaultdict(int)
-        films_processed = 0
-        for film in self.input_stream:
+        checkpoint = Checkpoint(self.checkpoint_path or self.default_state_path('.checkpoint.json'),
+                                source=self.input_stream.engine_url,
+                                )
+        seen_path = self.seen_films_path or self.default_state_path('.seen.npz')
+        self.summarise(checkpoint, seen_path, incremental=self.incremental)
+
+    def summarise(self, checkpoint, seen_path, incremental):
+        """
+        Count the films, write the summaries and update the checkpoint.
+
+        @param checkpoint: (:class:`Checkpoint`)
+        @param seen_path: (str) :class:`SeenFilms` file
+        @param incremental: (bool) see `incremental`
+        """
+        state = checkpoint.load() if incremental else None
+        next_offsets = self.input_stream.next_offsets()
 
-            # the 'genres field wasn't broken down into a list. Extract that here.
-            for genre in film.genres.split(','):
+        if state is not None and 'genre_year_counts' not in state:
+            self.log("The checkpoint doesn't have counts for each year. Counting all of the topic.",
+                     level="WARNING"
+                     )
+            state = None
 
-                # little bit of mapping - Null to word
-                if genre == r'\N':
-                    genre = 'Unknown'
+        seen = None
+        seen_checkpoint = None
+        if state is not None:
+            seen_checkpoint = offsets_checkpoint(state['offsets'])
+            seen = SeenFilms.load(seen_path, seen_checkpoint)
+            if seen is None:
+                self.log("The films counted don't match the checkpoint. Counting all of the topic.",
+                         level="WARNING"
+                         )
+                state = None
 
-                genre_summary[genre] += 1
+        start_offsets = None
+        # (genre, year) to number of films
+        genre_year_counts = defaultdict(int)
+        films_total = 0
+        if state is not None:
+            start_offsets = {int(p): offset for p, offset in state['offsets'].items()}
+            if any(offset > next_offsets.get(p, 0) for p, offset in start_offsets.items()):
+                self.log("The topic has fewer messages than the checkpoint. Counting all of it.",
+                         level="WARNING"
+                         )
+                start_offsets = None
+            else:
+                for genre, year, film_count in state['genre_year_counts']:
+                    genre_year_counts[(genre, year)] = film_count
+                films_total = state['films_processed']
+                self.log(f"Continuing from the checkpoint of {films_total} films")
 
-            films_processed += 1
+        if start_offsets is None:
+            seen = SeenFilms()
+            seen_checkpoint = None
 
-            # occasionally tell the user how complete the processing is
-            msg = f"{films_processed} films processes."
-            self.log_progress(self.input_stream.progress, msg=msg)
+        # occasionally tells the user how complete the processing is
+        progress = ProgressReporter(self.log, position=lambda: self.input_stream.progress,
+                                    unit="films"
+                                    )
+        added = genre_year_groups()
+        replaced = genre_year_groups()
+        try:
+            if self.consumer_workers > 1:
+                partitions = self.input_stream.partitions()
+                self.log(f"Reading {len(partitions)} partitions in {self.consumer_workers} "
+                         "processes")
+                with ProcessPoolExecutor(max_workers=self.consumer_workers) as pool:
+                    futures = {pool.submit(partition_genre_summary,
+                                           self.input_stream.engine_url,
+                                           p,
+                                           seen_path if seen_checkpoint else None,
+                                           seen_checkpoint,
+                                           (start_offsets or {}).get(p),
+                                           ): p
+                               for p in partitions}
+                    for future in as_completed(futures):
+                        partition_added, partition_replaced, numbers, next_offset = future.result()
+                        added.merge(partition_added)
+                        replaced.merge(partition_replaced)
+                        seen.add(numbers)
+                        next_offsets[futures[future]] = next_offset
+                        progress.tick(len(numbers))
+            else:
+                added, replaced, numbers = count_films(self.input_stream, seen,
+                                                       start_offsets=start_offsets,
+                                                       tick=progress.tick,
+                                                       )
+                seen.add(numbers)
+
+        except MissingMessage as e:
+            if start_offsets is None:
+                raise
+
+            self.log(f"{e} was sent again but the message counted for it isn't in the topic. "
+                     "Counting all of the topic.", level="WARNING"
+                     )
+            added.close()
+            replaced.close()
+            return self.summarise(checkpoint, seen_path, incremental=False)
+
+        for genre_year, results in added.results():
+            genre_year_counts[genre_year] += results['films']
+        for genre_year, results in replaced.results():
+            genre_year_counts[genre_year] -= results['films']
+        added.close()
+        replaced.close()
+        films_total += progress.count
+
+        genre_summary = defaultdict(int)
+        genre_year_summary = defaultdict(dict)
+        # years in order then genres, films without a year last
+        in_order = sorted(((genre_year, film_count)
+                           for genre_year, film_count in genre_year_counts.items() if film_count),
+                          key=lambda item: (item[0][1] is None, item[0][1] or 0, item[0][0]))
+        for (genre, year), film_count in in_order:
+            genre_summary[genre] += film_count
+            genre_year_summary["Unknown" if year is None else str(year)][genre] = film_count
 
         # Output log of the summary ...
         for genre_name, film_count in genre_summary.items():
             self.log(f"{genre_name} : {film_count} films")
 
-        # ... and output the summary as a dataset
-        self.genre_summary.data = genre_summary
-        self.log(f"Summary written to {self.genre_summary.engine_url}")
-        self.log(f"Complete! Processed {films_processed} films.")
+        # ... and output the summaries as datasets. Readers never see them half written.
+        atomic_write_json(self.genre_summary.file_path, genre_summary)
+        atomic_write_json(self.genre_year_summary.file_path, genre_year_summary)
+        self.log(f"Summaries written to {self.genre_summary.engine_url} and "
+                 f"{self.genre_year_summary.engine_url}")
+
+        # after the summaries so a failure in between only means counting the films again
+        seen.save(seen_path, offsets_checkpoint(next_offsets))
+        checkpoint.save({'offsets': next_offsets,
+                         'genre_year_counts': [[genre, year, film_count]
+                                               for (genre, year), film_count in in_order],
+                         'films_processed': films_total,
+                         })
+        self.progress_metrics = progress.finish()
+        self.log(f"Complete! Processed {progress.count} new messages, {films_total} in total, "
+                 f"for {len(seen)} films.")
+
+    def default_state_path(self, suffix):
+        """
+        @param suffix: (str) e.g. '.checkpoint.json'
+        @return: (str) `genre_summary`'s file with `suffix` instead of its extension
+        """
+        base, _ = os.path.splitext(self.genre_summary.file_path)
+        return f"{base}{suffix}"
 
 
 if __name__ == '__main__':
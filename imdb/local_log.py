@@ -0,0 +1,371 @@
+'''
+A stand-in for a Kafka topic that is a directory on the local disk.
+
+The recipe's models can be run, tested and benchmarked without a broker by using a
+`kafka-local://` engine_url in place of their `kafka-batched://` one. Each partition is an
+append only log split into segments, messages have offsets and the connector has the same
+`add`, `flush`, `iter_batches`, `partitions`, `next_offsets` and `progress` as
+:class:`batched_kafka.BatchedKafkaConnector`.
+
+The files in the topic's directory-
+
+    topic.json                          number of partitions
+    <partition>/end.json                next offset and the size of the last segment
+    <partition>/<first offset>.log      a segment, each message is a header (key length, value
+                                        length) followed by the key and value
+
+Only messages before the offset in `end.json` exist. A write that didn't finish is
+overwritten by the next one. More than one process can write to a topic at the same time.
+'''
+import fcntl
+import json
+import os
+import struct
+import zlib
+
+import ayeaye
+from ayeaye.connectors.base import AccessMode, DataConnector
+
+from batched_kafka import JsonCodec, codecs
+from checkpoint import atomic_write_json
+
+# key length and value length
+MESSAGE_HEADER = struct.Struct('<II')
+
+
+class LocalLogConnector(DataConnector):
+    engine_type = 'kafka-local://'
+
+    # start a new segment once the last one is this many bytes
+    segment_bytes = 64 * 1024 * 1024
+
+    # messages are buffered for each partition and appended when this many bytes are waiting
+    buffer_bytes = 1024 * 1024
+
+    # most messages in each list yielded by :meth:`iter_batches`
+    max_poll_records = 10000
+
+    def __init__(self, *args, **kwargs):
+        """
+        Messages are written to and read from files in a directory.
+
+        For args: @see :class:`connectors.base.DataConnector`
+
+        Connection information-
+            engine_url format is
+            kafka-local://<directory>/topic=<topic>;[partitions=<int>;][codec=<name>;]
+        e.g. kafka-local:///data/imdb-log/topic=imdb-films;partitions=3;codec=film
+
+        `partitions` is only used when the topic is created by the first write. Other params
+        for `kafka-batched://`, e.g. compression, are ignored so the rest of an engine_url can be
+        kept when switching to this connector.
+        """
+        super().__init__(*args, **kwargs)
+        self.stats = ayeaye.Pinnate({'added': 0,
+                                     'delivered': 0,
+                                     'delivery_errors': 0,
+                                     'last_delivery_error': None,
+                                     })
+        self._reset()
+
+    def _reset(self):
+        self.topic = self.topic_directory = None
+        self.params = None
+        self.partition_count = None
+        self._codec = None
+
+        # used during write
+        self._buffers = None
+        self._buffer_counts = None
+        self._lock_files = {}
+        self._next_partition = 0
+
+        # used during read. partition to next offset when the dataset was connected
+        self._end_offsets = None
+        self.approx_position = None
+        self.items_to_fetch = None
+
+    def _decode_engine_url(self):
+        """
+        @return: (str, str, dict) directory, topic and the other params
+        """
+        s_url = self.engine_url[len(self.__class__.engine_type):]
+        location, *param_sections = s_url.split(';')
+        directory, topic_param = location.rsplit('/', 1)
+        if not topic_param.startswith('topic='):
+            raise ValueError(f"Topic missing from engine_url: {self.engine_url}")
+
+        params = {}
+        for param_section in param_sections:
+            if '=' in param_section:
+                k, v = param_section.split('=', 1)
+                params[k] = v
+
+        return directory, topic_param[len('topic='):], params
+
+    @property
+    def codec(self):
+        """
+        @return: (obj) encodes and decodes messages, see :class:`batched_kafka.JsonCodec`
+        """
+        if self._codec is None:
+            self.connect()
+            codec_name = self.params.get('codec', JsonCodec.name)
+            if codec_name not in codecs:
+                raise ValueError(f"Unknown codec '{codec_name}'. Known codecs are: "
+                                 f"{', '.join(sorted(codecs))}")
+            self._codec = codecs[codec_name]()
+        return self._codec
+
+    def _partition_directory(self, partition):
+        return os.path.join(self.topic_directory, str(partition))
+
+    def connect(self):
+        super().connect()
+        if self.topic_directory is not None:
+            return
+
+        directory, self.topic, self.params = self._decode_engine_url()
+        self.topic_directory = os.path.join(directory, self.topic)
+        topic_file = os.path.join(self.topic_directory, 'topic.json')
+
+        if self.access == AccessMode.WRITE and not os.path.exists(topic_file):
+            partition_count = int(self.params.get('partitions', 1))
+            for partition in range(partition_count):
+                os.makedirs(self._partition_directory(partition), exist_ok=True)
+            atomic_write_json(topic_file, {'partitions': partition_count})
+
+        if not os.path.exists(topic_file):
+            raise ValueError(f"Topic {self.topic} doesn't exist in {directory}")
+
+        with open(topic_file) as f:
+            self.partition_count = json.load(f)['partitions']
+
+        if self.access == AccessMode.WRITE:
+            self._buffers = {p: bytearray() for p in range(self.partition_count)}
+            self._buffer_counts = {p: 0 for p in range(self.partition_count)}
+
+        elif self.access == AccessMode.READ:
+            self._end_offsets = {p: self._read_end(p)['next_offset']
+                                 for p in range(self.partition_count)}
+
+    def close_connection(self):
+        super().close_connection()
+        if self.access == AccessMode.WRITE and self._buffers is not None:
+            self.flush()
+
+        for lock_file in self._lock_files.values():
+            lock_file.close()
+
+        self._reset()
+
+    def _read_end(self, partition):
+        """
+        @return: (dict) next_offset, segment (first offset in the last segment) and segment_bytes
+        """
+        end_file = os.path.join(self._partition_directory(partition), 'end.json')
+        if not os.path.exists(end_file):
+            return {'next_offset': 0, 'segment': 0, 'segment_bytes': 0}
+
+        with open(end_file) as f:
+            return json.load(f)
+
+    def _segment_path(self, partition, first_offset):
+        return os.path.join(self._partition_directory(partition), f"{first_offset:020d}.log")
+
+    def partitions(self):
+        """
+        @return: (list of int) partitions in the topic
+        """
+        self.connect()
+        return list(range(self.partition_count))
+
+    def next_offsets(self):
+        """
+        Offsets following the last message each partition had when the dataset was connected.
+
+        @return: (dict) partition (int) to offset (int)
+        """
+        self.connect()
+        if self._end_offsets is None:
+            return {p: self._read_end(p)['next_offset'] for p in range(self.partition_count)}
+        return dict(self._end_offsets)
+
+    def add(self, data, partition=None, key=None):
+        """
+        Append a message to the topic.
+        @param data: (str or bytes) written as it is or anything else is encoded by the codec
+        @param partition: (int) default is chosen from the key or in turn when there isn't one
+        @param key: (str or bytes) optional message key
+        """
+        if self.access != AccessMode.WRITE:
+            raise ValueError("Write attempted on dataset opened in READ mode.")
+
+        self.connect()
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        elif not isinstance(data, bytes):
+            data = self.codec.encode(data)
+
+        if key is None:
+            key = b''
+        elif isinstance(key, str):
+            key = key.encode('utf-8')
+
+        if partition is None:
+            if key:
+                partition = zlib.crc32(key) % self.partition_count
+            else:
+                partition = self._next_partition
+                self._next_partition = (partition + 1) % self.partition_count
+
+        buffer = self._buffers[partition]
+        buffer += MESSAGE_HEADER.pack(len(key), len(data))
+        buffer += key
+        buffer += data
+        self._buffer_counts[partition] += 1
+        self.stats.added += 1
+
+        if len(buffer) >= self.buffer_bytes:
+            self._append(partition)
+
+    def flush(self):
+        """
+        Write all the buffered messages.
+        """
+        if self.access != AccessMode.WRITE:
+            raise ValueError("Flush attempted on dataset opened in READ mode.")
+
+        if self._buffers is None:
+            return
+
+        for partition, buffer in self._buffers.items():
+            if buffer:
+                self._append(partition)
+
+    def _lock(self, partition):
+        if partition not in self._lock_files:
+            lock_path = os.path.join(self._partition_directory(partition), '.lock')
+            self._lock_files[partition] = open(lock_path, 'a')
+        return self._lock_files[partition]
+
+    def _append(self, partition):
+        """
+        Append the partition's buffered messages to its last segment.
+        """
+        buffer = self._buffers[partition]
+        message_count = self._buffer_counts[partition]
+
+        lock_file = self._lock(partition)
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            end = self._read_end(partition)
+            if end['segment_bytes'] >= self.segment_bytes:
+                end['segment'] = end['next_offset']
+                end['segment_bytes'] = 0
+
+            segment_path = self._segment_path(partition, end['segment'])
+            with open(segment_path, 'r+b' if os.path.exists(segment_path) else 'wb') as f:
+                # anything after the end is from a write that didn't finish
+                f.truncate(end['segment_bytes'])
+                f.seek(end['segment_bytes'])
+                f.write(buffer)
+
+            end['next_offset'] += message_count
+            end['segment_bytes'] += len(buffer)
+            atomic_write_json(os.path.join(self._partition_directory(partition), 'end.json'), end)
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+        self.stats.delivered += message_count
+        self._buffers[partition] = bytearray()
+        self._buffer_counts[partition] = 0
+
+    def _segments(self, partition):
+        """
+        @return: (list of int) first offset of each segment in the partition, in order
+        """
+        return sorted(int(name[:-len('.log')])
+                      for name in os.listdir(self._partition_directory(partition))
+                      if name.endswith('.log'))
+
+    def _partition_values(self, partition, start_offset, end_offset):
+        """
+        Generator yielding lists of up to `max_poll_records` messages, not decoded, with offsets
+        from `start_offset` up to but not including `end_offset`.
+        """
+        segments = self._segments(partition)
+        for first_offset, next_segment in zip(segments, segments[1:] + [None]):
+            if next_segment is not None and next_segment <= start_offset:
+                continue
+            if first_offset >= end_offset:
+                break
+
+            with open(self._segment_path(partition, first_offset), 'rb') as f:
+                segment = f.read()
+
+            unpack_from = MESSAGE_HEADER.unpack_from
+            header_size = MESSAGE_HEADER.size
+            offset = first_offset
+            position = 0
+            last_offset = end_offset if next_segment is None else min(next_segment, end_offset)
+            values = []
+            while offset < last_offset:
+                key_length, value_length = unpack_from(segment, position)
+                position += header_size + key_length
+                if offset >= start_offset:
+                    values.append(segment[position:position + value_length])
+                    if len(values) >= self.max_poll_records:
+                        yield values
+                        values = []
+                position += value_length
+                offset += 1
+
+            if values:
+                yield values
+
+    def iter_batches(self, partitions=None, start_offsets=None, fields=None):
+        """
+        Generator yielding a list of messages at a time, each decoded by the codec.
+
+        @param partitions: (list of int) only read these partitions. Default is all of them.
+        @param start_offsets: (dict) partition (int) to the first offset (int) to read
+        @param fields: (list of str) fields needed from each message. The codec might not decode
+            the others. Default is all of them.
+        """
+        if self.access != AccessMode.READ:
+            raise ValueError("Read attempted on dataset opened in WRITE mode.")
+
+        self.connect()
+        ranges = []
+        for partition, end_offset in self._end_offsets.items():
+            start_offset = (start_offsets or {}).get(partition, 0)
+            if (partitions is None or partition in partitions) and end_offset > start_offset:
+                ranges.append((partition, start_offset, end_offset))
+
+        self.approx_position = 0
+        self.items_to_fetch = sum(end - start for _, start, end in ranges)
+
+        decode_batch = self.codec.decode_batch
+        for partition, start_offset, end_offset in ranges:
+            for values in self._partition_values(partition, start_offset, end_offset):
+                self.approx_position += len(values)
+                yield decode_batch(values, fields=fields)
+
+    @property
+    def data(self):
+        """
+        Generator yielding each message decoded by the codec.
+        """
+        for messages in self.iter_batches():
+            yield from messages
+
+    @property
+    def progress(self):
+        if self.access != AccessMode.READ or not self.items_to_fetch:
+            return None
+
+        return self.approx_position / self.items_to_fetch
+
+
+ayeaye.connector_registry.register_connector(LocalLogConnector)
@@ -0,0 +1,76 @@
+'''
+Same as :class:`Film2Kafka` but the IMDB file is split into ranges of bytes that are processed
+in parallel.
+'''
+import ayeaye
+
+from films_to_kafka import Film2Kafka
+
+
+class PartitionedFilm2Kafka(Film2Kafka, ayeaye.PartitionedModel):
+    """
+    Each sub-task reads the lines starting in one range of bytes of `imdb_films` and sends those
+    films to Kafka with its own producer. Sub-tasks can run in local processes or across a Fossa
+    cluster, so long as every worker can read the IMDB file.
+
+    The whole file is always processed, `DEBUG` only applies to :class:`Film2Kafka`.
+    """
+
+    def build(self):
+        # The sub-tasks do all the work. Their results are collated here.
+        self.shards_complete = 0
+        self.films_added = 0
+        self.delivery_errors = 0
+        self.bytes_processed = 0
+        self.bytes_total = None
+        # throughput of each shard, see :meth:`ProgressReporter.metrics`
+        self.shard_metrics = []
+
+    def partition_slice(self, partition_count):
+        byte_ranges = self.imdb_films.byte_ranges(partition_count)
+        self.bytes_total = sum(end - start for start, end in byte_ranges)
+        self.log(f"Splitting into {len(byte_ranges)} byte ranges")
+        return [("films_in_byte_range", {"start": start, "end": end})
+                for start, end in byte_ranges]
+
+    def films_in_byte_range(self, start, end):
+        """
+        Sub-task. Send the films starting between `start` and `end` bytes into the file to Kafka.
+
+        @return: (dict) counts for the parent model
+        """
+        # a worker's model instance can run more than one sub-task and the stats are cumulative
+        added = self.output_stream.stats.added
+        delivery_errors = self.output_stream.stats.delivery_errors
+
+        self.imdb_films.byte_range = (start, end)
+        self.add_films()
+        self.output_stream.close_connection()
+        return {"added": self.output_stream.stats.added - added,
+                "delivery_errors": self.output_stream.stats.delivery_errors - delivery_errors,
+                "bytes": end - start,
+                "metrics": self.progress_metrics,
+                }
+
+    def partition_subtask_complete(self, task_message):
+        shard = task_message.return_value
+        self.shards_complete += 1
+        self.films_added += shard["added"]
+        self.delivery_errors += shard["delivery_errors"]
+        self.bytes_processed += shard["bytes"]
+        self.shard_metrics.append(shard["metrics"])
+
+        if self.bytes_total:
+            msg = f"{self.shards_complete} shards complete. {self.films_added} films added."
+            self.log_progress(self.bytes_processed / self.bytes_total, msg=msg)
+
+    def partition_complete(self):
+        if self.delivery_errors:
+            self.log(f"{self.delivery_errors} films weren't delivered.", level="ERROR")
+
+        self.log(f"Complete! Added {self.films_added} films.")
+
+
+if __name__ == '__main__':
+    a = PartitionedFilm2Kafka()
+    a.go()
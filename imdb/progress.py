@@ -0,0 +1,112 @@
+'''
+Cheap progress reporting for loops over millions of records.
+
+Building a log message and reading a dataset's `progress` for every record costs more than
+some of the loops' actual work. A :class:`ProgressReporter` only counts records as they go past
+and looks at the clock every `check_every` records.
+'''
+from time import time
+
+
+class ProgressReporter:
+    """
+    e.g.
+    >>> progress = ProgressReporter(self.log, position=lambda: self.imdb_films.progress)
+    >>> for film in self.imdb_films:
+    >>>     ...
+    >>>     progress.tick()
+    >>> progress.finish()
+    """
+
+    def __init__(self, log, position=None, bytes_position=None, unit='records',
+                 interval=20, every=None, check_every=10000):
+        """
+        @param log: (callable) given a message and log level. e.g. :meth:`ayeaye.Model.log`
+        @param position: (callable) returns the fraction (0.0 to 1.0) of the work done or None
+            when it isn't known. Used for the ETA.
+        @param bytes_position: (callable) returns the bytes read so far. Used for MB/s.
+        @param unit: (str) what is being counted, for the log messages
+        @param interval: (int or None) seconds between log messages
+        @param every: (int or None) log a message every this many records
+        @param check_every: (int) records between looking at the clock
+        """
+        self.log = log
+        self.position = position
+        self.bytes_position = bytes_position
+        self.unit = unit
+        self.interval = interval
+        self.every = every
+        self.check_every = every if every is not None else check_every
+
+        self.count = 0
+        self.started = time()
+        self.last_report = self.started
+        self._next_check = self.check_every
+
+    def tick(self, items=1):
+        """
+        Count records done. Cheap enough to call for every record.
+        """
+        self.count += items
+        if self.count >= self._next_check:
+            self._check()
+
+    def _check(self):
+        self._next_check = self.count + self.check_every
+        now = time()
+        if (self.every is not None
+                or (self.interval is not None and now - self.last_report >= self.interval)):
+            self.last_report = now
+            self.log(self.message(), level="PROGRESS")
+
+    def metrics(self):
+        """
+        @return: (dict) count, seconds, per_second, megabytes_per_second, progress and
+            eta_seconds. Anything that isn't known is None.
+        """
+        seconds = time() - self.started
+        progress = self.position() if self.position is not None else None
+        bytes_read = self.bytes_position() if self.bytes_position is not None else None
+
+        per_second = megabytes_per_second = eta_seconds = None
+        if seconds > 0:
+            per_second = self.count / seconds
+            if bytes_read is not None:
+                megabytes_per_second = bytes_read / seconds / (1024 * 1024)
+
+        if progress:
+            eta_seconds = seconds / progress - seconds
+
+        return {'count': self.count,
+                'seconds': seconds,
+                'per_second': per_second,
+                'megabytes_per_second': megabytes_per_second,
+                'progress': progress,
+                'eta_seconds': eta_seconds,
+                }
+
+    def message(self, eta=True):
+        """
+        @param eta: (bool) include the time remaining
+        @return: (str) for the log
+        """
+        m = self.metrics()
+        msg = f"{m['count']} {self.unit}"
+        if m['per_second'] is not None:
+            msg += f", {m['per_second']:.0f} {self.unit}/s"
+        if m['megabytes_per_second'] is not None:
+            msg += f", {m['megabytes_per_second']:.1f} MB/s"
+        if m['progress'] is not None:
+            msg += f", {m['progress'] * 100:.2f}%"
+        if eta and m['eta_seconds'] is not None:
+            msg += f", {m['eta_seconds']:.0f} seconds remaining"
+        return msg + "."
+
+    def finish(self):
+        """
+        Log the final totals.
+        @return: (dict) see :meth:`metrics`
+        """
+        metrics = self.metrics()
+        self.log(f"Finished. {self.message(eta=False)}")
+        return metrics
@@ -0,0 +1,246 @@
+'''
+Read just the columns and rows that are needed from a large tab separated file.
+
+The `tsv://` connector builds a dictionary and a :class:`Pinnate` for every row with every
+field. Most models only need a few fields from some of the rows. This connector reads the file
+in large blocks and yields a tuple of just the selected fields for rows that pass the filter.
+
+Blocks are parsed and filtered by pyarrow's CSV reader when pyarrow is installed. Otherwise
+each block is split into rows and fields with the string methods, which are implemented in C.
+'''
+import operator
+
+try:
+    import pyarrow
+    import pyarrow.compute
+    import pyarrow.csv
+except ImportError:
+    pyarrow = None
+
+import ayeaye
+from ayeaye.connectors.base import DataConnector, FileBasedConnector
+
+
+class ProjectedTsvConnector(FileBasedConnector):
+    engine_type = 'tsv-projected://'
+    optional_args = {**FileBasedConnector.optional_args,
+                     'encoding': 'utf-8',
+                     'select_fields': None,
+                     'where': None,
+                     'byte_range': None,
+                     }
+
+    # bytes read from the file at a time
+    block_size = 16 * 1024 * 1024
+
+    def __init__(self, *args, **kwargs):
+        """
+        Tab separated values without any quoting, e.g. the IMDB datasets. The first line is the
+        field names.
+
+        For args: @see :class:`connectors.base.FileBasedConnector`
+
+        additional args for ProjectedTsvConnector
+            select_fields (list of str) - fields in each tuple yielded. Default is all of them.
+            where (dict) - field name to value. Only rows with these exact values are yielded.
+            byte_range (tuple) - (start, end) only read lines starting in this range of bytes.
+                See :meth:`byte_ranges`.
+
+        e.g.
+        films = ayeaye.Connect(engine_url="tsv-projected://title.basics.tsv",
+                               select_fields=['tconst', 'primaryTitle'],
+                               where={'titleType': 'movie'},
+                               )
+        for tconst, title in films:
+            ...
+
+        Connection information-
+            engine_url format is tsv-projected://<filesystem absolute path>[;encoding=<encoding>]
+        """
+        self._reset()
+        super().__init__(*args, **kwargs)
+
+    def _reset(self):
+        FileBasedConnector._reset(self)
+        self.approx_position = 0
+
+    def connect(self):
+        # the file is opened for each pass through it by :meth:`iter_blocks`
+        DataConnector.connect(self)
+
+    @property
+    def field_names(self):
+        """
+        @return: (list of str) all the fields in the file
+        """
+        with open(self.file_path, 'rb') as f:
+            return self._split_header(f.readline())
+
+    def _split_header(self, header):
+        return header.decode(self.encoding).rstrip('\r\n').split('\t')
+
+    def _check_fields(self, field_names):
+        missing = set(self.select_fields or []).union(self.where or {}) - set(field_names)
+        if missing:
+            raise ValueError(f"Fields not in {self.file_path}: {', '.join(sorted(missing))}")
+
+    def byte_ranges(self, count):
+        """
+        Split the file into ranges of bytes that can be read independently, e.g. by separate
+        processes. Every line starts in exactly one range.
+
+        @param count: (int) number of ranges
+        @return: (list of (int, int)) (start, end) for the `byte_range` arg
+        """
+        with open(self.file_path, 'rb') as f:
+            header_size = len(f.readline())
+
+        file_size = self._get_file_size()
+        shard_size = max(1, (file_size - header_size) // count)
+        starts = [header_size + i * shard_size for i in range(count)]
+        return [(start, end) for start, end in zip(starts, starts[1:] + [file_size]) if start < end]
+
+    def _line_blocks(self, f, start, end):
+        """
+        Generator yielding blocks of whole lines for the lines starting between `start` and `end`.
+        """
+        if start > 0:
+            # the rest of any line that started before the range belongs to the previous range
+            f.seek(start - 1)
+            f.readline()
+
+        self.approx_position = f.tell()
+        remainder = b''
+        while True:
+            read_size = self.block_size if end is None else min(self.block_size, end - f.tell())
+            block = f.read(read_size) if read_size > 0 else b''
+            if not block:
+                break
+
+            # only whole lines, the rest is added to the start of the next block
+            block = remainder + block
+            end_of_line = block.rfind(b'\n') + 1
+            remainder = block[end_of_line:]
+            self.approx_position = f.tell() - len(remainder)
+            if end_of_line:
+                yield block[:end_of_line]
+
+        if remainder:
+            # the last line started inside the range
+            if end is not None:
+                remainder += f.readline()
+            self.approx_position = f.tell()
+            yield remainder
+
+    def iter_blocks(self):
+        """
+        Generator yielding a list of tuples for each block of the file.
+        """
+        self.approx_position = 0
+        with open(self.file_path, 'rb') as f:
+            header = f.readline()
+            field_names = self._split_header(header)
+            if pyarrow is None:
+                parse = self._row_parser(field_names)
+            else:
+                parse = self._pyarrow_parser(field_names)
+
+            start, end = self.byte_range or (0, None)
+            for block in self._line_blocks(f, max(start, len(header)), end):
+                yield parse(block)
+
+    def _row_parser(self, field_names):
+        """
+        @return: (callable) given a block of whole lines, returns a list of tuples of the
+            selected fields for the rows passing the filter
+        """
+        self._check_fields(field_names)
+        select_fields = self.select_fields or field_names
+        positions = [field_names.index(f) for f in select_fields]
+        if len(positions) == 1:
+            position = positions[0]
+            select = lambda fields: (fields[position],)
+        else:
+            select = operator.itemgetter(*positions)
+
+        conditions = [(field_names.index(f), v) for f, v in (self.where or {}).items()]
+
+        def parse(block):
+            # not splitlines(), titles can contain characters it treats as line breaks
+            lines = block.decode(self.encoding).split('\n')
+            if lines and lines[-1] == '':
+                lines.pop()
+            rows = [line.rstrip('\r').split('\t') for line in lines]
+            for position, value in conditions:
+                rows = [fields for fields in rows if fields[position] == value]
+            return list(map(select, rows))
+
+        return parse
+
+    def _pyarrow_parser(self, field_names):
+        """
+        Same as :meth:`_row_parser` but parsed and filtered by pyarrow.
+        """
+        self._check_fields(field_names)
+        # pyarrow ends a row at a '\r' on its own, which can be in a title
+        row_parse = self._row_parser(field_names)
+        select_fields = self.select_fields or field_names
+        where = self.where or {}
+        columns = list(dict.fromkeys(list(select_fields) + list(where)))
+
+        read_options = pyarrow.csv.ReadOptions(column_names=field_names, encoding=self.encoding)
+        parse_options = pyarrow.csv.ParseOptions(delimiter='\t', quote_char=False)
+        convert_options = pyarrow.csv.ConvertOptions(
+            include_columns=columns,
+            column_types={c: pyarrow.string() for c in columns},
+            strings_can_be_null=False,
+        )
+
+        def parse(block):
+            if block.count(b'\r') != block.count(b'\r\n'):
+                return row_parse(block)
+
+            table = pyarrow.csv.read_csv(pyarrow.BufferReader(block),
+                                         read_options=read_options,
+                                         parse_options=parse_options,
+                                         convert_options=convert_options,
+                                         )
+            for field_name, value in where.items():
+                table = table.filter(pyarrow.compute.equal(table.column(field_name), value))
+            return list(zip(*[table.column(c).to_pylist() for c in select_fields]))
+
+        return parse
+
+    def __iter__(self):
+        """
+        Generator yielding a tuple of the `select_fields` for each row passing the `where` filter.
+        """
+        for rows in self.iter_blocks():
+            yield from rows
+
+    @property
+    def data(self):
+        return [row for row in self]
+
+    @property
+    def bytes_read(self):
+        """
+        @return: (int) bytes of `byte_range`, or the whole file, read so far
+        """
+        start, _ = self.byte_range or (0, None)
+        return max(0, self.approx_position - start)
+
+    @property
+    def progress(self):
+        if self.file_size is None:
+            self.file_size = self._get_file_size()
+
+        start, end = self.byte_range or (0, self.file_size)
+        if end <= start:
+            return None
+
+        # the last line in the range can finish after its end
+        return min(1.0, max(0, self.approx_position - start) / (end - start))
+
+
+ayeaye.connector_registry.register_connector(ProjectedTsvConnector)
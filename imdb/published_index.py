@@ -0,0 +1,137 @@
+'''
+Remember which messages have already been sent so re-running an ingest only sends what is new
+or has changed.
+'''
+import hashlib
+import sqlite3
+
+
+class PublishedIndex:
+    """
+    A SQLite file with a short digest of the last message published for each key.
+
+    Messages are usually sent asynchronously, so what has been sent is kept with :meth:`stage`
+    until the producer has been flushed and then moved into the index by :meth:`record_staged`.
+    Staged messages are only seen by this connection and are forgotten when it's closed.
+
+    e.g.
+    >>> with PublishedIndex('films_published.sqlite', source=engine_url) as index:
+    >>>     for block in blocks:
+    >>>         unpublished = index.unpublished([(film_id, film_fields), ...])
+    >>>         ... send them ...
+    >>>         index.stage(unpublished)
+    >>>     ... flush the producer, if everything was delivered ...
+    >>>     index.record_staged()
+    """
+
+    # bytes of blake2b digest kept for each key
+    digest_size = 8
+
+    # keys looked up in each query, SQLite's limit on parameters can be as low as 999
+    lookup_size = 900
+
+    def __init__(self, path, source):
+        """
+        @param path: (str) SQLite file, created if it doesn't exist
+        @param source: (str) where messages are published to, e.g. an engine_url. The index is
+            emptied when this changes.
+        """
+        self.path = path
+        self.source = source
+        self.db = None
+        # the index was emptied because it was for a different source
+        self.reset = False
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def open(self):
+        # each sub-task of a partitioned model has its own connection, they wait for each other
+        self.db = sqlite3.connect(self.path, timeout=300)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        with self.db:
+            self.db.execute("CREATE TABLE IF NOT EXISTS published "
+                            "(key TEXT PRIMARY KEY, digest BLOB NOT NULL) WITHOUT ROWID")
+            self.db.execute("CREATE TABLE IF NOT EXISTS settings "
+                            "(name TEXT PRIMARY KEY, value TEXT NOT NULL)")
+
+            row = self.db.execute("SELECT value FROM settings WHERE name = 'source'").fetchone()
+            if row is None or row[0] != self.source:
+                self.reset = row is not None
+                self.db.execute("DELETE FROM published")
+                self.db.execute("INSERT OR REPLACE INTO settings VALUES ('source', ?)",
+                                (self.source,)
+                                )
+
+        # each connection has its own, e.g. each sub-task of a partitioned model
+        self.db.execute("CREATE TEMP TABLE staged "
+                        "(key TEXT PRIMARY KEY, digest BLOB NOT NULL) WITHOUT ROWID")
+
+    def close(self):
+        if self.db is not None:
+            self.db.close()
+            self.db = None
+
+    def unpublished(self, records):
+        """
+        @param records: (list of (str, str)) key and content. The content is whatever identifies
+            a change, e.g. the fields in the message.
+        @return: (list of (str, str, bytes)) key, content and digest for the records with a key
+            that isn't in the index or a different digest. Pass these to :meth:`record` once
+            they've been published.
+        """
+        blake2b = hashlib.blake2b
+        digest_size = self.digest_size
+        candidates = [(key, content,
+                       blake2b(content.encode('utf-8'), digest_size=digest_size).digest())
+                      for key, content in records]
+
+        published = {}
+        for i in range(0, len(candidates), self.lookup_size):
+            keys = [key for key, _, _ in candidates[i:i + self.lookup_size]]
+            placeholders = ','.join('?' * len(keys))
+            query = f"SELECT key, digest FROM published WHERE key IN ({placeholders})"
+            published.update(self.db.execute(query, keys))
+
+        return [(key, content, digest) for key, content, digest in candidates
+                if published.get(key) != digest]
+
+    def record(self, published):
+        """
+        @param published: (list of (str, str, bytes)) from :meth:`unpublished`
+        """
+        with self.db:
+            self.db.executemany("INSERT OR REPLACE INTO published VALUES (?, ?)",
+                                [(key, digest) for key, _, digest in published]
+                                )
+
+    def stage(self, published):
+        """
+        Keep messages that have been sent but mightn't have been delivered yet.
+
+        @param published: (list of (str, str, bytes)) from :meth:`unpublished`
+        """
+        with self.db:
+            self.db.executemany("INSERT OR REPLACE INTO staged VALUES (?, ?)",
+                                [(key, digest) for key, _, digest in published]
+                                )
+
+    def record_staged(self):
+        """
+        Move the messages kept by :meth:`stage` into the index.
+
+        @return: (int) messages recorded
+        """
+        with self.db:
+            recorded = self.db.execute("INSERT OR REPLACE INTO published "
+                                       "SELECT key, digest FROM staged").rowcount
+            self.db.execute("DELETE FROM staged")
+        return recorded
+
+    def __len__(self):
+        return self.db.execute("SELECT COUNT(*) FROM published").fetchone()[0]
@@ -0,0 +1,103 @@
+'''
+Remember which films have been counted so a film that is sent again can be found without keeping
+the fields of every film.
+'''
+import os
+import tempfile
+
+import numpy
+
+
+def tconst_numbers(films):
+    """
+    @param films: (list of dict) decoded messages with a `tconst`
+    @return: (numpy int array) the number in each film's tconst, e.g. 1 for tt0000001
+    """
+    return numpy.array([int(film['tconst'][2:]) for film in films], dtype=numpy.int64)
+
+
+class SeenFilms:
+    """
+    A bit for each tconst number, set for the films that have been counted. IMDB's tconsts are
+    numbered from 1 so this is about 5MB when saved.
+
+    e.g.
+    >>> seen = SeenFilms.load('films_summary.seen.npz', checkpoint=marker) or SeenFilms()
+    >>> numbers = tconst_numbers(films)
+    >>> repeated, run_counts, seen_before = seen.repeated(numbers)
+    >>> seen.add(numbers)
+    >>> seen.save('films_summary.seen.npz', checkpoint=new_marker)
+    """
+
+    def __init__(self, seen=None):
+        """
+        @param seen: (numpy bool array) indexed by tconst number
+        """
+        self.seen = numpy.zeros(0, dtype=bool) if seen is None else seen
+
+    def repeated(self, numbers):
+        """
+        @param numbers: (numpy int array) tconst numbers of the films counted in a run
+        @return: (numpy int array, numpy int array, numpy bool array) sorted tconst numbers that
+            were seen before or are in `numbers` more than once, how many times each is in
+            `numbers` and whether it was seen before
+        """
+        unique, counts = numpy.unique(numbers, return_counts=True)
+        seen_before = numpy.zeros(len(unique), dtype=bool)
+        known = unique < len(self.seen)
+        seen_before[known] = self.seen[unique[known]]
+        repeated = seen_before | (counts > 1)
+        return unique[repeated], counts[repeated], seen_before[repeated]
+
+    def add(self, numbers):
+        """
+        @param numbers: (numpy int array) tconst numbers of films that have been counted
+        """
+        if len(numbers) == 0:
+            return
+
+        largest = int(numbers.max())
+        if largest >= len(self.seen):
+            grown = numpy.zeros(max(largest + 1, 2 * len(self.seen)), dtype=bool)
+            grown[:len(self.seen)] = self.seen
+            self.seen = grown
+        self.seen[numbers] = True
+
+    def __len__(self):
+        return int(numpy.count_nonzero(self.seen))
+
+    def save(self, path, checkpoint):
+        """
+        Written to a temporary file and renamed so it's never half written.
+
+        @param path: (str) .npz file
+        @param checkpoint: (str) identifies the checkpoint these films were counted for
+        """
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        fd, building = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                numpy.savez(f, seen=numpy.packbits(self.seen), size=len(self.seen),
+                            checkpoint=checkpoint)
+            os.replace(building, path)
+        except BaseException:
+            if os.path.exists(building):
+                os.remove(building)
+            raise
+
+    @classmethod
+    def load(cls, path, checkpoint):
+        """
+        @param path: (str) from :meth:`save`
+        @param checkpoint: (str) given to :meth:`save`
+        @return: (:class:`SeenFilms`) or None when there isn't a file for `checkpoint`
+        """
+        if not os.path.exists(path):
+            return None
+
+        with numpy.load(path) as saved:
+            if str(saved['checkpoint']) != checkpoint:
+                return None
+            seen = numpy.unpackbits(saved['seen'], count=int(saved['size'])).astype(bool)
+        return cls(seen)
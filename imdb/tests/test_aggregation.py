@@ -0,0 +1,152 @@
+import os
+import random
+import shutil
+import tempfile
+import unittest
+
+from aggregation import ApproxDistinct, Count, Distinct, GroupBy, Sum, TopK
+
+
+class TestAggregation(unittest.TestCase):
+
+    def setUp(self):
+        self.working_directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.working_directory)
+
+    def films(self, count, seed=1):
+        films_random = random.Random(seed)
+        genres = ['Drama', 'Comedy', 'Comedy,Drama', 'Horror,Sci-Fi', 'Western']
+        return [{'tconst': f"tt{i:07d}",
+                 'genres': films_random.choice(genres),
+                 'startYear': films_random.choice([None, 1990, 1991, 2000]),
+                 'runtimeMinutes': films_random.randint(1, 200),
+                 }
+                for i in range(count)]
+
+    def group_by(self, **kwargs):
+        return GroupBy(key=['genres', 'startYear'], explode={'genres': ','},
+                       aggregators={'films': Count(),
+                                    'minutes': Sum('runtimeMinutes'),
+                                    'titles': Distinct('tconst'),
+                                    },
+                       spill_directory=self.working_directory,
+                       **kwargs)
+
+    def expected(self, films):
+        """
+        @return: (dict) (genre, startYear) to the results, counted one film at a time
+        """
+        expected = {}
+        for film in films:
+            for genre in film['genres'].split(','):
+                results = expected.setdefault((genre, film['startYear']),
+                                              {'films': 0, 'minutes': 0, 'titles': 0})
+                results['films'] += 1
+                results['minutes'] += film['runtimeMinutes']
+                results['titles'] += 1
+        return expected
+
+    def test_group_by(self):
+        films = self.films(1000)
+        by_genre = self.group_by()
+        for i in range(0, len(films), 300):
+            by_genre.add_batch(films[i:i + 300])
+
+        self.assertEqual(self.expected(films), dict(by_genre.results()))
+        self.assertEqual([], by_genre.runs)
+
+        counts = GroupBy(key=lambda film: [film['startYear']], aggregators={'films': Count()})
+        counts.add_batch(films)
+        counts.add(films[0])
+        self.assertEqual(1001, sum(results['films'] for _, results in counts.results()))
+
+        everything = GroupBy(key=None, aggregators={'films': Count()})
+        everything.add_batch(films)
+        self.assertEqual([(None, {'films': 1000})], list(everything.results()))
+
+        with self.assertRaises(ValueError):
+            GroupBy(key='startYear', explode={'genres': ','}, aggregators={'films': Count()})
+
+    def test_spill(self):
+        films = self.films(1000)
+        by_genre = self.group_by(max_groups=3)
+        for i in range(0, len(films), 50):
+            by_genre.add_batch(films[i:i + 50])
+
+        self.assertTrue(by_genre.runs)
+        results = list(by_genre.results())
+        self.assertEqual(self.expected(films), dict(results))
+        # each group once and in key order, films without a year first in each genre
+        keys = [key for key, _ in results]
+        self.assertEqual(len(set(keys)), len(keys))
+        self.assertEqual(sorted(keys, key=lambda key: (key[0], key[1] is not None, key[1] or 0)),
+                         keys)
+
+        by_genre.close()
+        self.assertEqual([], os.listdir(self.working_directory))
+
+    def test_merge(self):
+        films = self.films(1000)
+        merged = self.group_by(max_groups=5)
+        for i in range(0, len(films), 250):
+            # e.g. from another process
+            other = self.group_by(max_groups=5)
+            other.add_batch(films[i:i + 250])
+            merged.merge(other)
+            self.assertEqual([], other.runs)
+
+        self.assertEqual(self.expected(films), dict(merged.results()))
+        merged.close()
+        self.assertEqual([], os.listdir(self.working_directory))
+
+    def test_approx_distinct(self):
+        for precision, distinct in ((12, 100), (12, 50000), (8, 20000)):
+            # about 1.04 / sqrt(2 ** precision), allow three standard errors
+            error_bound = 3 * 1.04 / (1 << precision) ** 0.5
+            counter = GroupBy(key=None,
+                              aggregators={'titles': ApproxDistinct('title', precision=precision)})
+            titles = [{'title': f"title {i % distinct}"} for i in range(2 * distinct)]
+            for i in range(0, len(titles), 10000):
+                counter.add_batch(titles[i:i + 10000])
+
+            [(_, results)] = counter.results()
+            self.assertLessEqual(abs(results['titles'] - distinct) / distinct, error_bound)
+
+        # the same estimate when counted in parts and merged
+        whole = GroupBy(key=None, aggregators={'titles': ApproxDistinct('title')})
+        whole.add_batch([{'title': f"title {i}"} for i in range(5000)])
+        merged = GroupBy(key=None, aggregators={'titles': ApproxDistinct('title')})
+        for part in range(5):
+            other = GroupBy(key=None, aggregators={'titles': ApproxDistinct('title')})
+            other.add_batch([{'title': f"title {i}"} for i in range(part, 5000, 5)])
+            merged.merge(other)
+        self.assertEqual(list(whole.results()), list(merged.results()))
+
+        with self.assertRaises(ValueError):
+            ApproxDistinct('title', precision=20)
+
+    def test_top_k(self):
+        # 'genre 0' is the most frequent, then 'genre 1' ...
+        records = [{'genre': f"genre {genre}"}
+                   for genre in range(20) for _ in range(200 - 10 * genre)]
+        records.extend({'genre': f"rare {i}"} for i in range(500))
+        random.Random(2).shuffle(records)
+
+        in_memory = GroupBy(key=None, aggregators={'top': TopK('genre', k=3)})
+        in_memory.add_batch(records)
+        [(_, results)] = in_memory.results()
+        self.assertEqual(['genre 0', 'genre 1', 'genre 2'], [value for value, _ in results['top']])
+        # counts are never under estimated
+        for (value, estimate), actual in zip(results['top'], [200, 190, 180]):
+            self.assertGreaterEqual(estimate, actual)
+            self.assertLessEqual(estimate, actual + 2 * len(records) / 2048)
+
+        merged = GroupBy(key=None, aggregators={'top': TopK('genre', k=3)})
+        for i in range(0, len(records), 700):
+            other = GroupBy(key=None, aggregators={'top': TopK('genre', k=3)})
+            other.add_batch(records[i:i + 700])
+            merged.merge(other)
+        [(_, merged_results)] = merged.results()
+        self.assertEqual(results, merged_results)
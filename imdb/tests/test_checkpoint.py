@@ -0,0 +1,46 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import checkpoint
+from checkpoint import Checkpoint, atomic_write_json
+
+
+class TestCheckpoint(unittest.TestCase):
+
+    def setUp(self):
+        self.working_directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.working_directory)
+
+    def test_save_and_load(self):
+        path = os.path.join(self.working_directory, 'state', 'summary.checkpoint.json')
+        saved = Checkpoint(path, source='kafka-local:///topic=films')
+        self.assertIsNone(saved.load())
+
+        state = {'offsets': {'0': 12, '1': 3}, 'counts': [['Drama', None, 2]]}
+        saved.save(state)
+        self.assertEqual(state, Checkpoint(path, source='kafka-local:///topic=films').load())
+        self.assertIsNone(Checkpoint(path, source='kafka-local:///topic=other').load())
+
+        saved.save({'offsets': {'0': 20}})
+        self.assertEqual({'offsets': {'0': 20}}, saved.load())
+        # only the checkpoint, no temporary files left behind
+        self.assertEqual(['summary.checkpoint.json'], os.listdir(os.path.dirname(path)))
+
+    def test_failed_write(self):
+        path = os.path.join(self.working_directory, 'summary.json')
+        atomic_write_json(path, {'Drama': 1})
+
+        # fails part way through writing
+        with mock.patch.object(checkpoint.json, 'dump', side_effect=RuntimeError('disk full')):
+            with self.assertRaises(RuntimeError):
+                atomic_write_json(path, {'Drama': 2})
+
+        with open(path) as f:
+            self.assertEqual({'Drama': 1}, json.load(f))
+        self.assertEqual(['summary.json'], os.listdir(self.working_directory))
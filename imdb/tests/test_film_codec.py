@@ -0,0 +1,70 @@
+import unittest
+
+from film_codec import FORMAT_VERSION, GENRES, HEADER, FilmCodec
+from tests.title_basics import TITLES
+
+
+class TestFilmCodec(unittest.TestCase):
+
+    def test_round_trip(self):
+        codec = FilmCodec()
+        films = [{'tconst': 'tt0000001', 'primaryTitle': title, 'startYear': '1994',
+                  'genres': 'Comedy,Drama'}
+                 for title in TITLES]
+        films.append({'tconst': 'tt9999999', 'primaryTitle': '', 'startYear': r'\N',
+                      'genres': r'\N'})
+        films.append({'tconst': 'tt0000002', 'primaryTitle': 'Parsed', 'startYear': 2001,
+                      'genres': ['Western', 'Action']})
+
+        values = [codec.encode(film) for film in films]
+        self.assertEqual(HEADER.size + len('Amélie'.encode('utf-8')), len(values[0]))
+        self.assertEqual(FORMAT_VERSION, values[0][0])
+
+        decoded = FilmCodec().decode_batch(values)
+        self.assertEqual(TITLES, [film['primaryTitle'] for film in decoded[:len(TITLES)]])
+        self.assertEqual({'tconst': 'tt0000001', 'primaryTitle': 'Amélie', 'startYear': 1994,
+                          'genres': ('Comedy', 'Drama')}, decoded[0])
+        self.assertEqual({'tconst': 'tt9999999', 'primaryTitle': '', 'startYear': None,
+                          'genres': ()}, decoded[-2])
+        # in the order of GENRES
+        self.assertEqual(('Action', 'Western'), decoded[-1]['genres'])
+
+    def test_genre_bitset(self):
+        codec = FilmCodec()
+        self.assertEqual(0, codec.genre_bitset([]))
+        self.assertEqual(1, codec.genre_bitset(['Action']))
+        every_genre = codec.genre_bitset(GENRES)
+        self.assertEqual((1 << len(GENRES)) - 1, every_genre)
+        self.assertEqual(GENRES, codec.genre_names(every_genre))
+        self.assertEqual(('Adult', 'Western'),
+                         codec.genre_names(codec.genre_bitset(['Western', 'Adult'])))
+
+        with self.assertRaises(ValueError):
+            codec.genre_bitset(['Not a genre'])
+
+    def test_selected_fields(self):
+        codec = FilmCodec()
+        values = [codec.encode({'tconst': 'tt0000042', 'primaryTitle': 'Крылья',
+                                'startYear': '1966', 'genres': 'Drama'})]
+
+        for fields in (['genres'], ['startYear', 'tconst'], ['tconst', 'genres', 'startYear'],
+                       ['primaryTitle', 'genres', 'startYear', 'tconst']):
+            decoded = codec.decode_batch(values, fields=fields)
+            self.assertEqual([fields], [list(film) for film in decoded])
+
+        self.assertEqual([{'genres': ('Drama',), 'startYear': 1966, 'tconst': 'tt0000042'}],
+                         codec.decode_batch(values, fields=['genres', 'startYear', 'tconst']))
+
+        with self.assertRaises(ValueError):
+            codec.decode_batch(values, fields=['runtimeMinutes'])
+
+    def test_invalid(self):
+        codec = FilmCodec()
+        with self.assertRaises(ValueError):
+            codec.encode({'tconst': 'nm0000001', 'primaryTitle': '', 'startYear': '2000',
+                          'genres': 'Drama'})
+
+        value = codec.encode({'tconst': 'tt0000001', 'primaryTitle': '', 'startYear': '2000',
+                              'genres': 'Drama'})
+        with self.assertRaises(ValueError):
+            codec.decode_batch([bytes([FORMAT_VERSION + 1]) + value[1:]])
@@ -0,0 +1,147 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import ayeaye
+
+from films_to_kafka import Film2Kafka
+# registers the kafka-local:// engine type
+import local_log
+from partitioned_films_to_kafka import PartitionedFilm2Kafka
+from projected_tsv import ProjectedTsvConnector
+from tests.title_basics import films, write_title_basics
+
+
+class SyntheticPartitionedFilm2Kafka(PartitionedFilm2Kafka):
+    """
+    Sub-tasks build their own instance of the model class so the datasets are set with the
+    connector resolver (see :meth:`ayeaye.connector_resolver.context`) instead of on an instance.
+    """
+    imdb_films = PartitionedFilm2Kafka.imdb_films.clone(
+        engine_url="tsv-projected://{imdb_test_data}/title.basics.tsv"
+    )
+    output_stream = PartitionedFilm2Kafka.output_stream.clone(
+        engine_url="kafka-local://{imdb_test_data}/partitioned/topic=films;partitions=3;codec=film"
+    )
+    published_index_path = None
+
+
+class TestFilms2Kafka(unittest.TestCase):
+
+    def setUp(self):
+        self.working_directory = tempfile.mkdtemp()
+        self.tsv_path = os.path.join(self.working_directory, 'title.basics.tsv')
+
+    def tearDown(self):
+        shutil.rmtree(self.working_directory)
+
+    def topic_url(self, name, codec='film'):
+        return (f"kafka-local://{self.working_directory}/{name}/topic=films;partitions=3;"
+                f"codec={codec}")
+
+    def ingest(self, topic_url, published_index_path=None):
+        """
+        @return: (:class:`Film2Kafka`) after it has run
+        """
+        m = Film2Kafka()
+        m.log_to_stdout = False
+        m.published_index_path = published_index_path
+        m.imdb_films = Film2Kafka.imdb_films.clone(engine_url=f"tsv-projected://{self.tsv_path}")
+        m.output_stream = Film2Kafka.output_stream.clone(engine_url=topic_url)
+        m.go()
+        return m
+
+    def topic_films(self, topic_url):
+        """
+        @return: (dict) partition to list of films in the order they are in the partition
+        """
+        topic = ayeaye.Connect(engine_url=topic_url, access=ayeaye.AccessMode.READ)
+        return {p: [film for films in topic.iter_batches(partitions=[p]) for film in films]
+                for p in topic.partitions()}
+
+    def test_films_sent(self):
+        test_films = films(40)
+        write_title_basics(self.tsv_path, test_films, series=['tt0000100', 'tt0000101'])
+        for codec in ('film', 'json'):
+            topic_url = self.topic_url(codec, codec=codec)
+            m = self.ingest(topic_url)
+            self.assertEqual(40, m.output_stream.stats.added)
+
+            sent = sorted((film for partition in self.topic_films(topic_url).values()
+                           for film in partition), key=lambda film: film['tconst'])
+            self.assertEqual([tconst for tconst, _, _, _ in test_films],
+                             [film['tconst'] for film in sent])
+            self.assertEqual([title for _, title, _, _ in test_films],
+                             [film['primaryTitle'] for film in sent])
+
+    def test_only_changes_sent(self):
+        test_films = films(40)
+        write_title_basics(self.tsv_path, test_films)
+        index_path = os.path.join(self.working_directory, 'published.sqlite')
+        topic_url = self.topic_url('films')
+        self.assertEqual(40, self.ingest(topic_url, index_path).output_stream.stats.added)
+        self.assertEqual(0, self.ingest(topic_url, index_path).output_stream.stats.added)
+
+        first_title = test_films[3][1]
+        test_films[3] = ('tt0000003', 'New title', '2001', 'Western')
+        test_films.append(('tt0000040', 'Added', '2020', 'Drama'))
+        write_title_basics(self.tsv_path, test_films)
+        self.assertEqual(2, self.ingest(topic_url, index_path).output_stream.stats.added)
+
+        tconst_films = {}
+        for partition in self.topic_films(topic_url).values():
+            for film in partition:
+                tconst_films.setdefault(film['tconst'], []).append(film['primaryTitle'])
+        self.assertEqual(41, len(tconst_films))
+        # the latest version is last in its partition
+        self.assertEqual([first_title, 'New title'], tconst_films['tt0000003'])
+
+    def test_index_after_final_flush(self):
+        write_title_basics(self.tsv_path, films(40))
+        index_path = os.path.join(self.working_directory, 'published.sqlite')
+        topic_url = self.topic_url('films')
+        flush = local_log.LocalLogConnector.flush
+
+        def failed_flush(connector):
+            flush(connector)
+            connector.stats.delivery_errors += 1
+
+        # small blocks, the producer is still only flushed at the end
+        with mock.patch.object(ProjectedTsvConnector, 'block_size', 256), \
+                mock.patch.object(local_log.LocalLogConnector, 'flush', autospec=True,
+                                  side_effect=failed_flush) as flushed:
+            self.assertEqual(40, self.ingest(topic_url, index_path).output_stream.stats.added)
+        self.assertEqual(1, flushed.call_count)
+
+        # none of them are in the index after the failure
+        self.assertEqual(40, self.ingest(topic_url, index_path).output_stream.stats.added)
+        self.assertEqual(0, self.ingest(topic_url, index_path).output_stream.stats.added)
+
+    def test_partitioned_same_as_single_process(self):
+        # long enough for the lines to be split across several byte ranges
+        test_films = films(500)
+        write_title_basics(self.tsv_path, test_films, series=['tt0001000'])
+
+        topic_url = self.topic_url('single')
+        self.ingest(topic_url)
+        single_process = self.topic_films(topic_url)
+
+        partitioned_url = self.topic_url('partitioned')
+        for processes in (1, 4):
+            shutil.rmtree(os.path.join(self.working_directory, 'partitioned'), ignore_errors=True)
+            with ayeaye.connector_resolver.context(imdb_test_data=self.working_directory):
+                m = SyntheticPartitionedFilm2Kafka()
+                m.log_to_stdout = False
+                m.runtime.max_concurrent_tasks = processes
+                m.go()
+                self.assertEqual(processes, m.shards_complete)
+                self.assertEqual(len(test_films), m.films_added)
+                self.assertEqual(0, m.delivery_errors)
+
+            partitioned = self.topic_films(partitioned_url)
+            # shards write to each partition in any order but the partitions have the same films
+            for p, partition_films in single_process.items():
+                self.assertEqual(sorted(partition_films, key=lambda film: film['tconst']),
+                                 sorted(partitioned[p], key=lambda film: film['tconst']))
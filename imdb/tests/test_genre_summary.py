@@ -0,0 +1,149 @@
+from collections import defaultdict
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy
+
+from films_to_kafka import Film2Kafka
+from genre_summary import FilmGenresSummary, offsets_checkpoint
+# registers the kafka-local:// engine type
+import local_log
+from seen_films import SeenFilms
+from tests.title_basics import films, write_title_basics
+
+
+class TestGenreSummary(unittest.TestCase):
+
+    def setUp(self):
+        self.working_directory = tempfile.mkdtemp()
+        self.tsv_path = os.path.join(self.working_directory, 'title.basics.tsv')
+
+    def tearDown(self):
+        shutil.rmtree(self.working_directory)
+
+    def topic_url(self, codec):
+        return (f"kafka-local://{self.working_directory}/{codec}/topic=films;partitions=3;"
+                f"codec={codec}")
+
+    def ingest(self, topic_url):
+        m = Film2Kafka()
+        m.log_to_stdout = False
+        m.published_index_path = os.path.join(self.working_directory, 'published.sqlite')
+        m.imdb_films = Film2Kafka.imdb_films.clone(engine_url=f"tsv-projected://{self.tsv_path}")
+        m.output_stream = Film2Kafka.output_stream.clone(engine_url=topic_url)
+        m.go()
+
+    def summarise(self, topic_url, **settings):
+        """
+        @return: (:class:`FilmGenresSummary`, dict, dict) the model after it has run, the genre
+            summary and the summary for each year
+        """
+        summary_path = os.path.join(self.working_directory, 'films_summary.json')
+        year_summary_path = os.path.join(self.working_directory, 'films_by_year_summary.json')
+        m = FilmGenresSummary()
+        m.log_to_stdout = False
+        for attribute, value in settings.items():
+            setattr(m, attribute, value)
+        m.input_stream = FilmGenresSummary.input_stream.clone(engine_url=topic_url)
+        m.genre_summary = FilmGenresSummary.genre_summary.clone(engine_url=f"json://{summary_path}")
+        m.genre_year_summary = FilmGenresSummary.genre_year_summary.clone(
+            engine_url=f"json://{year_summary_path}"
+        )
+        m.go()
+
+        with open(summary_path) as f:
+            genre_summary = json.load(f)
+        with open(year_summary_path) as f:
+            genre_year_summary = json.load(f)
+        return m, genre_summary, genre_year_summary
+
+    def expected(self, test_films):
+        """
+        @return: (dict, dict) the genre summary and the summary for each year for these films
+        """
+        genre_summary = defaultdict(int)
+        genre_year_summary = defaultdict(lambda: defaultdict(int))
+        for _, _, year, genres in test_films:
+            for genre in (['Unknown'] if genres == r'\N' else genres.split(',')):
+                genre_summary[genre] += 1
+                genre_year_summary["Unknown" if year == r'\N' else year][genre] += 1
+        return genre_summary, genre_year_summary
+
+    def test_round_trip(self):
+        for codec in ('film', 'json'):
+            for consumer_workers in (1, 2):
+                with self.subTest(codec=codec, consumer_workers=consumer_workers):
+                    shutil.rmtree(self.working_directory)
+                    test_films = films(60)
+                    write_title_basics(self.tsv_path, test_films, series=['tt0000100'])
+                    topic_url = self.topic_url(codec)
+                    self.ingest(topic_url)
+
+                    m, *summaries = self.summarise(topic_url, consumer_workers=consumer_workers)
+                    self.assertEqual(list(self.expected(test_films)), summaries)
+                    self.assertEqual(60, m.progress_metrics['count'])
+
+                    # nothing new
+                    m, *summaries = self.summarise(topic_url, consumer_workers=consumer_workers)
+                    self.assertEqual(list(self.expected(test_films)), summaries)
+                    self.assertEqual(0, m.progress_metrics['count'])
+
+                    # a new film, one that changed genres and one that lost its year
+                    test_films[0] = ('tt0000000', 'Changed', '2001', 'Western,Documentary')
+                    test_films[5] = ('tt0000005', 'Changed', r'\N', 'Drama')
+                    test_films.append(('tt0000060', 'Added', '1999', 'Horror'))
+                    write_title_basics(self.tsv_path, test_films)
+                    self.ingest(topic_url)
+
+                    m, *incremental = self.summarise(topic_url,
+                                                     consumer_workers=consumer_workers)
+                    self.assertEqual(list(self.expected(test_films)), incremental)
+                    self.assertEqual(3, m.progress_metrics['count'])
+
+                    m, *recounted = self.summarise(topic_url, consumer_workers=consumer_workers,
+                                                   incremental=False)
+                    self.assertEqual(incremental, recounted)
+                    self.assertEqual(63, m.progress_metrics['count'])
+
+    def test_versions_not_matching_checkpoint(self):
+        test_films = films(30)
+        write_title_basics(self.tsv_path, test_films)
+        topic_url = self.topic_url('film')
+        self.ingest(topic_url)
+        self.summarise(topic_url)
+
+        # e.g. a run that stopped after counting some films
+        os.remove(os.path.join(self.working_directory, 'films_summary.seen.npz'))
+        test_films[1] = ('tt0000001', 'Changed', '2001', 'Western')
+        write_title_basics(self.tsv_path, test_films)
+        self.ingest(topic_url)
+
+        m, *summaries = self.summarise(topic_url)
+        self.assertEqual(list(self.expected(test_films)), summaries)
+        self.assertEqual(31, m.progress_metrics['count'])
+
+    def test_counted_message_missing(self):
+        test_films = films(30)
+        write_title_basics(self.tsv_path, test_films)
+        topic_url = self.topic_url('film')
+        self.ingest(topic_url)
+        m, *_ = self.summarise(topic_url)
+
+        # as if tt0000030 had been counted but its message was compacted away
+        seen_path = os.path.join(self.working_directory, 'films_summary.seen.npz')
+        seen_checkpoint = offsets_checkpoint(m.input_stream.next_offsets())
+        seen = SeenFilms.load(seen_path, seen_checkpoint)
+        seen.add(numpy.array([30]))
+        seen.save(seen_path, seen_checkpoint)
+
+        test_films.append(('tt0000030', 'Added', '2020', 'Drama'))
+        write_title_basics(self.tsv_path, test_films)
+        self.ingest(topic_url)
+
+        m, *summaries = self.summarise(topic_url)
+        self.assertEqual(list(self.expected(test_films)), summaries)
+        # counted all of the topic again
+        self.assertEqual(31, m.progress_metrics['count'])
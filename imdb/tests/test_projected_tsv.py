@@ -0,0 +1,59 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import projected_tsv
+from projected_tsv import ProjectedTsvConnector
+from tests.title_basics import films, write_title_basics
+
+
+class TestProjectedTsv(unittest.TestCase):
+
+    def setUp(self):
+        self.working_directory = tempfile.mkdtemp()
+        self.tsv_path = os.path.join(self.working_directory, 'title.basics.tsv')
+
+    def tearDown(self):
+        shutil.rmtree(self.working_directory)
+
+    def connector(self, **kwargs):
+        return ProjectedTsvConnector(engine_url=f"tsv-projected://{self.tsv_path}",
+                                     select_fields=['tconst', 'primaryTitle', 'startYear',
+                                                    'genres'],
+                                     where={'endYear': r'\N'},
+                                     **kwargs)
+
+    def test_selected_rows(self):
+        test_films = films(30)
+        without_carriage_returns = [film for film in test_films if '\r' not in film[1]]
+        for expected in (test_films, without_carriage_returns):
+            write_title_basics(self.tsv_path, expected, series=['tt0000100'])
+            for pyarrow in (projected_tsv.pyarrow, None):
+                with mock.patch.object(projected_tsv, 'pyarrow', pyarrow):
+                    self.assertEqual(expected, self.connector().data)
+
+                    with self.assertRaises(ValueError):
+                        ProjectedTsvConnector(engine_url=f"tsv-projected://{self.tsv_path}",
+                                              select_fields=['title']).data
+
+    def test_byte_ranges(self):
+        test_films = films(200)
+        write_title_basics(self.tsv_path, test_films, series=['tt0000300'])
+        for pyarrow in (projected_tsv.pyarrow, None):
+            with mock.patch.object(projected_tsv, 'pyarrow', pyarrow):
+                for count in (1, 3, 7, 50):
+                    dataset = self.connector()
+                    # small blocks so ranges are read in more than one block
+                    dataset.block_size = 512
+                    byte_ranges = dataset.byte_ranges(count)
+                    self.assertEqual(count, len(byte_ranges))
+
+                    rows = []
+                    for byte_range in byte_ranges:
+                        shard = self.connector(byte_range=byte_range)
+                        shard.block_size = 512
+                        rows.extend(shard.data)
+                        self.assertEqual(1.0, shard.progress)
+                    self.assertEqual(test_films, rows)
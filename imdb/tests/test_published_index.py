@@ -0,0 +1,75 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from published_index import PublishedIndex
+
+
+class TestPublishedIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.working_directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.working_directory, 'published.sqlite')
+
+    def tearDown(self):
+        shutil.rmtree(self.working_directory)
+
+    def test_changed_and_unchanged(self):
+        films = [('tt0000001', 'tt0000001\tAmélie\t2001\tComedy'),
+                 ('tt0000002', 'tt0000002\tКрылья\t1966\tDrama'),
+                 ]
+        with PublishedIndex(self.path, source='topic=films') as index:
+            self.assertFalse(index.reset)
+            unpublished = index.unpublished(films)
+            self.assertEqual(['tt0000001', 'tt0000002'], [key for key, _, _ in unpublished])
+            self.assertEqual([films[0][1], films[1][1]], [content for _, content, _ in unpublished])
+            index.record(unpublished)
+            self.assertEqual(2, len(index))
+
+        with PublishedIndex(self.path, source='topic=films') as index:
+            self.assertEqual([], index.unpublished(films))
+
+            changed = [('tt0000001', 'tt0000001\tAmélie\t2001\tComedy,Romance'),
+                       films[1],
+                       ('tt0000003', 'tt0000003\tNew\t2020\tHorror'),
+                       ]
+            unpublished = index.unpublished(changed)
+            self.assertEqual(['tt0000001', 'tt0000003'], [key for key, _, _ in unpublished])
+
+            # not recorded, e.g. delivery failed, so they're still unpublished
+            self.assertEqual(unpublished, index.unpublished(changed))
+            index.record(unpublished)
+            self.assertEqual([], index.unpublished(changed))
+            self.assertEqual(3, len(index))
+
+    def test_staged(self):
+        films = [('tt0000001', 'Amélie'), ('tt0000002', 'Крылья')]
+        with PublishedIndex(self.path, source='topic=films') as index:
+            index.stage(index.unpublished(films[:1]))
+            # e.g. another sub-task
+            with PublishedIndex(self.path, source='topic=films') as other_index:
+                other_index.stage(other_index.unpublished(films[1:]))
+
+            # nothing is recorded until the messages have been delivered
+            self.assertEqual(films, [(key, content)
+                                     for key, content, _ in index.unpublished(films)])
+            self.assertEqual(1, index.record_staged())
+            self.assertEqual(0, index.record_staged())
+            self.assertEqual(['tt0000002'], [key for key, _, _ in index.unpublished(films)])
+
+    def test_many_keys(self):
+        films = [(f"tt{i:07d}", f"title {i}") for i in range(2500)]
+        with PublishedIndex(self.path, source='topic=films') as index:
+            index.record(index.unpublished(films))
+            self.assertEqual([], index.unpublished(films))
+            self.assertEqual(1, len(index.unpublished(films + [('tt0002500', 'title')])))
+
+    def test_other_source(self):
+        with PublishedIndex(self.path, source='topic=films') as index:
+            index.record(index.unpublished([('tt0000001', 'Amélie')]))
+
+        with PublishedIndex(self.path, source='topic=other-films') as index:
+            self.assertTrue(index.reset)
+            self.assertEqual(0, len(index))
+            self.assertEqual(1, len(index.unpublished([('tt0000001', 'Amélie')])))
@@ -0,0 +1,57 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy
+
+from seen_films import SeenFilms, tconst_numbers
+
+
+class TestSeenFilms(unittest.TestCase):
+
+    def setUp(self):
+        self.working_directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.working_directory, 'seen.npz')
+
+    def tearDown(self):
+        shutil.rmtree(self.working_directory)
+
+    def test_repeated(self):
+        self.assertEqual([1, 20, 9999999],
+                         tconst_numbers([{'tconst': 'tt0000001'}, {'tconst': 'tt0000020'},
+                                         {'tconst': 'tt9999999'}]).tolist())
+
+        seen = SeenFilms()
+        seen.add(numpy.array([3, 5, 8]))
+        self.assertEqual(3, len(seen))
+
+        repeated, run_counts, seen_before = seen.repeated(numpy.array([9, 5, 100, 9, 9, 2]))
+        self.assertEqual([5, 9], repeated.tolist())
+        self.assertEqual([1, 3], run_counts.tolist())
+        self.assertEqual([True, False], seen_before.tolist())
+        # only changed by add
+        self.assertEqual(3, len(seen))
+
+        seen.add(numpy.array([9, 5, 100, 9, 9, 2]))
+        self.assertEqual(6, len(seen))
+        self.assertEqual([2, 3, 5, 8, 9, 100], numpy.flatnonzero(seen.seen).tolist())
+
+        empty = numpy.zeros(0, dtype=numpy.int64)
+        self.assertEqual([], seen.repeated(empty)[0].tolist())
+        seen.add(empty)
+        self.assertEqual(6, len(seen))
+
+    def test_save_and_load(self):
+        self.assertIsNone(SeenFilms.load(self.path, checkpoint='{"0": 3}'))
+
+        seen = SeenFilms()
+        seen.add(numpy.array([1, 2, 35000000]))
+        seen.save(self.path, checkpoint='{"0": 3}')
+        self.assertEqual(['seen.npz'], os.listdir(self.working_directory))
+        # packed into bits
+        self.assertLess(os.path.getsize(self.path), 5 * 1024 * 1024)
+
+        loaded = SeenFilms.load(self.path, checkpoint='{"0": 3}')
+        self.assertEqual([1, 2, 35000000], numpy.flatnonzero(loaded.seen).tolist())
+        self.assertIsNone(SeenFilms.load(self.path, checkpoint='{"0": 4}'))
@@ -0,0 +1,44 @@
+'''
+Small IMDB title.basics.tsv files for the tests.
+'''
+import os
+
+FIELD_NAMES = ['tconst', 'titleType', 'primaryTitle', 'originalTitle', 'isAdult', 'startYear',
+               'endYear', 'runtimeMinutes', 'genres']
+
+# non-ASCII, characters str.splitlines() treats as line breaks and a carriage return, which
+# pyarrow's CSV reader treats as one
+TITLES = ['Amélie', 'Крылья', '千と千尋の神隠し', 'Line\u2028separator', 'File\x1cseparator',
+          'Carriage\rreturn', 'Plain title']
+
+GENRE_CHOICES = ['Documentary', 'Drama', 'Comedy,Drama', r'\N', 'Horror,Sci-Fi,Western']
+
+
+def films(count):
+    """
+    @param count: (int)
+    @return: (list of (str, str, str, str)) tconst, primaryTitle, startYear and genres
+    """
+    return [(f"tt{i:07d}",
+             TITLES[i % len(TITLES)],
+             r'\N' if i % 7 == 0 else str(1990 + i % 3),
+             GENRE_CHOICES[i % len(GENRE_CHOICES)],
+             )
+            for i in range(count)]
+
+
+def write_title_basics(path, films, series=()):
+    """
+    @param path: (str) written
+    @param films: (list) from :func:`films`
+    @param series: (list of str) tconsts of TV series to add, these have an endYear
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        f.write('\t'.join(FIELD_NAMES) + '\n')
+        for tconst, title, year, genres in films:
+            f.write('\t'.join([tconst, 'movie', title, title, '0', year, r'\N', '90', genres])
+                    + '\n')
+        for tconst in series:
+            f.write('\t'.join([tconst, 'tvSeries', 'A series', 'A series', '0', '2000', '2005',
+                               '30', 'Drama']) + '\n')